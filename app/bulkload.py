@@ -0,0 +1,281 @@
+"""
+Parallel bulk loader for historical backfills (QuickBooks / Rootfi JSON exports).
+
+Files are parsed in a process pool; parsed reports go to a single writer (this process)
+that bulk-inserts each file in one transaction and records it in `ingest_batches`.
+Re-running skips files whose content hash is already registered as done.
+
+Usage:
+  python -m app.bulkload exports/2023 "exports/2024/*.json" --workers 8
+  python -m app.bulkload exports --dry-run          # parse throughput only, no DB
+  python -m app.bulkload exports --force            # reload files already registered
+"""
+
+from __future__ import annotations
+import argparse, glob, hashlib, json, os, sqlite3, sys, time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.parsers.quickbooks import parse_quickbooks
+from app.parsers.report import write_report
+from app.parsers.rootfi import parse_rootfi
+from app.repositories.sync import plan_sync
+from app.utils.jsonfast import loads
+
+PARSERS = {"quickbooks": parse_quickbooks, "rootfi": parse_rootfi}
+
+
+def expand_inputs(inputs: Iterable[str], pattern: str = "*.json") -> List[str]:
+    """
+    Resolve directories (searched recursively for `pattern`), globs and plain files into a
+    sorted, de-duplicated file list.
+    """
+    out: Set[str] = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            out.update(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+        elif any(ch in item for ch in "*?["):
+            out.update(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+        elif os.path.isfile(item):
+            out.add(item)
+        else:
+            raise FileNotFoundError(item)
+    return sorted(os.path.abspath(p) for p in out)
+
+
+def detect_source(doc: Any) -> Optional[str]:
+    """
+    Guess the source of a payload from its shape: QuickBooks reports carry Header/Columns/Rows,
+    Rootfi exports a list of periods with period_end / rootfi_id.
+    """
+    data = doc.get("data") if isinstance(doc, dict) else doc
+    if isinstance(data, dict) and ("Rows" in data or "Columns" in data):
+        return "quickbooks"
+    if isinstance(doc, dict) and ("Rows" in doc or "Columns" in doc):
+        return "quickbooks"
+    if isinstance(data, dict):
+        data = data.get("data") or data.get("items")
+    if isinstance(data, list) and data and isinstance(data[0], dict) and (
+        "period_end" in data[0] or "rootfi_id" in data[0] or "platform_id" in data[0]
+    ):
+        return "rootfi"
+    return None
+
+
+# Content hashes already registered as done, set in each worker process by _init_worker
+_SKIP: FrozenSet[str] = frozenset()
+
+
+def _init_worker(skip: FrozenSet[str]):
+    global _SKIP
+    _SKIP = skip
+
+
+def parse_file(path: str, source: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Worker: read, hash, decode and parse one file. Never raises; errors are returned.
+    A file whose hash is already loaded is returned as `skipped` without being decoded.
+    """
+    t0 = time.perf_counter()
+    out: Dict[str, Any] = {"path": path, "source": source, "report": None, "error": None, "skipped": False}
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        out["sha256"], out["bytes"] = hashlib.sha256(raw).hexdigest(), len(raw)
+        if out["sha256"] in _SKIP:
+            out["skipped"] = True
+            out["parse_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+            return out
+        doc = loads(raw)
+        if isinstance(doc, dict) and isinstance(doc.get("payload"), dict):
+            doc = doc["payload"]  # API request body shape
+        src = source or detect_source(doc)
+        if src not in PARSERS:
+            raise ValueError("cannot detect source (use --source)")
+        out["source"] = src
+        out["report"] = PARSERS[src](doc)
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+    out["parse_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return out
+
+
+def _done_hashes(con) -> Set[str]:
+    return {r[0] for r in con.execute("SELECT sha256 FROM ingest_batches WHERE status='done'").fetchall()}
+
+
+def _write(con, res: Dict[str, Any], force: bool) -> Tuple[Optional[str], float]:
+    """
+    Write one parsed file and register it; returns (error, write ms). A failing write
+    (constraint, locked database, ...) is rolled back and reported, not raised.
+    """
+    rep = res["report"]
+    w0 = time.perf_counter()
+    try:
+        # Sources with upstream sync records load incrementally, like the API
+        sync = plan_sync(con, rep.source, rep.records, force) if rep.records is not None else None
+        write_report(con, rep, {
+            "sha256": res["sha256"], "path": res["path"], "source": rep.source,
+            "bytes": res["bytes"], "facts": len(rep.facts), "periods": len(rep.periods),
+            "parse_ms": res["parse_ms"],
+        }, sync)
+        error = None
+    except Exception as e:
+        error = f"write failed: {type(e).__name__}: {e}"
+    return error, (time.perf_counter() - w0) * 1000.0
+
+
+def _record_failure(con, res: Dict[str, Any]):
+    """
+    Register a failed file so it shows up in ingest_batches (and is retried next run). Best
+    effort: when the registry itself cannot be written, the failure is only reported.
+    """
+    try:
+        _upsert_failure(con, res)
+    except sqlite3.Error:
+        pass
+
+
+def _upsert_failure(con, res: Dict[str, Any]):
+    with con:
+        con.execute(
+            """
+            INSERT INTO ingest_batches(sha256, path, source, bytes, status, error, parse_ms, loaded_at)
+            VALUES(?,?,?,?,'failed',?,?, datetime('now'))
+            ON CONFLICT(sha256) DO UPDATE SET path=excluded.path, status='failed', error=excluded.error,
+                parse_ms=excluded.parse_ms, loaded_at=excluded.loaded_at
+            WHERE ingest_batches.status != 'done'
+            """,
+            (res.get("sha256") or f"unreadable:{res['path']}", res["path"], res.get("source"),
+             res.get("bytes"), res["error"], res["parse_ms"]),
+        )
+
+
+class Progress:
+    """
+    One status line per finished file on stderr, with running throughput.
+    """
+
+    def __init__(self, total: int, quiet: bool = False):
+        self.total = total
+        self.quiet = quiet
+        self.done = 0
+        self.t0 = time.perf_counter()
+
+    def step(self, res: Dict[str, Any], status: str):
+        self.done += 1
+        if self.quiet:
+            return
+        el = time.perf_counter() - self.t0
+        rep = res.get("report")
+        facts = len(rep.facts) if rep else 0
+        print(
+            f"[{self.done:>{len(str(self.total))}}/{self.total}] {self.done / self.total:6.1%} "
+            f"{status:<7} {res.get('source') or '?':<10} facts={facts:<7} parse={res['parse_ms']:.1f}ms "
+            f"| {self.done / el if el else 0.0:.1f} files/s  {os.path.basename(res['path'])}"
+            + (f"  ({res['error']})" if res.get("error") else ""),
+            file=sys.stderr,
+        )
+
+
+def run(paths: List[str], workers: int, source: Optional[str], dry_run: bool, force: bool,
+        db_path: str, quiet: bool = False) -> Dict[str, Any]:
+    """
+    Parse `paths` in a process pool and (unless dry_run) write each parsed file from this process.
+    Files with the same content are loaded once per run, even with `force`.
+    """
+    con = None
+    done: FrozenSet[str] = frozenset()
+    if not dry_run:
+        from app.db.db import init_db
+        # The single writer: a private connection rather than the app's shared singleton
+        con = sqlite3.connect(db_path)
+        con.row_factory = sqlite3.Row
+        init_db(con)
+        if not force:
+            # Workers hash each file anyway, so they skip loaded ones before decoding
+            done = frozenset(_done_hashes(con))
+
+    progress = Progress(len(paths), quiet)
+    stats = {"files": len(paths), "loaded": 0, "skipped": 0, "failed": 0,
+             "facts": 0, "bytes": 0, "parse_ms": 0.0, "write_ms": 0.0, "dry_run": dry_run}
+    # Hashes loaded by this run: the workers' skip set only holds those of earlier runs
+    loaded: Set[str] = set()
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(done,)) as pool:
+        pending: Set[Future] = set()
+        it = iter(paths)
+        # Bounded window: parsed reports wait for the writer in memory, so don't run far ahead
+        window = max(2, workers * 2)
+        while True:
+            while len(pending) < window:
+                p = next(it, None)
+                if p is None:
+                    break
+                pending.add(pool.submit(parse_file, p, source))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                res = fut.result()
+                stats["parse_ms"] += res["parse_ms"]
+                if res["skipped"] or (res["error"] is None and res["sha256"] in loaded):
+                    stats["skipped"] += 1
+                    progress.step(res, "skipped")
+                    continue
+                stats["bytes"] += res.get("bytes") or 0
+                if res["error"] is None and con is not None:
+                    res["error"], write_ms = _write(con, res, force)
+                    stats["write_ms"] += write_ms
+                if res["error"]:
+                    stats["failed"] += 1
+                    if con is not None:
+                        _record_failure(con, res)
+                    progress.step(res, "failed")
+                    continue
+                loaded.add(res["sha256"])
+                stats["facts"] += len(res["report"].facts)
+                stats["loaded"] += 1
+                progress.step(res, "parsed" if dry_run else "loaded")
+    if con is not None:
+        con.close()
+    elapsed = time.perf_counter() - t0
+    stats.update({
+        "elapsed_s": round(elapsed, 3),
+        "files_per_s": round(stats["loaded"] / elapsed, 2) if elapsed else None,
+        "facts_per_s": round(stats["facts"] / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(stats["bytes"] / 1e6 / elapsed, 2) if elapsed else None,
+        "parse_ms": round(stats["parse_ms"], 3),
+        "write_ms": round(stats["write_ms"], 3),
+    })
+    return stats
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.bulkload")
+    ap.add_argument("inputs", nargs="+", help="Files, directories (recursive) or glob patterns")
+    ap.add_argument("--pattern", default="*.json", help="File pattern inside directories")
+    ap.add_argument("--source", choices=sorted(PARSERS), default=None, help="Force the source instead of detecting it")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Parser processes")
+    ap.add_argument("--db", default=settings.db_path)
+    ap.add_argument("--dry-run", action="store_true", help="Parse only and report throughput; no DB access")
+    ap.add_argument("--force", action="store_true", help="Reload files already registered as done")
+    ap.add_argument("--quiet", action="store_true", help="No per-file progress lines")
+    args = ap.parse_args(argv)
+
+    try:
+        paths = expand_inputs(args.inputs, args.pattern)
+    except FileNotFoundError as e:
+        print(f"[ERR] no such file or directory: {e}", file=sys.stderr)
+        return 2
+    if not paths:
+        print("[ERR] no input files matched", file=sys.stderr)
+        return 2
+    stats = run(paths, max(1, args.workers), args.source, args.dry_run, args.force, args.db, args.quiet)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,11 +8,64 @@ load_dotenv()
 class Settings(BaseModel):
     db_path: str = os.getenv("DB_PATH", "app/db/finance_ai.db")
     auto_ingest: bool = os.getenv("AUTO_INGEST", "0") == "1"
+    # Import deferred modules (prometheus_client, the openai SDK) in the background after startup
+    startup_warmup: bool = os.getenv("STARTUP_WARMUP", "1") == "1"
     qb_file: str = os.getenv("QB_FILE", "/test_data/data_set_1.json")
     rootfi_file: str = os.getenv("ROOTFI_FILE", "/test_data/data_set_2.json")
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
     model_name: str = os.getenv("MODEL_NAME", "gpt-4o-mini")
     model_variants: str = os.getenv('MODEL_VARIANTS', 'gpt-4o-mini,gpt-4o')
+    query_profiling: bool = os.getenv("QUERY_PROFILING", "0") == "1"
+    slow_query_ms: float = float(os.getenv("SLOW_QUERY_MS", "50"))
+    explain_slow_queries: bool = os.getenv("EXPLAIN_SLOW_QUERIES", "1") == "1"
+    span_export: str = os.getenv("SPAN_EXPORT", "db")  # db | otlp_file | off
+    span_export_file: str = os.getenv("SPAN_EXPORT_FILE", "app/obs/spans.jsonl")
+    span_db_path: str = os.getenv("SPAN_DB_PATH", "")  # default: <DB_PATH stem>.spans.db
+    # Requests whose spans may wait for the background writer; successful requests to the
+    # LOG_SAMPLE_PATHS keep their spans at SPAN_SAMPLE_RATE
+    span_queue_size: int = int(os.getenv("SPAN_QUEUE_SIZE", "10000"))
+    span_sample_rate: float = float(os.getenv("SPAN_SAMPLE_RATE", "0.0"))
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    log_sample_rate: float = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+    log_sample_paths: str = os.getenv("LOG_SAMPLE_PATHS", "/health,/metrics")
+    trace_max_age_days: int = int(os.getenv("TRACE_MAX_AGE_DAYS", "30"))
+    trace_max_rows: int = int(os.getenv("TRACE_MAX_ROWS", "100000"))
+    span_max_rows: int = int(os.getenv("SPAN_MAX_ROWS", "1000000"))
+    trace_compact_interval_s: float = float(os.getenv("TRACE_COMPACT_INTERVAL_S", "300"))
+    trace_compact_batch: int = int(os.getenv("TRACE_COMPACT_BATCH", "500"))
+    trace_vacuum_pages: int = int(os.getenv("TRACE_VACUUM_PAGES", "1000"))
+    # USD per 1M tokens as model:prompt:completion, matched by longest model-name prefix
+    llm_prices: str = os.getenv("LLM_PRICES", "gpt-4o-mini:0.15:0.60,gpt-4o:2.50:10.00")
+    # QuickBooks vs Rootfi reconciliation: a variance is flagged when it exceeds both tolerances
+    recon_abs_tol: float = float(os.getenv("RECON_ABS_TOL", "1.0"))
+    recon_rel_tol: float = float(os.getenv("RECON_REL_TOL", "0.01"))
+    recon_on_ingest: bool = os.getenv("RECON_ON_INGEST", "1") == "1"
+    # Rows fetched per batch by the streaming exports
+    export_batch_size: int = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+    # POST /api/v1/batch: sub-queries per request, and threads (each with a read-only connection)
+    # running independent groups concurrently; 1 runs everything on the request's connection
+    batch_max_queries: int = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+    batch_workers: int = int(os.getenv("BATCH_WORKERS", "4"))
+    # Admission control for LLM-bound NLQ work: concurrent calls, bounded wait queue (and the
+    # longest a queued call may wait), per-client token bucket, and the circuit breaker
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    llm_queue_size: int = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+    llm_queue_timeout_s: float = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "15"))
+    nlq_rate_per_min: float = float(os.getenv("NLQ_RATE_PER_MIN", "60"))  # 0 disables
+    nlq_burst: int = int(os.getenv("NLQ_BURST", "20"))
+    llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    llm_breaker_cooldown_s: float = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+    # Intent classifier routing NLQ wordings the regex rules miss; below the confidence -> LLM
+    intent_classifier: bool = os.getenv("INTENT_CLASSIFIER", "1") == "1"
+    intent_min_confidence: float = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.7"))
+    # In-process result caches (entries die with the data generation they were computed at)
+    response_cache_size: int = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+    nlq_cache_size: int = int(os.getenv("NLQ_CACHE_SIZE", "1024"))
+    # Post-ingest warm-up of those caches; LLM summaries of the latest year only with a token budget
+    warm_after_ingest: bool = os.getenv("WARM_AFTER_INGEST", "1") == "1"
+    warm_llm_token_budget: int = int(os.getenv("WARM_LLM_TOKEN_BUDGET", "0"))
+    llm_backend: str = os.getenv("LLM_BACKEND", "openai")  # openai | stub
+    llm_stub_latency_ms: float = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
 
 
 settings = Settings()
\ No newline at end of file
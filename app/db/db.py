@@ -2,25 +2,109 @@ from __future__ import annotations
 import sqlite3
 from sqlite3 import Connection
 from app.obs.traces import init_traces
+from app.obs.queries import ProfilingConnection
+from app.obs.spans import init_spans
+from app.services.categorization import seed_rules
+from app.repositories.accounts import rebuild_hierarchy
 
 from . import db as _self  # type: ignore
 
 # SQL schema for initializing the database tables and indexes
 SCHEMA_SQL = """
+PRAGMA auto_vacuum=INCREMENTAL; -- only takes effect on a fresh DB file
 PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    full_path TEXT NOT NULL,  -- readable name returned by the API
+    leaf_name TEXT,
+    category TEXT,
+    parent_id INTEGER REFERENCES accounts(id),
+    account_id TEXT,          -- external id (Rootfi line items), NULL for QuickBooks
+    depth INTEGER NOT NULL DEFAULT 0,    -- 0 = top-level item of its report section
+    is_leaf INTEGER NOT NULL DEFAULT 1,  -- no child accounts
+    UNIQUE(source, full_path)
+);
+CREATE INDEX IF NOT EXISTS ix_accounts_cat ON accounts(category, source);
+
+-- Closure table: one row per (ancestor, descendant) pair, including (a, a, 0)
+CREATE TABLE IF NOT EXISTS account_closure (
+    ancestor_id INTEGER NOT NULL,
+    descendant_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,   -- distance from ancestor to descendant
+    PRIMARY KEY(ancestor_id, descendant_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_closure_desc ON account_closure(descendant_id, ancestor_id);
+
 CREATE TABLE IF NOT EXISTS facts (
     id INTEGER PRIMARY KEY,
     period_start TEXT,
     period_end TEXT,
     month_key TEXT,
-    source TEXT,
-    account TEXT,
-    category TEXT,
+    account_id INTEGER NOT NULL REFERENCES accounts(id),
     kind TEXT,
     amount REAL
 );
 CREATE INDEX IF NOT EXISTS ix_facts_month ON facts(month_key);
-CREATE INDEX IF NOT EXISTS ix_facts_src ON facts(source);
+CREATE INDEX IF NOT EXISTS ix_facts_acct ON facts(account_id, month_key);
+
+-- Data-driven categorization (see app.services.categorization)
+CREATE TABLE IF NOT EXISTS category_rules (
+    id INTEGER PRIMARY KEY,
+    source TEXT,                 -- NULL applies to every source
+    match TEXT NOT NULL,         -- exact | prefix | contains | regex (case-insensitive)
+    pattern TEXT NOT NULL,
+    category TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 100  -- lower is tried first
+);
+CREATE TABLE IF NOT EXISTS category_overrides (
+    source TEXT NOT NULL,
+    full_path TEXT NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY(source, full_path)
+);
+
+-- Registry of loaded files (python -m app.bulkload), keyed by content hash for resume
+CREATE TABLE IF NOT EXISTS ingest_batches (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    path TEXT,
+    source TEXT,
+    bytes INTEGER,
+    facts INTEGER,
+    periods INTEGER,
+    status TEXT NOT NULL,    -- done | failed
+    error TEXT,
+    parse_ms REAL,
+    write_ms REAL,
+    loaded_at TEXT
+);
+
+-- Incremental sync state of upstream period records (see app.repositories.sync); a row with
+-- deleted_at set is a tombstone
+CREATE TABLE IF NOT EXISTS sync_state (
+    source TEXT NOT NULL,
+    company_id TEXT NOT NULL,
+    external_id TEXT NOT NULL,   -- rootfi_id, or period_end when the record has none
+    period_end TEXT,
+    updated_at TEXT,
+    deleted_at TEXT,
+    synced_at TEXT,
+    PRIMARY KEY(source, company_id, external_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    source TEXT NOT NULL,
+    company_id TEXT NOT NULL,
+    high_water TEXT,             -- newest updated_at / deleted_at ingested
+    synced_at TEXT,
+    PRIMARY KEY(source, company_id)
+);
+
+-- Facts with readable account/source/category, for ad-hoc reads
+CREATE VIEW IF NOT EXISTS facts_named AS
+SELECT f.id, f.period_start, f.period_end, f.month_key, a.source, a.full_path AS account,
+       a.category, f.kind, f.amount, f.account_id
+FROM facts f JOIN accounts a ON a.id = f.account_id;
 
 
 CREATE TABLE IF NOT EXISTS metrics (
@@ -35,6 +119,29 @@ CREATE TABLE IF NOT EXISTS metrics (
     UNIQUE(period_end, source)
 );
 
+-- QuickBooks vs Rootfi reconciliation (see app.services.reconciliation), refreshed per month after each ingest
+CREATE TABLE IF NOT EXISTS reconciliation (
+    month_key TEXT NOT NULL,
+    level TEXT NOT NULL,      -- metric | account
+    item TEXT NOT NULL,       -- metric name, or account recon key
+    quickbooks REAL,
+    rootfi REAL,
+    diff REAL,                -- rootfi - quickbooks
+    rel_diff REAL,            -- |diff| / max(|quickbooks|, |rootfi|)
+    flagged INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY(month_key, level, item)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_recon_flagged ON reconciliation(flagged, month_key);
+-- Accounts of different sources that share a recon_key are reconciled against each other;
+-- unmapped leaf accounts are matched by leaf name
+CREATE TABLE IF NOT EXISTS recon_account_map (
+    source TEXT NOT NULL,
+    full_path TEXT NOT NULL,
+    recon_key TEXT NOT NULL,
+    PRIMARY KEY(source, full_path)
+);
+
 
 CREATE TABLE IF NOT EXISTS conversations (
     id TEXT PRIMARY KEY,
@@ -58,18 +165,72 @@ def get_con(db_path: str) -> Connection:
     """
     Get a singleton SQLite connection to the database at db_path.
     Sets row_factory to sqlite3.Row for dict-like access.
+    The connection is a ProfilingConnection, so queries are timed when QUERY_PROFILING=1.
     """
     global _CON
     if _CON is None:
-        _CON = sqlite3.connect(db_path, check_same_thread=False)
+        _CON = sqlite3.connect(db_path, check_same_thread=False, factory=ProfilingConnection)
         _CON.row_factory = sqlite3.Row
     return _CON
 
 
+def _facts_legacy(con: Connection) -> bool:
+    """
+    Move a pre-`accounts` facts table (account/source/category text per row) out of the way.
+    Returns True if there is data to copy into the new layout.
+    """
+    cols = {r[1] for r in con.execute("PRAGMA table_info(facts)").fetchall()}
+    if "account" not in cols:
+        return False
+    with con:
+        con.execute("ALTER TABLE facts RENAME TO facts_legacy")
+        con.execute("DROP INDEX IF EXISTS ix_facts_month")
+        con.execute("DROP INDEX IF EXISTS ix_facts_src")
+    return True
+
+
+def _migrate_facts_legacy(con: Connection):
+    """
+    Copy legacy facts into accounts + facts (keeping fact ids), then drop the old table.
+    """
+    with con:
+        con.execute(
+            """
+            INSERT OR IGNORE INTO accounts(source, full_path, leaf_name, category)
+            SELECT source, COALESCE(account, 'Unknown'), COALESCE(account, 'Unknown'), MIN(category)
+            FROM facts_legacy GROUP BY source, COALESCE(account, 'Unknown') ORDER BY MIN(id)
+            """
+        )
+        con.execute(
+            """
+            INSERT INTO facts(id, period_start, period_end, month_key, account_id, kind, amount)
+            SELECT l.id, l.period_start, l.period_end, l.month_key, a.id, l.kind, l.amount
+            FROM facts_legacy l
+            JOIN accounts a ON a.source = l.source AND a.full_path = COALESCE(l.account, 'Unknown')
+            """
+        )
+        con.execute("DROP TABLE facts_legacy")
+
+
 def init_db(con: Connection):
     """
-    Initialize the database schema and tracing tables.
+    Initialize the database schema, tracing and span tables.
+    Default category rules are seeded once, when their table is created.
+    Databases created before the accounts dimension or the hierarchy columns are migrated in place.
     """
+    legacy = _facts_legacy(con)
+    fresh_rules = con.execute("SELECT 1 FROM sqlite_master WHERE name='category_rules'").fetchone() is None
+    acols = {r[1] for r in con.execute("PRAGMA table_info(accounts)").fetchall()}
     with con:
+        if acols and "depth" not in acols:
+            con.execute("ALTER TABLE accounts ADD COLUMN depth INTEGER NOT NULL DEFAULT 0")
+            con.execute("ALTER TABLE accounts ADD COLUMN is_leaf INTEGER NOT NULL DEFAULT 1")
         con.executescript(SCHEMA_SQL)
-    init_traces(con)
\ No newline at end of file
+    if fresh_rules:
+        seed_rules(con)
+    if legacy:
+        _migrate_facts_legacy(con)
+    if con.execute("SELECT NOT EXISTS(SELECT 1 FROM account_closure) AND EXISTS(SELECT 1 FROM accounts)").fetchone()[0]:
+        rebuild_hierarchy(con)
+    init_traces(con)
+    init_spans(con)
\ No newline at end of file
@@ -8,9 +8,10 @@ from app.config import settings
 def db_conn(request: Request) -> Connection:
     """
     FastAPI dependency that returns a SQLite connection.
-    Uses app.state.con if present; otherwise initializes and caches it.
+    Uses the connection bound to the request by RequestMiddleware, else app.state.con;
+    otherwise initializes and caches it.
     """
-    con = getattr(request.app.state, "con", None)
+    con = request.scope.get("state", {}).get("con") or getattr(request.app.state, "con", None)
     if con is None:
         con = get_con(settings.db_path)
         request.app.state.con = con
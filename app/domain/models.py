@@ -9,6 +9,11 @@ class IngestResponse(BaseModel):
     inserted_facts: int  # Number of facts inserted
     inserted_metrics: int  # Number of metrics inserted
     periods: List[str]  # List of periods covered by the ingestion
+    # Incremental ingest (Rootfi) only
+    skipped: Optional[int] = None  # Periods unchanged since the last sync
+    updated: Optional[int] = None  # Periods new or changed, rewritten
+    deleted: Optional[int] = None  # Soft-deleted periods removed (tombstoned)
+    watermarks: Optional[Dict[str, str]] = None  # High-water mark per company
 
 
 # Request body model for ingestion endpoint
@@ -16,6 +21,18 @@ class IngestBody(BaseModel):
     payload: Dict[str, Any]  # Raw payload data to be ingested
 
 
+# One sub-query of POST /api/v1/batch
+class BatchQuery(BaseModel):
+    id: Optional[str] = None  # Caller's label, echoed back with the result
+    op: str  # summary | trend | anomalies | top_increase | range | compare
+    params: Dict[str, Any] = {}  # Same parameters as the matching GET endpoint
+
+
+# Request body model for the batch endpoint
+class BatchRequest(BaseModel):
+    queries: List[BatchQuery] = Field(..., min_length=1)
+
+
 # Request model for natural language query (NLQ) endpoint
 class NLQRequest(BaseModel):
     query: str = Field(..., description="Natural language question")  # The user's NLQ
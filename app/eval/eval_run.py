@@ -9,17 +9,42 @@ Eval runner for Finance AI API — LLM answers only.
         2) forced gpt-4o
         3) one random (no header)
 - Requires your /api/v1/nlq to accept X-Model header and to log traces via obs.
+- --load: async load generator over a pooled httpx client (concurrency, rate,
+  duration); reports throughput, latency percentiles per rule-based/LLM/model,
+  error rates and token throughput, plus an HDR-style histogram summary.
 
 Usage:
   python app/eval/eval_run.py --base http://localhost:8000
+  python app/eval/eval_run.py --load --concurrency 32 --rate 50 --duration 30
 """
 
 from __future__ import annotations
-import argparse, csv, json, os, re, sys, time, uuid
+import argparse, asyncio, csv, json, math, os, random, re, sys, time, uuid
 from typing import Any, Dict, List, Tuple, Callable
 
 import requests
 
+# One pooled session for the sequential mode (keep-alive instead of a TCP connect per call)
+_SESSION = requests.Session()
+
+# -------------------------------
+# Question sets (AI-only)
+# -------------------------------
+# Rule-based (these still come from the AI layer, not direct API)
+RB_QS: List[Tuple[str, Callable[[str], bool]]] = [
+    ("What was the total profit in Q1 2024?", lambda a: "profit" in a.lower()),
+    ("Show me revenue trends for 2024",       lambda a: "revenue" in a.lower()),
+    ("Which expense category had the highest increase 2024?", lambda a: "increase" in a.lower() or "expense" in a.lower()),
+    ("Compare Q1 and Q2 performance 2024",    lambda a: ("q1" in a.lower() and "q2" in a.lower()) or "vs" in a.lower()),
+]
+
+# LLM-fallback questions (should NOT match rule-based regex in your service, to exercise the LLM)
+LLM_QS: List[Tuple[str, Callable[[str], bool]]] = [
+    ("Summarize our 2024 financial performance in one sentence with concrete numbers.", lambda a: len(a.strip()) > 0),
+    ("In one sentence: what drove margin changes across months in 2024?",               lambda a: len(a.strip()) > 0),
+    ("Identify any unusual spikes or dips in 2024 and explain them in one sentence.",   lambda a: len(a.strip()) > 0),
+]
+
 # -------------------------------
 # Helpers
 # -------------------------------
@@ -35,7 +60,7 @@ def nlq(base: str, query: str, cid: str, model: str | None = None) -> Dict[str,
     headers = {"content-type": "application/json"}
     if model:
         headers["X-Model"] = model  # server must honor this to force the model
-    r = requests.post(f"{base}/api/v1/nlq",
+    r = _SESSION.post(f"{base}/api/v1/nlq",
                       json={"query": query, "conversation_id": cid},
                       headers=headers, timeout=60)
     if not (200 <= r.status_code < 300):
@@ -44,8 +69,8 @@ def nlq(base: str, query: str, cid: str, model: str | None = None) -> Dict[str,
 
 def traces_by_conv(base: str, cid: str) -> List[Dict[str, Any]]:
     try:
-        r = requests.get(f"{base}/api/v1/obs/traces/by_conv",
-                         params={"conversation_id": cid},
+        r = _SESSION.get(f"{base}/api/v1/obs/traces/by_conv",
+                         params={"conversation_id": cid, "limit": 1, "spans": "false"},
                          timeout=30)
         if r.status_code != 200:
             return []
@@ -57,6 +82,249 @@ def latest_obs_row(base: str, cid: str) -> Dict[str, Any] | None:
     rows = traces_by_conv(base, cid)
     return rows[0] if rows else None
 
+# -------------------------------
+# Load mode
+# -------------------------------
+class LatencyHistogram:
+    """
+    HDR-style histogram: values are bucketed to 3 significant digits, so memory
+    stays bounded and percentiles are accurate to ~0.1% at any magnitude.
+    """
+
+    def __init__(self, sig_digits: int = 3):
+        self.sig = sig_digits
+        self.counts: Dict[float, int] = {}
+        self.total = 0
+        self.max = 0.0
+        self.min = math.inf
+        self.sum = 0.0
+
+    def _key(self, v: float) -> float:
+        if v <= 0:
+            return 0.0
+        mag = math.floor(math.log10(v)) - (self.sig - 1)
+        step = 10.0 ** mag
+        return math.ceil(v / step) * step
+
+    def record(self, v: float):
+        k = self._key(v)
+        self.counts[k] = self.counts.get(k, 0) + 1
+        self.total += 1
+        self.sum += v
+        self.max = max(self.max, v)
+        self.min = min(self.min, v)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.total:
+            return None
+        # Tolerance so float error (99.9 / 100 * 1000 = 999.0000000000001) does not skip a rank
+        rank = max(1, math.ceil(q / 100.0 * self.total - 1e-9))
+        seen = 0
+        for k in sorted(self.counts):
+            seen += self.counts[k]
+            if seen >= rank:
+                return round(min(k, self.max), 3)
+        return round(self.max, 3)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.total,
+            "mean": round(self.sum / self.total, 3) if self.total else None,
+            "min": round(self.min, 3) if self.total else None,
+            "p50": self.percentile(50), "p90": self.percentile(90), "p95": self.percentile(95),
+            "p99": self.percentile(99), "p99.9": self.percentile(99.9),
+            "max": round(self.max, 3) if self.total else None,
+        }
+
+    def percentile_distribution(self) -> str:
+        """
+        Render in HdrHistogram's text layout: Value, Percentile, TotalCount, 1/(1-Percentile).
+        """
+        lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}", ""]
+        seen = 0
+        for k in sorted(self.counts):
+            seen += self.counts[k]
+            p = seen / self.total
+            inv = "inf" if p >= 1.0 else f"{1.0 / (1.0 - p):.2f}"
+            lines.append(f"{k:12.3f} {p:14.12f} {seen:10d} {inv:>14}")
+        lines.append(f"#[Mean    = {self.sum / max(self.total, 1):12.3f}, Max     = {self.max:12.3f}]")
+        lines.append(f"#[Count   = {self.total:12d}]")
+        return "\n".join(lines) + "\n"
+
+
+def classify(trace: List[Dict[str, Any]]) -> Tuple[str, str | None]:
+    """
+    (route, model) from a successful NLQ response's trace: 'rb' for rule-based tools,
+    'llm' when the LLM answered, 'other' for skipped/failed fallbacks.
+    """
+    for t in trace:
+        if "tool" in t:
+            return "rb", None
+        if "llm" in t:
+            return "llm", t.get("model")
+    return "other", None
+
+
+async def _latest_trace_id(client) -> int:
+    r = await client.get("/api/v1/obs/traces/recent", params={"limit": 1, "spans": "false"})
+    rows = r.json().get("rows", []) if r.status_code == 200 else []
+    return rows[0]["id"] if rows else 0
+
+
+async def _traces_since(client, after_id: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Page through server traces newer than `after_id` once at the end, keyed by request_id
+    (replaces a per-answer /traces/by_conv round trip).
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    before = None
+    while True:
+        params: Dict[str, Any] = {"limit": 1000, "spans": "false"}
+        if before is not None:
+            params["before_id"] = before
+        r = await client.get("/api/v1/obs/traces/recent", params=params)
+        if r.status_code != 200:
+            return out
+        body = r.json()
+        for row in body.get("rows", []):
+            if row["id"] <= after_id:
+                return out
+            if row.get("request_id"):
+                out[row["request_id"]] = row
+        before = body.get("next_cursor")
+        if before is None:
+            return out
+
+
+async def run_load(base: str, args, csv_path: str, json_path: str, hdr_path: str,
+                   transport=None) -> Dict[str, Any]:
+    """
+    Drive /api/v1/nlq at the requested concurrency/rate for `duration` seconds.
+    With --rate, latency is measured from each request's *scheduled* start, so
+    queueing delay is not hidden (coordinated-omission correction).
+    Failed requests (429/503 from admission control, transport errors as status 0) carry
+    no trace and count against the route of the question asked; status codes are
+    reported per group. `transport` is an optional httpx transport (tests).
+    """
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: List[Dict[str, Any]] = []
+    sem = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(0)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60, transport=transport) as client:
+        start_id = await _latest_trace_id(client)
+
+        async def one(question: str, kind: str, scheduled: float):
+            rid = f"load-{uuid.uuid4().hex}"
+            try:
+                r = await client.post("/api/v1/nlq", json={"query": question},
+                                      headers={"x-request-id": rid})
+                status = r.status_code
+                body = r.json() if status == 200 else {}
+            except Exception as e:
+                status, body = 0, {"error": str(e)}
+            finally:
+                sem.release()
+            route, model = classify(body.get("trace") or []) if status == 200 else (kind, None)
+            results.append({
+                "ts": now_iso(), "kind": kind, "question": question, "request_id": rid,
+                "status": status, "route": route, "model": model,
+                "latency_ms": (time.perf_counter() - scheduled) * 1000.0,
+                "answer": body.get("answer"), "error": body.get("error"),
+            })
+
+        tasks = []
+        t0 = time.perf_counter()
+        i = 0
+        while True:
+            scheduled = t0 + (i / args.rate if args.rate > 0 else 0.0)
+            now = time.perf_counter()
+            if (scheduled if args.rate > 0 else now) - t0 >= args.duration:
+                break
+            if args.rate > 0 and scheduled > now:
+                await asyncio.sleep(scheduled - now)
+            await sem.acquire()
+            if args.rate <= 0:
+                scheduled = time.perf_counter()
+            use_llm = rng.random() < args.llm_share
+            q, _ = rng.choice(LLM_QS if use_llm else RB_QS)
+            tasks.append(asyncio.create_task(one(q, "llm" if use_llm else "rb", scheduled)))
+            i += 1
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+        obs = await _traces_since(client, start_id)
+
+    # Join server-side model/tokens onto client-side results by request id
+    overall = LatencyHistogram()
+    groups: Dict[str, LatencyHistogram] = {}
+    errors: Dict[str, int] = {}
+    statuses: Dict[str, Dict[str, int]] = {}
+    tok_p = tok_c = 0
+    for r in results:
+        o = obs.get(r["request_id"], {})
+        r["model"] = o.get("model") or r["model"]
+        r["tokens_prompt"] = o.get("tokens_prompt")
+        r["tokens_completion"] = o.get("tokens_completion")
+        r["server_latency_ms"] = o.get("latency_ms")
+        tok_p += r["tokens_prompt"] or 0
+        tok_c += r["tokens_completion"] or 0
+        ok = r["status"] == 200
+        for key in ("all", f"route:{r['route']}", f"model:{r['model']}" if r["model"] else None):
+            if key is None:
+                continue
+            hist = overall if key == "all" else groups.setdefault(key, LatencyHistogram())
+            by_status = statuses.setdefault(key, {})
+            by_status[str(r["status"])] = by_status.get(str(r["status"]), 0) + 1
+            if ok:
+                hist.record(r["latency_ms"])
+            else:
+                errors[key] = errors.get(key, 0) + 1
+
+    n = len(results)
+    summary = {
+        "kind": "summary",
+        "config": {"concurrency": args.concurrency, "rate": args.rate, "duration": args.duration,
+                   "llm_share": args.llm_share},
+        "overall": {
+            "requests": n, "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(n / elapsed, 2) if elapsed else None,
+            "error_rate": round(errors.get("all", 0) / n, 4) if n else 0.0,
+            "status": statuses.get("all", {}),
+            "latency_ms": overall.summary(),
+            "tokens_prompt": tok_p, "tokens_completion": tok_c,
+            "tokens_per_s": round((tok_p + tok_c) / elapsed, 2) if elapsed else None,
+        },
+        "groups": {
+            k: {"latency_ms": h.summary(),
+                "error_rate": round(errors.get(k, 0) / (h.total + errors.get(k, 0)), 4),
+                "status": statuses.get(k, {})}
+            for k, h in sorted(groups.items())
+        },
+    }
+
+    with open(csv_path, "w", newline="", encoding="utf-8") as csv_fp:
+        w = csv.writer(csv_fp)
+        w.writerow([
+            "ts", "kind", "question", "status",
+            "latency_ms", "model", "tokens_prompt", "tokens_completion",
+            "answer_len", "answer_excerpt"
+        ])
+        for r in results:
+            ans = r["answer"] or r["error"] or ""
+            w.writerow([r["ts"], r["kind"], r["question"], r["status"], round(r["latency_ms"], 2),
+                        r["model"] or "", r["tokens_prompt"] or "", r["tokens_completion"] or "",
+                        len(ans), ans[:160].replace("\n", " ")])
+    with open(json_path, "w", encoding="utf-8") as json_fp:
+        for r in results:
+            json_fp.write(json.dumps(r, ensure_ascii=False) + "\n")
+        json_fp.write(json.dumps(summary, ensure_ascii=False) + "\n")
+    with open(hdr_path, "w", encoding="utf-8") as hdr_fp:
+        hdr_fp.write(overall.percentile_distribution())
+    return summary
+
+
 # -------------------------------
 # Main
 # -------------------------------
@@ -75,6 +343,12 @@ def main():
     ap.add_argument("--json", default=None, help="JSONL path; default: <out-dir>/answers.jsonl")
     ap.add_argument("--mini", default="gpt-4o-mini", help="Mini model variant")
     ap.add_argument("--full", default="gpt-4o", help="Full model variant")
+    ap.add_argument("--load", action="store_true", help="Run the async load generator instead of the eval")
+    ap.add_argument("--concurrency", type=int, default=16, help="Load: max in-flight requests")
+    ap.add_argument("--rate", type=float, default=0.0, help="Load: target requests/s (0 = closed loop, as fast as concurrency allows)")
+    ap.add_argument("--duration", type=float, default=30.0, help="Load: seconds to generate load")
+    ap.add_argument("--llm-share", type=float, default=0.0, help="Load: fraction of requests drawn from the LLM question set")
+    ap.add_argument("--hdr", default=None, help="Load: HDR histogram summary path; default: <out-dir>/latency_hdr.txt")
     args = ap.parse_args()
 
     base = args.base.rstrip("/")
@@ -87,21 +361,15 @@ def main():
     ensure_parent_dir(csv_path)
     ensure_parent_dir(json_path)
 
-    # ---- Question sets (AI-only) ----
-    # Rule-based (these still come from the AI layer, not direct API)
-    RB_QS: List[Tuple[str, Callable[[str], bool]]] = [
-        ("What was the total profit in Q1 2024?", lambda a: "profit" in a.lower()),
-        ("Show me revenue trends for 2024",       lambda a: "revenue" in a.lower()),
-        ("Which expense category had the highest increase 2024?", lambda a: "increase" in a.lower() or "expense" in a.lower()),
-        ("Compare Q1 and Q2 performance 2024",    lambda a: ("q1" in a.lower() and "q2" in a.lower()) or "vs" in a.lower()),
-    ]
-
-    # LLM-fallback questions (should NOT match rule-based regex in your service, to exercise the LLM)
-    LLM_QS: List[Tuple[str, Callable[[str], bool]]] = [
-        ("Summarize our 2024 financial performance in one sentence with concrete numbers.", lambda a: len(a.strip()) > 0),
-        ("In one sentence: what drove margin changes across months in 2024?",               lambda a: len(a.strip()) > 0),
-        ("Identify any unusual spikes or dips in 2024 and explain them in one sentence.",   lambda a: len(a.strip()) > 0),
-    ]
+    if args.load:
+        hdr_path = args.hdr or os.path.join(out_dir, "latency_hdr.txt")
+        ensure_parent_dir(hdr_path)
+        summary = asyncio.run(run_load(base, args, csv_path, json_path, hdr_path))
+        print(json.dumps(summary["overall"], indent=2))
+        print(f"[OK] CSV saved: {csv_path}")
+        print(f"[OK] JSONL saved: {json_path}")
+        print(f"[OK] HDR summary saved: {hdr_path}")
+        return
 
     # Prepare writers
     with open(csv_path, "w", newline="", encoding="utf-8") as csv_fp, open(json_path, "w", encoding="utf-8") as json_fp:
@@ -1,44 +1,23 @@
 from __future__ import annotations
-from fastapi import FastAPI, Request, Depends
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from sqlite3 import Connection
 
 from app.config import settings
 from app.db.db import get_con, init_db
-from app.routers import ingest, metrics, analytics, nlq, health, obs
-from app.services.ingestion import auto_ingest
-from app.obs.logger import logging_middleware
-from app.obs.metrics import metrics_middleware, router_metrics
+from app.routers import ingest, metrics, analytics, accounts, reconcile, export, batch, nlq, health, obs
+from app.obs.metrics import router_metrics
+from app.obs.middleware import RequestMiddleware
+from app.obs.retention import start_compactor
+from app.services.startup import start_background_init
+from app.utils.jsonfast import FastJSONResponse
 
 # Initialize FastAPI app with metadata
-app = FastAPI(title="Kudwa AI API", version="0.2.1")
+app = FastAPI(title="Kudwa AI API", version="0.2.1", default_response_class=FastJSONResponse)
 
-# Middleware: inject a SQLite connection into each request
-@app.middleware("http")
-async def db_session_middleware(request: Request, call_next):
-    """
-    Middleware to attach a SQLite connection to the request state.
-    """
-    con: Connection = get_con(settings.db_path)
-    request.state.con = con
-    response = await call_next(request)
-    return response
-
-# Middleware: override FastAPI dependency for Connection to use request state
-@app.middleware("http")
-async def add_con_dependency(request: Request, call_next):
-    """
-    Middleware to override the Connection dependency for all routes.
-    """
-    async def _get_con():
-        return request.state.con
-    request.app.dependency_overrides[Connection] = _get_con
-    return await call_next(request)
-
-# Add logging and metrics middleware
-app.middleware("http")(logging_middleware)
-app.middleware("http")(metrics_middleware)
+# One pure-ASGI layer: request id, root span, logging, Prometheus metrics and DB binding
+app.add_middleware(RequestMiddleware)
 
 # Custom error handler for validation errors
 @app.exception_handler(RequestValidationError)
@@ -46,20 +25,21 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     """
     Return a JSON response with details on validation errors.
     """
-    return JSONResponse(status_code=422, content={"detail": exc.errors(), "body": exc.body})
+    return JSONResponse(status_code=422, content=jsonable_encoder({"detail": exc.errors(), "body": exc.body}))
 
-# Startup event: initialize DB and optionally auto-ingest data
+# Startup event: initialize DB; warm-up and auto-ingest run in the background
 @app.on_event("startup")
 def on_startup():
     """
-    Initialize the database and optionally auto-ingest data on startup.
+    Initialize the database, then hand deferred work (module warm-up, optional
+    auto-ingest) to a background thread so the server takes requests right away.
+    Readiness is reported by /health.
     """
     con = get_con(settings.db_path)
     init_db(con)
     app.state.con = con
-    if settings.auto_ingest:
-        from app.services.ingestion import auto_ingest
-        auto_ingest(con, settings.qb_file, settings.rootfi_file)
+    start_compactor(settings.db_path)
+    start_background_init()
 
 # Register routers for all API endpoints
 app.include_router(router_metrics)
@@ -68,4 +48,8 @@ app.include_router(health.router)
 app.include_router(ingest.router)
 app.include_router(metrics.router)
 app.include_router(analytics.router)
+app.include_router(accounts.router)
+app.include_router(reconcile.router)
+app.include_router(export.router)
+app.include_router(batch.router)
 app.include_router(nlq.router)
\ No newline at end of file
@@ -1,13 +1,18 @@
 from __future__ import annotations
-import json, logging, sys, time, uuid
-from typing import Any, Dict
-from fastapi import Request
+import atexit, logging, queue, random, sys
+from logging.handlers import QueueHandler, QueueListener
+from app.config import settings
+from app.obs.metrics import registry as prom_registry
+from app.utils.jsonfast import dumps
 
 # List of keys used in the JSON log format
 JSON_FMT_KEYS = [
     "ts", "level", "event", "request_id", "method", "path", "status", "duration_ms", "extra"
 ]
 
+# Standard LogRecord attributes, computed once; anything else on a record is an `extra` field
+_RESERVED = frozenset(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime", "taskName"}
+
 
 class JsonFormatter(logging.Formatter):
     """
@@ -21,46 +26,64 @@ class JsonFormatter(logging.Formatter):
             "event": record.getMessage(),       # Log message
         }
         # Attach extra fields from the log record, excluding standard attributes
-        for k, v in getattr(record, "__dict__", {}).items():
-            if k in ("args", "msg", "levelno", "levelname", "pathname", "filename", "module", "exc_info", "exc_text", "stack_info", "lineno", "funcName", "created", "msecs", "relativeCreated", "thread", "threadName", "processName", "process", "name"):
-                continue
-            payload[k] = v
-        return json.dumps(payload, ensure_ascii=False)
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED:
+                payload[k] = v
+        return dumps(payload, default=str).decode("utf-8")
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Non-blocking QueueHandler: hands the raw record to the listener thread
+    (formatting happens there) and counts records dropped when the queue is full.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # In-process queue: no need to pre-format or strip exc_info as the stdlib does
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            prom_registry().LOG_DROPPED.inc()
 
 
-# Configure the main logger for the application
+# Configure the main logger for the application: callers only enqueue,
+# a background listener thread formats and writes to stdout
 logger = logging.getLogger("finance_ai")
 handler = logging.StreamHandler(sys.stdout)
 handler.setFormatter(JsonFormatter())
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=settings.log_queue_size)
+listener = QueueListener(log_queue, handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)  # flush what is queued on shutdown
 logger.setLevel(logging.INFO)
-logger.addHandler(handler)
+logger.addHandler(DroppingQueueHandler(log_queue))
 logger.propagate = False  # Prevent duplicate logs
 
+# Paths whose successful `request_done` lines are sampled at LOG_SAMPLE_RATE
+_SAMPLED_PATHS = frozenset(p.strip() for p in settings.log_sample_paths.split(",") if p.strip())
 
-async def logging_middleware(request: Request, call_next):
+
+def sampled(path: str, status: int, rate: float) -> bool:
     """
-    FastAPI middleware for logging HTTP requests and responses in JSON format.
-    Adds a unique request ID and logs request details and duration.
+    True if a finished request's telemetry should be kept: always, except for successful
+    requests to the hot endpoints (LOG_SAMPLE_PATHS), which are kept at `rate`.
     """
-    rid = request.headers.get("x-request-id") or str(uuid.uuid4())  # Unique request ID
-    start = time.perf_counter()
-    try:
-        resp = await call_next(request)
-        status = resp.status_code
-    except Exception as e:
-        status = 500
-        logger.exception("request_error", extra={
-            "request_id": rid, "method": request.method, "path": request.url.path, "error": str(e)
-        })
-        raise
-    finally:
-        dur = (time.perf_counter() - start) * 1000.0  # Duration in ms
+    return path not in _SAMPLED_PATHS or status >= 400 or random.random() < rate
+
+
+def log_request(rid: str, method: str, path: str, status: int, duration_ms: float):
+    """
+    Emit the `request_done` line of a finished request. Hot endpoints (health, metrics)
+    are sampled at LOG_SAMPLE_RATE unless they fail.
+    """
+    if sampled(path, status, settings.log_sample_rate):
         logger.info("request_done", extra={
             "request_id": rid,
-            "method": request.method,
-            "path": request.url.path,
+            "method": method,
+            "path": path,
             "status": status,
-            "duration_ms": round(dur, 2),
+            "duration_ms": round(duration_ms, 2),
         })
-    resp.headers["x-request-id"] = rid  # Add request ID to response headers
-    return resp
\ No newline at end of file
@@ -1,19 +1,56 @@
-import time
-from fastapi import APIRouter, Request, Response
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-
-# Prometheus metric: total HTTP requests, labeled by method, path, and status
-REQUESTS = Counter(
-    "fa_requests_total", "Total HTTP requests", ["method", "path", "status"]
-)
-# Prometheus metric: request latency in milliseconds, with custom buckets
-LATENCY = Histogram(
-    "fa_request_latency_ms", "Request latency (ms)", buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
-)
-# Prometheus metric: AI tokens used, labeled by kind (prompt|completion) and model
-AI_TOKENS = Counter(
-    "fa_ai_tokens", "AI tokens used", ["kind", "model"]
-)
+import threading
+from types import SimpleNamespace
+from fastapi import APIRouter, Response
+
+# prometheus_client (and the http.server / urllib / wsgiref modules it pulls in) is imported
+# on first use, not at app import: metrics are created by `registry()` and are also reachable
+# as module attributes (`app.obs.metrics.AI_TOKENS`) through __getattr__ below.
+_LOCK = threading.Lock()
+_METRICS = None
+
+
+def registry() -> SimpleNamespace:
+    """
+    Import prometheus_client and create the process-wide metrics, once.
+    """
+    global _METRICS
+    if _METRICS is None:
+        with _LOCK:
+            if _METRICS is None:
+                from prometheus_client import Counter, Gauge, Histogram
+                _METRICS = SimpleNamespace(
+                    # Total HTTP requests, labeled by method, path, and status
+                    REQUESTS=Counter("fa_requests_total", "Total HTTP requests", ["method", "path", "status"]),
+                    # Request latency in milliseconds, with custom buckets
+                    LATENCY=Histogram(
+                        "fa_request_latency_ms", "Request latency (ms)",
+                        buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+                    ),
+                    # AI tokens used, labeled by kind (prompt|completion) and model
+                    AI_TOKENS=Counter("fa_ai_tokens", "AI tokens used", ["kind", "model"]),
+                    # Log records dropped because the async log queue was full
+                    LOG_DROPPED=Counter("fa_log_dropped_total", "Log records dropped on queue overflow"),
+                    # Spans dropped because the span writer's queue was full
+                    SPANS_DROPPED=Counter("fa_spans_dropped_total", "Spans dropped on queue overflow"),
+                    # LLM admission control (app.services.admission)
+                    LLM_INFLIGHT=Gauge("fa_llm_inflight", "LLM calls running"),
+                    LLM_QUEUED=Gauge("fa_llm_queued", "LLM calls waiting for a slot"),
+                    LLM_SHED=Counter("fa_llm_shed_total", "NLQ requests refused before the LLM", ["reason"]),
+                    LLM_BREAKER=Gauge("fa_llm_breaker_state", "LLM circuit breaker: 0 closed, 1 half-open, 2 open"),
+                    RATE_LIMIT_CLIENTS=Gauge("fa_rate_limit_clients", "Clients tracked by the NLQ rate limiter"),
+                    # NLQ routing: rule (regex) | classifier | llm; LLM avoidance = non-llm share
+                    NLQ_ROUTES=Counter("fa_nlq_routes_total", "NLQ questions by how they were routed", ["route"]),
+                    CACHE_LOOKUPS=Counter("fa_cache_lookups_total", "Result cache lookups", ["cache", "result"]),
+                )
+    return _METRICS
+
+
+def __getattr__(name: str):
+    if name in ("REQUESTS", "LATENCY", "AI_TOKENS", "LOG_DROPPED", "SPANS_DROPPED", "LLM_INFLIGHT", "LLM_QUEUED", "LLM_SHED",
+                "LLM_BREAKER", "RATE_LIMIT_CLIENTS", "NLQ_ROUTES", "CACHE_LOOKUPS"):
+        return getattr(registry(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # FastAPI router for exposing metrics endpoint
 router_metrics = APIRouter()
@@ -23,15 +60,14 @@ def metrics():
     """
     Expose Prometheus metrics at /metrics endpoint.
     """
+    from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+    registry()
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
-async def metrics_middleware(request: Request, call_next):
+def observe_request(method: str, path: str, status: int, duration_ms: float):
     """
-    Middleware to record request count and latency for each HTTP request.
+    Record request count and latency for one HTTP request.
     """
-    start = time.perf_counter()
-    resp = await call_next(request)
-    dur_ms = (time.perf_counter() - start) * 1000.0
-    REQUESTS.labels(request.method, request.url.path, str(resp.status_code)).inc()
-    LATENCY.observe(dur_ms)
-    return resp
\ No newline at end of file
+    m = registry()
+    m.REQUESTS.labels(method, path, str(status)).inc()
+    m.LATENCY.observe(duration_ms)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import time, uuid
+from typing import Any, Callable, Dict
+from app.config import settings
+from app.db.db import get_con
+from app.obs.logger import log_request, logger, sampled
+from app.obs.metrics import observe_request
+from app.obs.spans import span, start_request, end_request, export as export_spans
+
+Scope = Dict[str, Any]
+
+
+class RequestMiddleware:
+    """
+    Pure ASGI middleware doing, in one pass and in the request's own task: request id
+    (x-request-id in, echoed out), the root span, the `request_done` log line, Prometheus
+    count and latency, and binding the SQLite connection to the request (scope state,
+    read by `db_conn`). Nothing global is mutated per request, and response bodies,
+    streaming ones included, pass through untouched.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        for k, v in scope["headers"]:
+            if k == b"x-request-id":
+                rid = v.decode("latin-1")
+                break
+        rid = rid or str(uuid.uuid4())
+        rid_header = (b"x-request-id", rid.encode("latin-1"))
+        scope.setdefault("state", {})["con"] = get_con(settings.db_path)
+        method, path = scope["method"], scope["path"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message: Dict[str, Any]):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", ()), rid_header]}
+            await send(message)
+
+        span_token = start_request(rid)
+        try:
+            with span(f"{method} {path}"):
+                await self.app(scope, receive, send_with_id)
+        except Exception as e:
+            status = 500
+            logger.exception("request_error", extra={
+                "request_id": rid, "method": method, "path": path, "error": str(e)
+            })
+            raise
+        finally:
+            dur = (time.perf_counter() - start) * 1000.0
+            log_request(rid, method, path, status, dur)
+            observe_request(method, path, status, dur)
+            rec = end_request(span_token)
+            if sampled(path, status, settings.span_sample_rate):
+                export_spans(rec)
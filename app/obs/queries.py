@@ -0,0 +1,259 @@
+from __future__ import annotations
+import re, sqlite3, threading, time
+from typing import Any, Dict, List, Optional, Sequence
+from app.config import settings
+from app.obs.logger import logger
+
+# Regexes used to turn a SQL statement into a literal-free fingerprint
+_RE_STR = re.compile(r"'(?:[^']|'')*'")
+_RE_NUM = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_WS = re.compile(r"\s+")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+# Only read statements are safe to re-run under EXPLAIN QUERY PLAN
+_EXPLAINABLE = ("select", "with")
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a SQL statement: strip literals, collapse whitespace and IN-lists.
+    Two calls that differ only by literal values share the same fingerprint.
+    """
+    s = _RE_STR.sub("?", sql)
+    s = _RE_NUM.sub("?", s)
+    s = _RE_WS.sub(" ", s).strip()
+    return _RE_IN_LIST.sub("(?+)", s)
+
+
+def params_shape(params: Any) -> str:
+    """
+    Describe bound parameters by type only (never by value), e.g. "(str,int,int)".
+    """
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ",".join(f"{k}:{type(v).__name__}" for k, v in params.items()) + "}"
+    try:
+        return "(" + ",".join(type(v).__name__ for v in params) + ")"
+    except TypeError:
+        return type(params).__name__
+
+
+class QueryProfiler:
+    """
+    Aggregates per-fingerprint statistics for statements run through ProfilingConnection.
+    Keeps a bounded list of the slowest individual executions.
+    """
+
+    def __init__(self, enabled: bool, slow_ms: float, explain: bool, keep_slowest: int = 100):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.keep_slowest = keep_slowest
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._slowest: List[Dict[str, Any]] = []
+        self._plans: Dict[str, List[str]] = {}
+
+    def record(self, sql: str, params: Any, rows: int, elapsed_ms: float, plan: Optional[List[str]] = None):
+        """
+        Record one execution; emits a `slow_query` log line when over the threshold.
+        """
+        fp = fingerprint(sql)
+        shape = params_shape(params)
+        with self._lock:
+            st = self._stats.get(fp)
+            if st is None:
+                st = self._stats[fp] = {
+                    "fingerprint": fp, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "rows": 0, "params_shape": shape, "slow_calls": 0,
+                }
+            st["calls"] += 1
+            st["total_ms"] += elapsed_ms
+            st["rows"] += rows
+            if elapsed_ms > st["max_ms"]:
+                st["max_ms"] = elapsed_ms
+            if plan is not None:
+                self._plans[fp] = plan
+            if elapsed_ms < self.slow_ms:
+                return
+            st["slow_calls"] += 1
+            sample = {
+                "fingerprint": fp, "params_shape": shape, "rows": rows,
+                "elapsed_ms": round(elapsed_ms, 3), "ts": time.time(),
+            }
+            self._slowest.append(sample)
+            if len(self._slowest) > self.keep_slowest * 2:
+                self._slowest.sort(key=lambda s: s["elapsed_ms"], reverse=True)
+                del self._slowest[self.keep_slowest:]
+        logger.warning("slow_query", extra={
+            "fingerprint": fp, "params_shape": shape, "rows": rows,
+            "duration_ms": round(elapsed_ms, 2), "plan": self._plans.get(fp),
+        })
+
+    def needs_plan(self, sql: str, elapsed_ms: float) -> bool:
+        """
+        True if an EXPLAIN QUERY PLAN should be captured for this (slow, read-only) statement.
+        """
+        if not self.explain or elapsed_ms < self.slow_ms:
+            return False
+        if not sql.lstrip()[:6].lower().startswith(_EXPLAINABLE):
+            return False
+        fp = fingerprint(sql)
+        with self._lock:
+            return fp not in self._plans
+
+    def top(self, limit: int = 20, order: str = "max_ms") -> Dict[str, Any]:
+        """
+        Return the top-N fingerprints ordered by `max_ms`, `total_ms` or `calls`, plus the slowest samples.
+        """
+        with self._lock:
+            stats = [dict(s) for s in self._stats.values()]
+            slowest = sorted(self._slowest, key=lambda s: s["elapsed_ms"], reverse=True)[:limit]
+            plans = dict(self._plans)
+        for s in stats:
+            s["avg_ms"] = round(s["total_ms"] / s["calls"], 3) if s["calls"] else 0.0
+            s["total_ms"] = round(s["total_ms"], 3)
+            s["max_ms"] = round(s["max_ms"], 3)
+            s["plan"] = plans.get(s["fingerprint"])
+        stats.sort(key=lambda s: s.get(order) or 0, reverse=True)
+        return {
+            "enabled": self.enabled,
+            "slow_ms": self.slow_ms,
+            "queries": stats[:limit],
+            "slowest": slowest,
+        }
+
+    def reset(self):
+        """
+        Drop all collected statistics.
+        """
+        with self._lock:
+            self._stats.clear()
+            self._slowest.clear()
+            self._plans.clear()
+
+
+# Process-wide profiler, configured from settings
+PROFILER = QueryProfiler(
+    enabled=settings.query_profiling,
+    slow_ms=settings.slow_query_ms,
+    explain=settings.explain_slow_queries,
+)
+
+
+def _explain(con: sqlite3.Connection, sql: str, params: Any) -> Optional[List[str]]:
+    """
+    EXPLAIN QUERY PLAN of a statement, run unprofiled; None if it cannot be explained.
+    """
+    try:
+        return [r[-1] for r in sqlite3.Connection.execute(con, "EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+    except sqlite3.Error:
+        return None
+
+
+class _ProfiledCursor:
+    """
+    Proxy over a read cursor that adds time spent fetching to the execute time and counts
+    rows as they are read. The statement is recorded once, when the rows run out or the
+    cursor is closed or dropped, so results are never buffered on the profiler's account;
+    its plan is captured then if the total time makes it slow.
+    """
+
+    __slots__ = ("_cur", "_sql", "_params", "_elapsed", "_rows", "_done")
+
+    def __init__(self, cur: sqlite3.Cursor, sql: str, params: Any, elapsed_ms: float):
+        object.__setattr__(self, "_cur", cur)
+        object.__setattr__(self, "_sql", sql)
+        object.__setattr__(self, "_params", params)
+        object.__setattr__(self, "_elapsed", elapsed_ms)
+        object.__setattr__(self, "_rows", 0)
+        object.__setattr__(self, "_done", False)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cur, name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._cur, name, value)
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        out = fn(*args)
+        object.__setattr__(self, "_elapsed", self._elapsed + (time.perf_counter() - start) * 1000.0)
+        return out
+
+    def _finish(self):
+        if not self._done:
+            object.__setattr__(self, "_done", True)
+            plan = None
+            if PROFILER.needs_plan(self._sql, self._elapsed):
+                plan = _explain(self._cur.connection, self._sql, self._params)
+            PROFILER.record(self._sql, self._params, self._rows, self._elapsed, plan)
+
+    def fetchone(self):
+        r = self._timed(self._cur.fetchone)
+        if r is None:
+            self._finish()
+        else:
+            object.__setattr__(self, "_rows", self._rows + 1)
+        return r
+
+    def fetchmany(self, size: Optional[int] = None):
+        size = self._cur.arraysize if size is None else size
+        out = self._timed(self._cur.fetchmany, size)
+        object.__setattr__(self, "_rows", self._rows + len(out))
+        if len(out) < size:
+            self._finish()
+        return out
+
+    def fetchall(self):
+        out = self._timed(self._cur.fetchall)
+        object.__setattr__(self, "_rows", self._rows + len(out))
+        self._finish()
+        return out
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        r = self.fetchone()
+        if r is None:
+            raise StopIteration
+        return r
+
+    def close(self):
+        self._finish()
+        self._cur.close()
+
+    def __del__(self):
+        self._finish()
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection that times `execute`/`executemany` through PROFILER.
+    When profiling is disabled the only overhead is one attribute check per call.
+    """
+
+    def execute(self, sql: str, parameters: Sequence[Any] | Dict[str, Any] = (), /):
+        if not PROFILER.enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        cur = super().execute(sql, parameters)
+        elapsed = (time.perf_counter() - start) * 1000.0
+        if cur.description is not None:
+            # Recorded (and explained, if slow) once its rows have been read
+            return _ProfiledCursor(cur, sql, parameters, elapsed)
+        plan = _explain(self, sql, parameters) if PROFILER.needs_plan(sql, elapsed) else None
+        PROFILER.record(sql, parameters, max(cur.rowcount, 0), elapsed, plan)
+        return cur
+
+    def executemany(self, sql: str, seq_of_parameters, /):
+        if not PROFILER.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        params = list(seq_of_parameters)
+        start = time.perf_counter()
+        cur = super().executemany(sql, params)
+        elapsed = (time.perf_counter() - start) * 1000.0
+        PROFILER.record(sql, params[0] if params else None, max(cur.rowcount, 0), elapsed)
+        return cur
@@ -0,0 +1,113 @@
+from __future__ import annotations
+import sqlite3, threading
+from datetime import datetime, timedelta
+from sqlite3 import Connection
+from typing import Dict, Optional, Tuple
+from app.config import settings
+from app.obs.logger import logger
+from app.obs.spans import attach_spans
+
+
+def _delete_batched(con: Connection, where: str, params: tuple, table: str, batch: int) -> Tuple[int, int]:
+    """
+    Delete matching rows `batch` at a time, one short transaction per batch,
+    so readers and the request path never wait on one long write lock.
+    For ai_traces, each batch's spans (by request_id) go in the same transaction.
+    Returns (rows, span rows) deleted.
+    """
+    pick = f"SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT ?"
+    total = spans = 0
+    while True:
+        with con:
+            if table == "ai_traces":
+                spans += con.execute(
+                    f"DELETE FROM spans WHERE request_id IN (SELECT request_id FROM ai_traces WHERE id IN ({pick}))",
+                    (*params, batch),
+                ).rowcount or 0
+            cur = con.execute(f"DELETE FROM {table} WHERE id IN ({pick})", (*params, batch))
+        n = cur.rowcount or 0
+        total += n
+        if n < batch:
+            return total, spans
+
+
+def _id_floor(con: Connection, table: str, keep: int) -> Optional[int]:
+    """
+    Highest id that falls outside the newest `keep` rows, or None if under the cap.
+    """
+    row = con.execute(f"SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET ?", (keep,)).fetchone()
+    return row[0] if row else None
+
+
+def compact_traces(con: Connection, vacuum: bool = False) -> Dict[str, int]:
+    """
+    Enforce trace retention: max age and max rows for ai_traces, max rows for spans.
+    Deleted traces take their spans with them. Hourly rollups in ai_trace_rollups are never deleted.
+    """
+    batch = settings.trace_compact_batch
+    out = {"aged": 0, "over_cap": 0, "spans": 0}
+    if settings.trace_max_age_days > 0:
+        cutoff = (datetime.utcnow() - timedelta(days=settings.trace_max_age_days)).isoformat()
+        out["aged"], spans = _delete_batched(con, "ts < ?", (cutoff,), "ai_traces", batch)
+        out["spans"] += spans
+    if settings.trace_max_rows > 0:
+        floor = _id_floor(con, "ai_traces", settings.trace_max_rows)
+        if floor is not None:
+            out["over_cap"], spans = _delete_batched(con, "id <= ?", (floor,), "ai_traces", batch)
+            out["spans"] += spans
+    if settings.span_max_rows > 0:
+        floor = _id_floor(con, "spans", settings.span_max_rows)
+        if floor is not None:
+            out["spans"] += _delete_batched(con, "id <= ?", (floor,), "spans", batch)[0]
+    if vacuum:
+        # No-op unless the DB was created with auto_vacuum=INCREMENTAL
+        con.execute(f"PRAGMA incremental_vacuum({settings.trace_vacuum_pages})").fetchall()
+    return out
+
+
+class TraceCompactor(threading.Thread):
+    """
+    Daemon thread running compact_traces every TRACE_COMPACT_INTERVAL_S seconds
+    on its own connection, with an incremental vacuum every few passes.
+    """
+
+    VACUUM_EVERY = 12
+
+    def __init__(self, db_path: str, interval_s: float):
+        super().__init__(name="trace-compactor", daemon=True)
+        self.db_path = db_path
+        self.interval_s = interval_s
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        con = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        attach_spans(con)
+        passes = 0
+        try:
+            while not self._stop_evt.wait(self.interval_s):
+                passes += 1
+                try:
+                    out = compact_traces(con, vacuum=passes % self.VACUUM_EVERY == 0)
+                    if any(out.values()):
+                        logger.info("trace_compaction", extra=out)
+                except sqlite3.Error as e:
+                    logger.warning("trace_compaction_failed", extra={"error": str(e)})
+        finally:
+            con.close()
+
+    def stop(self):
+        self._stop_evt.set()
+
+
+_COMPACTOR: TraceCompactor | None = None
+
+
+def start_compactor(db_path: str) -> Optional[TraceCompactor]:
+    """
+    Start the singleton background compactor (disabled when the interval is 0).
+    """
+    global _COMPACTOR
+    if _COMPACTOR is None and settings.trace_compact_interval_s > 0:
+        _COMPACTOR = TraceCompactor(db_path, settings.trace_compact_interval_s)
+        _COMPACTOR.start()
+    return _COMPACTOR
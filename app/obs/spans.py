@@ -0,0 +1,435 @@
+from __future__ import annotations
+import atexit, contextvars, hashlib, json, os, queue, sqlite3, threading, time
+from contextlib import ContextDecorator
+from sqlite3 import Connection
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import settings
+
+# SQL schema for the spans table: one row per timed section of a request
+SCHEMA_SPANS = """
+CREATE TABLE IF NOT EXISTS {schema}.spans (
+    id INTEGER PRIMARY KEY,
+    request_id TEXT,
+    span_id INTEGER,
+    parent_id INTEGER,
+    name TEXT,
+    start_ms REAL,    -- offset from request start
+    duration_ms REAL,
+    attrs TEXT        -- JSON object, NULL when empty
+);
+CREATE INDEX IF NOT EXISTS {schema}.ix_spans_req ON spans(request_id);
+"""
+# Schema name the span database is attached under on connections to the main database
+SPAN_SCHEMA = "obs"
+
+# Hard cap so a pathological request cannot flood the spans table
+MAX_SPANS_PER_REQUEST = 500
+
+
+class _Recorder:
+    """
+    Collects the spans of one request. Shared by reference across the threadpool,
+    so sync endpoints append to the same list the middleware flushes.
+    """
+
+    __slots__ = ("request_id", "t0", "t0_ns", "spans", "next_id", "lock")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.t0 = time.perf_counter()
+        self.t0_ns = time.time_ns()
+        self.spans: List[Dict[str, Any]] = []
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def new_id(self) -> int:
+        with self.lock:
+            sid = self.next_id
+            self.next_id += 1
+            return sid
+
+
+_RECORDER: contextvars.ContextVar[Optional[_Recorder]] = contextvars.ContextVar("fa_span_recorder", default=None)
+_PARENT: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("fa_span_parent", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    """
+    Return the x-request-id of the request being served, if any.
+    """
+    rec = _RECORDER.get()
+    return rec.request_id if rec else None
+
+
+class span(ContextDecorator):
+    """
+    Time a section of work as a child of the current span.
+    Usable as `with span("repo.trend", metric=m):` or as `@span("repo.trend")`.
+    Outside of a request (CLI, scripts) it is a no-op.
+    """
+
+    def __init__(self, name: str, **attrs: Any):
+        self.name = name
+        self.attrs = attrs
+        self._rec: Optional[_Recorder] = None
+
+    def _recreate_cm(self):
+        # Decorated functions may run concurrently; give each call its own span
+        return span(self.name, **self.attrs)
+
+    def __enter__(self):
+        rec = self._rec = _RECORDER.get()
+        if rec is None:
+            return self
+        self._sid = rec.new_id()
+        self._token = _PARENT.set(self._sid)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        rec = self._rec
+        if rec is None:
+            return False
+        end = time.perf_counter()
+        _PARENT.reset(self._token)
+        if len(rec.spans) < MAX_SPANS_PER_REQUEST:
+            attrs = dict(self.attrs)
+            if exc_type is not None:
+                attrs["error"] = exc_type.__name__
+            rec.spans.append({
+                "span_id": self._sid,
+                "parent_id": _PARENT.get(),
+                "name": self.name,
+                "start_ms": round((self._start - rec.t0) * 1000.0, 3),
+                "duration_ms": round((end - self._start) * 1000.0, 3),
+                "attrs": attrs,
+            })
+        return False
+
+    def set(self, **attrs: Any):
+        """
+        Attach attributes discovered while the span is open (e.g. token counts).
+        """
+        self.attrs.update(attrs)
+
+
+def start_request(request_id: str) -> tuple:
+    """
+    Begin collecting spans for a request; returns a token for `end_request`.
+    The parent is cleared explicitly: the server may start a request's task from a
+    callback that captured the previous request's context on the same connection.
+    """
+    return _RECORDER.set(_Recorder(request_id)), _PARENT.set(None)
+
+
+def end_request(token: tuple) -> Optional[_Recorder]:
+    """
+    Stop collecting spans for the request and return its recorder.
+    """
+    rec = _RECORDER.get()
+    rec_token, parent_token = token
+    _PARENT.reset(parent_token)
+    _RECORDER.reset(rec_token)
+    return rec
+
+
+def _otlp_trace_id(request_id: str) -> str:
+    """
+    OTLP trace ids are 16 bytes of hex; derive one from any x-request-id string.
+    """
+    hx = request_id.replace("-", "")
+    if len(hx) == 32:
+        try:
+            int(hx, 16)
+            return hx.lower()
+        except ValueError:
+            pass
+    return hashlib.md5(request_id.encode()).hexdigest()
+
+
+def _otlp_attrs(attrs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    out = []
+    for k, v in attrs.items():
+        if isinstance(v, bool):
+            val = {"boolValue": v}
+        elif isinstance(v, int):
+            val = {"intValue": str(v)}
+        elif isinstance(v, float):
+            val = {"doubleValue": v}
+        else:
+            val = {"stringValue": str(v)}
+        out.append({"key": k, "value": val})
+    return out
+
+
+def to_otlp(rec: _Recorder) -> Dict[str, Any]:
+    """
+    Render a recorder as an OTLP/JSON `resourceSpans` document.
+    """
+    trace_id = _otlp_trace_id(rec.request_id)
+    spans = []
+    for s in rec.spans:
+        start_ns = rec.t0_ns + int(s["start_ms"] * 1e6)
+        d = {
+            "traceId": trace_id,
+            "spanId": f"{s['span_id']:016x}",
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(s["duration_ms"] * 1e6)),
+            "attributes": _otlp_attrs({"request_id": rec.request_id, **s["attrs"]}),
+        }
+        if s["parent_id"] is not None:
+            d["parentSpanId"] = f"{s['parent_id']:016x}"
+        spans.append(d)
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attrs({"service.name": "finance_ai"})},
+        "scopeSpans": [{"scope": {"name": "app.obs.spans"}, "spans": spans}],
+    }]}
+
+
+def span_db_path(db_path: str) -> str:
+    """
+    File holding the spans of the database at `db_path`: SPAN_DB_PATH, else a sibling file
+    (finance_ai.db -> finance_ai.spans.db). Keeping span writes out of the main database
+    means they never take its write lock nor bump its PRAGMA data_version, which the result
+    caches use to notice other connections' commits. An in-memory database keeps its own.
+    """
+    if settings.span_db_path:
+        return settings.span_db_path
+    if not db_path or db_path == ":memory:" or db_path.startswith("file:"):
+        return db_path
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.spans{ext or '.db'}"
+
+
+def _in_memory(path: str) -> bool:
+    return not path or path == ":memory:" or path.startswith("file::memory:") or "mode=memory" in path
+
+
+def _write_file(recs: List[_Recorder]):
+    parent = os.path.dirname(settings.span_export_file)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(settings.span_export_file, "a", encoding="utf-8") as f:
+        for rec in recs:
+            f.write(json.dumps(to_otlp(rec), separators=(",", ":")) + "\n")
+
+
+def _write_db(con: Connection, recs: List[_Recorder]):
+    rows = [
+        (rec.request_id, s["span_id"], s["parent_id"], s["name"], s["start_ms"], s["duration_ms"],
+         json.dumps(s["attrs"]) if s["attrs"] else None)
+        for rec in recs for s in rec.spans
+    ]
+    with con:
+        con.executemany(
+            "INSERT INTO spans(request_id, span_id, parent_id, name, start_ms, duration_ms, attrs) VALUES(?,?,?,?,?,?,?)",
+            rows,
+        )
+
+
+class SpanWriter(threading.Thread):
+    """
+    Daemon thread persisting finished requests' spans off the request path. `submit` only
+    enqueues (dropping, and counting, when the bounded queue is full); the thread writes
+    whatever has queued up in one transaction per batch, on its own connection. Requests
+    not written yet stay readable through `queued`.
+    """
+
+    MAX_BATCH = 256
+
+    def __init__(self, db_path: str, maxsize: int):
+        super().__init__(name="span-writer", daemon=True)
+        self.db_path = db_path
+        self.queue: "queue.Queue[_Recorder]" = queue.Queue(maxsize=maxsize)
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._queued: Dict[str, List[_Recorder]] = {}
+
+    def submit(self, rec: _Recorder) -> bool:
+        with self._idle:
+            try:
+                self.queue.put_nowait(rec)
+            except queue.Full:
+                from app.obs.metrics import registry as prom_registry
+                prom_registry().SPANS_DROPPED.inc(len(rec.spans))
+                return False
+            self._pending += 1
+            self._queued.setdefault(rec.request_id, []).append(rec)
+        return True
+
+    def queued(self, request_ids: Iterable[str]) -> Dict[str, List[_Recorder]]:
+        """
+        Recorders of `request_ids` submitted but not yet written.
+        """
+        with self._idle:
+            return {rid: list(self._queued[rid]) for rid in request_ids if rid in self._queued}
+
+    def flush(self, timeout: float = 2.0) -> bool:
+        """
+        Wait until everything submitted so far is written; False on timeout.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _connect(self) -> Connection:
+        # Never the app's connection: a commit here would commit a request's open transaction
+        con = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False,
+                              uri=self.db_path.startswith("file:"))
+        con.execute("PRAGMA journal_mode=WAL").fetchall()
+        with con:
+            con.executescript(SCHEMA_SPANS.format(schema="main"))
+        return con
+
+    def run(self):
+        from app.obs.logger import logger
+        con = None
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if settings.span_export == "otlp_file":
+                    _write_file(batch)
+                else:
+                    if con is None:
+                        con = self._connect()
+                    _write_db(con, batch)
+            except Exception as e:
+                logger.warning("span_export_failed", extra={"requests": len(batch), "error": str(e)})
+            finally:
+                with self._idle:
+                    self._pending -= len(batch)
+                    for rec in batch:
+                        recs = self._queued.get(rec.request_id)
+                        if recs is not None:
+                            recs.remove(rec)
+                            if not recs:
+                                del self._queued[rec.request_id]
+                    self._idle.notify_all()
+
+
+_WRITER: Optional[SpanWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def writer() -> SpanWriter:
+    """
+    The process-wide span writer, started on first use.
+    """
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                w = SpanWriter(span_db_path(settings.db_path), settings.span_queue_size)
+                w.start()
+                atexit.register(w.flush)  # write what is queued on shutdown
+                _WRITER = w
+    return _WRITER
+
+
+def export(rec: Optional[_Recorder]):
+    """
+    Hand a finished request's spans to the background writer, which persists them
+    according to SPAN_EXPORT (db | otlp_file | off). Spans of an in-memory database can
+    only be written on the app's connection, so they are written there, synchronously.
+    """
+    if rec is None or not rec.spans or settings.span_export == "off":
+        return
+    if settings.span_export == "db" and _in_memory(span_db_path(settings.db_path)):
+        from app.db.db import get_con  # local import: app.db.db imports this module
+        from app.obs.logger import logger
+        try:
+            _write_db(get_con(settings.db_path), [rec])
+        except Exception as e:
+            logger.warning("span_export_failed", extra={"requests": 1, "error": str(e)})
+        return
+    writer().submit(rec)
+
+
+def flush(timeout: float = 2.0) -> bool:
+    """
+    Wait for spans already handed to the writer to be persisted (no-op before any export).
+    """
+    return _WRITER.flush(timeout) if _WRITER is not None else True
+
+
+def attach_spans(con: Connection) -> str:
+    """
+    Attach the span database to a connection on the main database (once) and return the
+    schema the spans table lives in; unqualified `spans` resolves to it.
+    """
+    dbs = {r[1]: r[2] for r in con.execute("PRAGMA database_list").fetchall()}
+    if SPAN_SCHEMA in dbs:
+        return SPAN_SCHEMA
+    main = dbs.get("main") or ""
+    path = span_db_path(main)
+    if not main or not path or os.path.abspath(path) == os.path.abspath(main):
+        return "main"
+    con.execute(f"ATTACH DATABASE ? AS {SPAN_SCHEMA}", (path,))
+    con.execute(f"PRAGMA {SPAN_SCHEMA}.journal_mode=WAL").fetchall()
+    return SPAN_SCHEMA
+
+
+def init_spans(con: Connection):
+    """
+    Initialize the spans table and index in the span database. Spans stored in the main
+    database by earlier versions are moved over.
+    """
+    schema = attach_spans(con)
+    with con:
+        con.executescript(SCHEMA_SPANS.format(schema=schema))
+    if schema == "main" or con.execute("SELECT 1 FROM main.sqlite_master WHERE name='spans'").fetchone() is None:
+        return
+    cols = "request_id, span_id, parent_id, name, start_ms, duration_ms, attrs"
+    with con:
+        con.execute(f"INSERT INTO {schema}.spans({cols}) SELECT {cols} FROM main.spans ORDER BY id")
+        con.execute("DROP TABLE main.spans")
+
+
+def _build_tree(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Nest flat span rows under their parents; returns the root spans.
+    """
+    nodes: Dict[int, Dict[str, Any]] = {}
+    roots: List[Dict[str, Any]] = []
+    for r in rows:
+        nodes[r["span_id"]] = {
+            "name": r["name"], "start_ms": r["start_ms"], "duration_ms": r["duration_ms"],
+            "attrs": json.loads(r["attrs"]) if r["attrs"] else {}, "children": [],
+            "_parent": r["parent_id"],
+        }
+    for n in sorted(nodes.values(), key=lambda x: x["start_ms"]):
+        parent = nodes.get(n.pop("_parent"))
+        (parent["children"] if parent else roots).append(n)
+    return roots
+
+
+def span_trees(con: Connection, request_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetch span trees for several requests in one query, keyed by request_id. Requests still
+    queued for the writer are built from memory rather than waited for, so a finished
+    request's tree is readable at once.
+    """
+    ids = sorted({r for r in request_ids if r})
+    if not ids:
+        return {}
+    # Taken before the read: a request written in between is then found in the table
+    queued = _WRITER.queued(ids) if _WRITER is not None else {}
+    marks = ",".join("?" for _ in ids)
+    cur = con.execute(
+        f"SELECT request_id, span_id, parent_id, name, start_ms, duration_ms, attrs FROM spans WHERE request_id IN ({marks})",
+        ids,
+    )
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for r in cur.fetchall():
+        grouped.setdefault(r["request_id"], []).append(dict(r))
+    for rid, recs in queued.items():
+        if rid not in grouped:
+            grouped[rid] = [{**s, "attrs": json.dumps(s["attrs"]) if s["attrs"] else None}
+                            for rec in recs for s in rec.spans]
+    return {rid: _build_tree(rows) for rid, rows in grouped.items()}
@@ -1,8 +1,11 @@
 from __future__ import annotations
 import json
+from bisect import bisect_left
 from sqlite3 import Connection
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from pydantic import BaseModel
+from app.obs.spans import span, span_trees
+from app.utils.jsonfast import loads
 
 # SQL schema for the ai_traces table and indexes
 SCHEMA_TRACE = """
@@ -16,12 +19,34 @@ CREATE TABLE IF NOT EXISTS ai_traces (
     tokens_prompt INTEGER,
     tokens_completion INTEGER,
     latency_ms REAL,
-    tool_calls TEXT -- JSON array
+    tool_calls TEXT, -- JSON array
+    request_id TEXT  -- x-request-id, links to spans
 );
 CREATE INDEX IF NOT EXISTS ix_ai_traces_ts ON ai_traces(ts);
 CREATE INDEX IF NOT EXISTS ix_ai_traces_conv ON ai_traces(conversation_id);
+
+-- Hourly per-model/per-intent rollups, maintained on insert so they outlive raw rows.
+-- Latency histogram columns (h0..hN) are added by init_traces from LATENCY_BUCKETS_MS.
+CREATE TABLE IF NOT EXISTS ai_trace_rollups (
+    id INTEGER PRIMARY KEY,
+    hour TEXT,            -- 'YYYY-MM-DDTHH'
+    model TEXT,           -- '' when no LLM ran
+    calls INTEGER,
+    latency_ms_sum REAL,
+    latency_ms_max REAL,
+    tokens_prompt INTEGER,
+    tokens_completion INTEGER
+);
 """
 
+# Upper bounds (ms) of the latency histogram kept per rollup row; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2000, 3000, 5000, 8000, 13000, 20000, 30000, float("inf"))
+HIST_COLS = [f"h{i}" for i in range(len(LATENCY_BUCKETS_MS))]
+
+# Columns returned by the trace readers; tool_calls is only selected on request
+TRACE_COLS = "id, ts, conversation_id, question, answer, model, tokens_prompt, tokens_completion, latency_ms, request_id"
+
+
 class TraceIn(BaseModel):
     ts: str
     conversation_id: Optional[str]
@@ -32,57 +57,219 @@ class TraceIn(BaseModel):
     tokens_completion: Optional[int]
     latency_ms: float
     tool_calls: List[Dict[str, Any]] = []
+    request_id: Optional[str] = None
 
 
 def init_traces(con: Connection):
     """
     Initialize the ai_traces table and indexes in the database.
+    Adds columns introduced after a database was created (request_id, rollup
+    intent/errors/histogram); rollup rows from before that have empty histograms.
     """
     with con:
         con.executescript(SCHEMA_TRACE)
+        cols = {r[1] for r in con.execute("PRAGMA table_info(ai_traces)").fetchall()}
+        if "request_id" not in cols:
+            con.execute("ALTER TABLE ai_traces ADD COLUMN request_id TEXT")
+        con.execute("CREATE INDEX IF NOT EXISTS ix_ai_traces_req ON ai_traces(request_id)")
+        rcols = {r[1] for r in con.execute("PRAGMA table_info(ai_trace_rollups)").fetchall()}
+        if "intent" not in rcols:
+            con.execute("ALTER TABLE ai_trace_rollups ADD COLUMN intent TEXT NOT NULL DEFAULT ''")
+        if "errors" not in rcols:
+            con.execute("ALTER TABLE ai_trace_rollups ADD COLUMN errors INTEGER NOT NULL DEFAULT 0")
+        for c in HIST_COLS:
+            if c not in rcols:
+                con.execute(f"ALTER TABLE ai_trace_rollups ADD COLUMN {c} INTEGER NOT NULL DEFAULT 0")
+        con.execute("DROP INDEX IF EXISTS ux_ai_trace_rollups")
+        con.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_ai_trace_rollups_hmi ON ai_trace_rollups(hour, model, intent)")
+
+
+def trace_intent(tool_calls: List[Dict[str, Any]]) -> Tuple[str, bool]:
+    """
+    Classify a trace by its tool calls: (intent, is_error).
+    Intent is the rule-based tool name, 'llm', or the skip/error event.
+    """
+    intent, error = "", False
+    for c in tool_calls:
+        if "tool" in c and not intent:
+            intent = c["tool"]
+        elif "llm" in c:
+            intent = intent or "llm"
+        elif c.get("event") == "llm_error":
+            intent, error = intent or "llm", True
+        elif "event" in c and not intent:
+            intent = c["event"]
+    return intent, error
+
 
+def _bucket(latency_ms: float) -> int:
+    """
+    Index of the histogram bucket a latency falls into.
+    """
+    return bisect_left(LATENCY_BUCKETS_MS, latency_ms)
 
+
+@span("obs.trace_log")
 def trace_log(con: Connection, t: TraceIn):
     """
-    Insert a trace record into the ai_traces table.
+    Insert a trace record into the ai_traces table and fold it into the hourly rollup.
     """
     with con:
         con.execute(
             """
-            INSERT INTO ai_traces(ts, conversation_id, question, answer, model, tokens_prompt, tokens_completion, latency_ms, tool_calls)
-            VALUES(?,?,?,?,?,?,?,?,?)
+            INSERT INTO ai_traces(ts, conversation_id, question, answer, model, tokens_prompt, tokens_completion, latency_ms, tool_calls, request_id)
+            VALUES(?,?,?,?,?,?,?,?,?,?)
+            """,
+            (t.ts, t.conversation_id, t.question, t.answer, t.model, t.tokens_prompt or 0, t.tokens_completion or 0, t.latency_ms, json.dumps(t.tool_calls), t.request_id)
+        )
+        intent, error = trace_intent(t.tool_calls)
+        h = HIST_COLS[_bucket(t.latency_ms)]
+        con.execute(
+            f"""
+            INSERT INTO ai_trace_rollups(hour, model, intent, calls, errors, latency_ms_sum, latency_ms_max, tokens_prompt, tokens_completion, {h})
+            VALUES(?,?,?,1,?,?,?,?,?,1)
+            ON CONFLICT(hour, model, intent) DO UPDATE SET
+            calls=calls+1,
+            errors=errors+excluded.errors,
+            latency_ms_sum=latency_ms_sum+excluded.latency_ms_sum,
+            latency_ms_max=MAX(latency_ms_max, excluded.latency_ms_max),
+            tokens_prompt=tokens_prompt+excluded.tokens_prompt,
+            tokens_completion=tokens_completion+excluded.tokens_completion,
+            {h}={h}+1
             """,
-            (t.ts, t.conversation_id, t.question, t.answer, t.model, t.tokens_prompt or 0, t.tokens_completion or 0, t.latency_ms, json.dumps(t.tool_calls))
+            (t.ts[:13], t.model or "", intent, int(error), t.latency_ms, t.latency_ms, t.tokens_prompt or 0, t.tokens_completion or 0)
         )
 
 
-def traces_recent(con: Connection, limit: int = 50) -> List[Dict[str, Any]]:
+def _rows_out(con: Connection, rows, with_tool_calls: bool, with_spans: bool) -> List[Dict[str, Any]]:
     """
-    Retrieve the most recent trace records, up to the specified limit.
+    Decode tool_calls (only if selected) and, if requested, attach each row's span tree.
     """
-    cur = con.execute("SELECT * FROM ai_traces ORDER BY ts DESC LIMIT ?", (limit,))
     out = []
-    for r in cur.fetchall():
+    for r in rows:
         d = dict(r)
-        try:
-            d["tool_calls"] = json.loads(d.get("tool_calls") or "[]")
-        except Exception:
-            d["tool_calls"] = []
+        if with_tool_calls:
+            try:
+                d["tool_calls"] = loads(d.get("tool_calls") or "[]")
+            except Exception:
+                d["tool_calls"] = []
         out.append(d)
+    if with_spans:
+        trees = span_trees(con, (d.get("request_id") for d in out))
+        for d in out:
+            d["spans"] = trees.get(d.get("request_id"), [])
     return out
 
 
-def traces_by_conv(con: Connection, conv_id: str) -> List[Dict[str, Any]]:
+def _page(
+    con: Connection,
+    where: List[str],
+    params: List[Any],
+    limit: int,
+    before_id: Optional[int],
+    with_tool_calls: bool,
+    with_spans: bool,
+) -> Dict[str, Any]:
     """
-    Retrieve all trace records for a given conversation ID.
+    Keyset page over ai_traces, newest first. `next_cursor` is the id to pass as `before_id`.
     """
-    cur = con.execute("SELECT * FROM ai_traces WHERE conversation_id=? ORDER BY ts DESC", (conv_id,))
+    cols = TRACE_COLS + (", tool_calls" if with_tool_calls else "")
+    where, params = list(where), list(params)
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+    q = f"SELECT {cols} FROM ai_traces"
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    rows = _rows_out(con, con.execute(q, params).fetchall(), with_tool_calls, with_spans)
+    next_cursor = rows[-1]["id"] if len(rows) == limit else None
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+def traces_recent(
+    con: Connection,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    with_tool_calls: bool = False,
+    with_spans: bool = True,
+) -> Dict[str, Any]:
+    """
+    Retrieve the most recent trace records, one keyset page at a time.
+    """
+    return _page(con, [], [], limit, before_id, with_tool_calls, with_spans)
+
+
+def traces_by_conv(
+    con: Connection,
+    conv_id: str,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    with_tool_calls: bool = False,
+    with_spans: bool = True,
+) -> Dict[str, Any]:
+    """
+    Retrieve trace records for a given conversation ID, one keyset page at a time.
+    """
+    return _page(con, ["conversation_id=?"], [conv_id], limit, before_id, with_tool_calls, with_spans)
+
+
+def trace_rollups(
+    con: Connection,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    model: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Hourly per-model latency/token rollups; `since`/`until` are ISO prefixes ('YYYY-MM-DDTHH').
+    """
+    q = ("SELECT hour, NULLIF(model,'') AS model, SUM(calls) AS calls, SUM(errors) AS errors, "
+         "SUM(latency_ms_sum) / SUM(calls) AS latency_ms_avg, MAX(latency_ms_max) AS latency_ms_max, "
+         "SUM(tokens_prompt) AS tokens_prompt, SUM(tokens_completion) AS tokens_completion FROM ai_trace_rollups")
+    where, params = [], []
+    if since:
+        where.append("hour >= ?")
+        params.append(since[:13])
+    if until:
+        where.append("hour <= ?")
+        params.append(until[:13])
+    if model is not None:
+        where.append("model = ?")
+        params.append(model)
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " GROUP BY hour, model ORDER BY hour, model"
+    return [dict(r) for r in con.execute(q, params).fetchall()]
+
+
+def rollup_groups(
+    con: Connection,
+    since: str,
+    until: Optional[str],
+    group_by: Tuple[str, ...],
+) -> List[Dict[str, Any]]:
+    """
+    Sum rollup rows over an hour window, grouped by any of ('model', 'intent').
+    Returns totals plus the merged latency histogram as `hist`.
+    """
+    dims = [g for g in group_by if g in ("model", "intent")]
+    sel = "".join(f"{d}, " for d in dims)
+    hist = ", ".join(f"SUM({c}) AS {c}" for c in HIST_COLS)
+    q = (f"SELECT {sel}SUM(calls) AS calls, SUM(errors) AS errors, SUM(latency_ms_sum) AS latency_ms_sum, "
+         f"MAX(latency_ms_max) AS latency_ms_max, SUM(tokens_prompt) AS tokens_prompt, "
+         f"SUM(tokens_completion) AS tokens_completion, {hist} FROM ai_trace_rollups WHERE hour >= ?")
+    params: List[Any] = [since[:13]]
+    if until:
+        q += " AND hour <= ?"
+        params.append(until[:13])
+    if dims:
+        q += " GROUP BY " + ", ".join(dims) + " ORDER BY " + ", ".join(dims)
     out = []
-    for r in cur.fetchall():
+    for r in con.execute(q, params).fetchall():
         d = dict(r)
-        try:
-            d["tool_calls"] = json.loads(d.get("tool_calls") or "[]")
-        except Exception:
-            d["tool_calls"] = []
+        if not d["calls"]:
+            continue
+        d["hist"] = [d.pop(c) or 0 for c in HIST_COLS]
         out.append(d)
-    return out
\ No newline at end of file
+    return out
@@ -1,110 +1,124 @@
 from __future__ import annotations
+import sys
 from sqlite3 import Connection
-from typing import Any, Dict, List, Tuple
-from app.repositories.facts import insert_fact
-from app.repositories.metrics import upsert_metric
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from app.parsers.report import AccountSpecs, FactRow, ParsedReport, write_report
 from app.utils.normalization import safe_float, ym_key
+from app.obs.spans import span
 
 
-def _qb_walk_rows(rows: List[dict], header_group: str | None = None) -> List[dict]:
+class QBRow(NamedTuple):
     """
-    Recursively flattens QuickBooks report rows into a list of account/value dicts.
-    Handles nested row groups and summary rows.
+    One flattened QuickBooks report row: account name, per-column raw values, summary flag,
+    and the header labels of its enclosing groups (outermost first).
     """
-    flat: List[dict] = []
-    for r in rows:
-        if 'Rows' in r and r.get('Rows', {}).get('Row'):
-            hdr = r.get('Header', {})
-            account = None
-            if hdr:
-                coldata = hdr.get('ColData', [])
-                if coldata:
-                   account = coldata[0].get('value')
-            flat.extend(_qb_walk_rows(r['Rows']['Row'], header_group=account))
-            if 'Summary' in r:
-                s = r['Summary']['ColData']
-                acc = s[0]['value'] if s else (account or header_group or 'Section Total')
-                vals = [c.get('value', '') for c in s[1:]]
-                flat.append({'account': acc, 'values': vals, 'summary': True})
-        else:
+    account: str
+    values: Tuple[str, ...]
+    summary: bool
+    parents: Tuple[str, ...] = ()
+
+
+def _intern(s: Any) -> Any:
+    return sys.intern(s) if type(s) is str else s
+
+
+def _qb_walk_rows(rows: List[dict], header_group: str | None = None) -> Iterator[QBRow]:
+    """
+    Flattens QuickBooks report rows into QBRow records, depth-first, without recursion.
+    A group's children come before its summary row, as in the report itself.
+    """
+    # Each frame: (iterator over sibling rows, header of the enclosing group, its ancestry,
+    # summary row to emit when exhausted)
+    root: Tuple[str, ...] = (header_group,) if header_group else ()
+    stack: List[Tuple[Iterator[dict], Optional[str], Tuple[str, ...], Optional[QBRow]]] = [
+        (iter(rows), header_group, root, None)
+    ]
+    while stack:
+        it, group, parents, pending = stack[-1]
+        for r in it:
+            children = (r.get('Rows') or {}).get('Row') if 'Rows' in r else None
+            if children:
+                account = None
+                hdr = r.get('Header', {})
+                if hdr:
+                    coldata = hdr.get('ColData', [])
+                    if coldata:
+                        account = coldata[0].get('value')
+                inner = parents + (_intern(account),) if account else parents
+                summary = None
+                if 'Summary' in r:
+                    s = r['Summary']['ColData']
+                    acc = s[0]['value'] if s else (account or group or 'Section Total')
+                    summary = QBRow(_intern(acc), tuple(c.get('value', '') for c in s[1:]), True, inner)
+                stack.append((iter(children), account, inner, summary))
+                break
             cd = r.get('ColData', [])
-            if not cd: continue
-            account = cd[0].get('value', header_group or '')
-            vals = [c.get('value', '') for c in cd[1:]]
-            flat.append({'account': account, 'values': vals, 'summary': False})
-    return flat
+            if not cd:
+                continue
+            account = cd[0].get('value', group or '')
+            yield QBRow(_intern(account), tuple(c.get('value', '') for c in cd[1:]), False, parents)
+        else:
+            stack.pop()
+            if pending is not None:
+                yield pending
 
 
-def _categorize(acc: str) -> str:
+def _register(specs: AccountSpecs, acc: str, parents: Tuple[str, ...]) -> int:
     """
-    Categorizes an account name into revenue, cogs, expense, or other.
+    Register a row's account, preceded by its enclosing group headers so it links to
+    its parent. QuickBooks labels are already unique within a report.
     """
-    a = (acc or '').lower()
-    if 'income' in a or a.startswith('revenue') or 'sales' in a: return 'revenue'
-    if 'cost of goods sold' in a or 'payroll expense - cos' in a or 'direct parts' in a: return 'cogs'
-    if 'expense' in a or 'shipping' in a or 'technology' in a: return 'expense'
-    if a.startswith('total '): return 'other'
-    return 'other'
+    parent = None
+    for p in parents:
+        specs.add(p, p, None, parent)
+        parent = p
+    return specs.add(acc, acc, None, parent if parent != acc else None)
 
 
-def ingest_quickbooks(con: Connection, payload: Dict[str, Any]):
+def parse_quickbooks(payload: Dict[str, Any]) -> ParsedReport:
     """
-    Ingests a QuickBooks report payload into the database.
-    Flattens the report, categorizes accounts, inserts facts, and computes metrics.
+    Parses a QuickBooks report payload into accounts and per-month fact rows, without touching
+    the database. Metrics are derived from the stored facts when the report is written.
     """
     data = payload.get('data') or payload
-    header = data.get('Header', {})
     cols = data.get('Columns', {}).get('Column', [])
     rows = data.get('Rows', {}).get('Row', [])
 
-    month_cols: List[Tuple[str | None, str | None]] = []
+    month_cols: List[Tuple[str | None, str | None, str | None]] = []
     for c in cols[1:]:
         md = {m['Name']: m['Value'] for m in c.get('MetaData', [])} if c.get('MetaData') else {}
         start = md.get('StartDate')
         end = md.get('EndDate')
         if end is None and (c.get('ColTitle','').lower() == 'total'):
-            month_cols.append((None, None))
+            month_cols.append((None, None, None))
         else:
-            month_cols.append((start, end))
-
-    flat = _qb_walk_rows(rows)
+            month_cols.append((start, end, ym_key(end) if end else None))
 
-    inserted = 0
-    metrics_inserted = 0
+    specs = AccountSpecs()
+    facts: List[FactRow] = []
     periods_set = set()
 
-    for item in flat:
-        acc = item['account'] or 'Unknown'
-        values = item['values']
-        is_summary = item.get('summary', False)
-        for i, (start, end) in enumerate(month_cols):
+    for item in _qb_walk_rows(rows):
+        acc = item.account or 'Unknown'
+        values = item.values
+        kind = 'total' if item.summary else 'amount'
+        idx = None
+        for i, (start, end, mk) in enumerate(month_cols):
             if end is None: continue
             amt = safe_float(values[i]) if i < len(values) else 0.0
             if start and end:
                 periods_set.add(end)
-                insert_fact(con, start, end, 'quickbooks', acc, _categorize(acc), 'total' if is_summary else 'amount', amt)
-                inserted += 1
-
-    for pe in sorted(periods_set):
-        cur = con.execute(
-        """
-        SELECT SUM(CASE WHEN category='revenue' THEN amount ELSE 0 END) AS revenue,
-            SUM(CASE WHEN category='cogs' THEN amount ELSE 0 END) AS cogs,
-            SUM(CASE WHEN category='expense' THEN amount ELSE 0 END) AS expenses
-        FROM facts WHERE source='quickbooks' AND month_key=?
-        """, (ym_key(pe),)
-        )
-        row = cur.fetchone()
-        if not row: continue
-        revenue = row['revenue'] or 0.0
-        cogs = row['cogs'] or 0.0
-        expenses = row['expenses'] or 0.0
-        upsert_metric(con, period_end=pe, source='quickbooks', revenue=revenue, cogs=cogs, expenses=expenses, net_profit=None)
-        metrics_inserted += 1
-
-    return {
-        'source': 'quickbooks',
-        'inserted_facts': inserted,
-        'inserted_metrics': metrics_inserted,
-        'periods': sorted(periods_set),
-    }
\ No newline at end of file
+                if idx is None:
+                    idx = _register(specs, acc, item.parents)
+                facts.append((start, end, mk, idx, kind, amt))
+
+    return ParsedReport('quickbooks', specs.specs, facts, None, sorted(periods_set))
+
+
+@span("parser.ingest_quickbooks")
+def ingest_quickbooks(con: Connection, payload: Dict[str, Any]):
+    """
+    Ingests a QuickBooks report payload into the database.
+    Flattens the report, categorizes new accounts with the stored rules, bulk-inserts facts, and computes metrics.
+    """
+    return write_report(con, parse_quickbooks(payload))
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import time
+from sqlite3 import Connection
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.config import settings
+from app.repositories.accounts import AccountMap
+from app.repositories.facts import insert_facts
+from app.repositories.metrics import upsert_metrics
+from app.repositories.period_index import invalidate
+from app.repositories.sync import SyncPlan, SyncRecord, delete_periods, save_sync, watermarks
+from app.services.reconciliation import reconcile
+from app.utils.normalization import ym_key
+
+# (full_path, leaf_name, default_category, parent full_path, external account id)
+AccountSpec = Tuple[str, str, Optional[str], Optional[str], Optional[str]]
+# (period_start, period_end, month_key, index into ParsedReport.accounts, kind, amount)
+FactRow = Tuple[Optional[str], Optional[str], Optional[str], int, str, float]
+# (period_end, revenue, cogs, expenses, net_profit)
+MetricRow = Tuple[str, float, float, float, Optional[float]]
+
+
+class ParsedReport(NamedTuple):
+    """
+    A payload parsed into plain rows, with no database access: safe to build in a worker
+    process and hand to a single writer. Accounts are listed parents-first, in first-seen order.
+    `metrics` is None when they are derived from the stored facts after writing (QuickBooks).
+    `records` lists the upstream sync bookkeeping of every period in the payload (Rootfi), parsed or not.
+    """
+    source: str
+    accounts: List[AccountSpec]
+    facts: List[FactRow]
+    metrics: Optional[List[MetricRow]]
+    periods: List[str]
+    records: Optional[List[SyncRecord]] = None
+
+
+class AccountSpecs:
+    """
+    Collects AccountSpec entries for one report, deduplicated by full path.
+    """
+
+    def __init__(self):
+        self.specs: List[AccountSpec] = []
+        self.index: Dict[str, int] = {}
+
+    def add(self, full_path: str, leaf_name: str, default_category: Optional[str] = None,
+            parent: Optional[str] = None, external_id: Optional[str] = None) -> int:
+        idx = self.index.get(full_path)
+        if idx is None:
+            idx = self.index[full_path] = len(self.specs)
+            self.specs.append((full_path, leaf_name, default_category, parent, external_id))
+        return idx
+
+
+def _quickbooks_metrics(con: Connection, periods: List[str]) -> List[MetricRow]:
+    """
+    Revenue/COGS/expenses per period from the stored QuickBooks facts (rules-based categories).
+    """
+    out: List[MetricRow] = []
+    for pe in periods:
+        row = con.execute(
+            """
+            SELECT SUM(CASE WHEN a.category='revenue' THEN f.amount ELSE 0 END) AS revenue,
+                SUM(CASE WHEN a.category='cogs' THEN f.amount ELSE 0 END) AS cogs,
+                SUM(CASE WHEN a.category='expense' THEN f.amount ELSE 0 END) AS expenses
+            FROM facts f JOIN accounts a ON a.id = f.account_id
+            WHERE a.source='quickbooks' AND f.month_key=?
+            """,
+            (ym_key(pe),),
+        ).fetchone()
+        out.append((pe, row[0] or 0.0, row[1] or 0.0, row[2] or 0.0, None))
+    return out
+
+
+def write_report(
+    con: Connection,
+    report: ParsedReport,
+    batch: Optional[Dict[str, Any]] = None,
+    sync: Optional[SyncPlan] = None,
+) -> Dict[str, Any]:
+    """
+    Store a ParsedReport: register its new accounts, insert all facts and upsert the period
+    metrics in one transaction with bulk statements. If `batch` is given, its ingest_batches
+    row is written in the same transaction, so a file is either fully loaded and registered
+    or not at all.
+    With a `sync` plan (incremental ingest) only the plan's changed periods are written,
+    replacing what was stored for them; tombstoned periods are removed, and the sync state
+    is saved in the same transaction.
+    """
+    t0 = time.perf_counter()
+    facts, periods, metrics = report.facts, report.periods, report.metrics
+    if sync is not None:
+        keep = sync.changed
+        if not keep.issuperset(periods):
+            facts = [f for f in facts if f[1] in keep]
+            metrics = [m for m in metrics if m[0] in keep] if metrics is not None else None
+            periods = [pe for pe in periods if pe in keep]
+    accounts = AccountMap(con, report.source)
+    with con:
+        ids = accounts.resolve(report.accounts)
+        if sync is not None:
+            delete_periods(con, report.source, sync.changed | sync.deleted)
+        insert_facts(con, [(ps, pe, mk, ids[i], kind, amt) for ps, pe, mk, i, kind, amt in facts])
+        metrics = metrics if metrics is not None else _quickbooks_metrics(con, periods)
+        upsert_metrics(con, report.source, metrics)
+        if sync is not None:
+            save_sync(con, sync)
+        if batch is not None:
+            batch = {**batch, "write_ms": round((time.perf_counter() - t0) * 1000.0, 3)}
+            con.execute(
+                """
+                INSERT INTO ingest_batches(sha256, path, source, bytes, facts, periods, status, error, parse_ms, write_ms, loaded_at)
+                VALUES(:sha256, :path, :source, :bytes, :facts, :periods, 'done', NULL, :parse_ms, :write_ms, datetime('now'))
+                ON CONFLICT(sha256) DO UPDATE SET path=excluded.path, source=excluded.source, facts=excluded.facts,
+                    periods=excluded.periods, status='done', error=NULL, parse_ms=excluded.parse_ms,
+                    write_ms=excluded.write_ms, loaded_at=excluded.loaded_at
+                """,
+                batch,
+            )
+    invalidate()
+    touched = set(periods) | (sync.deleted if sync is not None else set())
+    if settings.recon_on_ingest and touched:
+        reconcile(con, {ym_key(pe) for pe in touched})
+    out = {
+        'source': report.source,
+        'inserted_facts': len(facts),
+        'inserted_metrics': len(metrics),
+        'periods': periods,
+    }
+    if sync is not None:
+        out.update({
+            'skipped': sync.skipped,
+            'updated': len(sync.changed),
+            'deleted': len(sync.deleted),
+            'watermarks': watermarks(con, report.source),
+        })
+    return out
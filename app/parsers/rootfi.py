@@ -1,87 +1,151 @@
 from __future__ import annotations
-import re
+import re, sys
 from sqlite3 import Connection
-from typing import Any, Dict, List, Tuple
-from app.repositories.facts import insert_fact
-from app.repositories.metrics import upsert_metric
-from app.utils.normalization import safe_float
+from typing import Any, Collection, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from app.parsers.report import AccountSpecs, FactRow, MetricRow, ParsedReport, write_report
+from app.repositories.sync import SyncRecord, plan_sync
+from app.utils.normalization import safe_float, ym_key
+from app.obs.spans import span
 
 
-def _walk_line_items(node, path: List[str], acc: List[Tuple[str, float, str]]):
+# Sections of a Rootfi period flattened into facts: (payload key, path root, fact category)
+SECTIONS = (
+    ('revenue', 'revenue', 'revenue'),
+    ('cost_of_goods_sold', 'cogs', 'cogs'),
+    ('expenses', 'expense', 'expense'),
+)
+
+
+class LineItem(NamedTuple):
+    """
+    One flattened Rootfi line item. `parent` is the full name of the enclosing item
+    (or the section root); `account_id` is Rootfi's external account id, if any.
+    """
+    full_name: str
+    value: float
+    name: str
+    parent: str
+    account_id: Optional[str]
+
+
+def _walk_line_items(
+    node: dict,
+    root: str,
+    paths: Optional[Dict[Tuple[str, Any], str]] = None,
+) -> Iterator[LineItem]:
     """
-    Recursively flattens nested line items into a list of (full_name, value, name) tuples.
+    Flattens nested line items into LineItem tuples, pre-order, without recursion.
+    Full names are "root / parent / name". Each distinct path is joined and interned once per
+    `paths` cache, so the same account across many periods shares one string.
     """
-    name = node.get('name')
-    value = safe_float(node.get('value'))
-    full = " / ".join(path + [name]) if name else "Unnamed"
-    acc.append((full, value, name or 'Unnamed'))
-    for child in node.get('line_items', []) or []:
-        _walk_line_items(child, path + [name], acc)
+    if paths is None:
+        paths = {}
+    stack: List[Tuple[dict, str]] = [(node, root)]
+    while stack:
+        n, prefix = stack.pop()
+        name = n.get('name')
+        key = (prefix, name)
+        path = paths.get(key)
+        if path is None:
+            path = paths[key] = sys.intern(f"{prefix} / {name or ''}")
+        yield LineItem(path if name else "Unnamed", safe_float(n.get('value')), name or 'Unnamed', prefix, n.get('account_id'))
+        children = n.get('line_items')
+        if children:
+            stack.extend((c, path) for c in reversed(children))
 
 
-def ingest_rootfi(con: Connection, payload: Dict[str, Any]):
+def _periods(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
-    Ingests a RootFi report payload into the database.
-    Flattens line items, inserts facts, and computes metrics for each period.
+    The list of period records in a RootFi payload.
     """
     data = payload.get('data') if isinstance(payload, dict) else payload
     if isinstance(data, dict):
         items = data.get('data') or data.get('items') or []
-        periods = items if isinstance(items, list) else [data]
-    else:
-        periods = data
+        return items if isinstance(items, list) else [data]
+    return data
+
+
+def _period_bounds(p: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (period_start, period_end) of a period, falling back to the dates in platform_id.
+    """
+    ps = p.get('period_start')
+    pe = p.get('period_end')
+    if not pe:
+        pid = p.get('platform_id') or ""
+        m = re.match(r"(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})", pid)
+        if m:
+            ps, pe = m.group(1), m.group(2)
+    return ps, pe
+
+
+def _sync_record(p: Dict[str, Any], pe: str) -> SyncRecord:
+    """
+    Sync bookkeeping of one period; company '' and the period end stand in for missing ids.
+    """
+    rid = p.get('rootfi_id')
+    company = p.get('rootfi_company_id')
+    return SyncRecord(
+        '' if company is None else str(company),
+        pe if rid is None else str(rid),
+        pe,
+        p.get('rootfi_updated_at'),
+        p.get('rootfi_deleted_at'),
+    )
+
 
-    inserted = 0
-    metrics_inserted = 0
+def parse_rootfi(payload: Dict[str, Any], only: Optional[Collection[str]] = None) -> ParsedReport:
+    """
+    Parses a RootFi report payload into accounts, fact rows and per-period metrics,
+    without touching the database. `only` limits line-item parsing to those period ends;
+    the sync records of every period are returned either way.
+    """
+    specs = AccountSpecs()
+    facts: List[FactRow] = []
+    metrics: List[MetricRow] = []
+    records: List[SyncRecord] = []
     periods_set = set()
+    paths: Dict[Tuple[str, Any], str] = {}
 
-    for p in periods:
-        ps = p.get('period_start')
-        pe = p.get('period_end')
-        if not pe:
-            pid = p.get('platform_id') or ""
-            m = re.match(r"(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})", pid)
-            if m:
-                ps, pe = m.group(1), m.group(2)
+    for p in _periods(payload):
+        ps, pe = _period_bounds(p)
         if not pe:
             continue
+        records.append(_sync_record(p, pe))
+        if p.get('rootfi_deleted_at') or (only is not None and pe not in only):
+            continue
         periods_set.add(pe)
+        mk = ym_key(pe)
 
-        total_rev = 0.0
-        for r in p.get('revenue', []) or []:
-            flat: List[Tuple[str, float, str]] = []
-            _walk_line_items(r, ["revenue"], flat)
-            for full_name, val, _ in flat:
-                insert_fact(con, ps, pe, 'rootfi', full_name, 'revenue', 'amount', val)
-                total_rev += val
-                inserted += 1
-
-        total_cogs = 0.0
-        for r in p.get('cost_of_goods_sold', []) or []:
-            flat = []
-            _walk_line_items(r, ["cogs"], flat)
-            for full_name, val, _ in flat:
-                insert_fact(con, ps, pe, 'rootfi', full_name, 'cogs', 'amount', val)
-                total_cogs += val
-                inserted += 1
-
-        total_exp = 0.0
-        for r in p.get('expenses', []) or []:
-            flat = []
-            _walk_line_items(r, ["expense"], flat)
-            for full_name, val, _ in flat:
-                insert_fact(con, ps, pe, 'rootfi', full_name, 'expense', 'amount', val)
-                total_exp += val
-                inserted += 1
+        totals = {}
+        for key, root, category in SECTIONS:
+            total = 0.0
+            for r in p.get(key, []) or []:
+                for item in _walk_line_items(r, root, paths):
+                    idx = specs.add(item.full_name, item.name, category, item.parent, item.account_id)
+                    facts.append((ps, pe, mk, idx, 'amount', item.value))
+                    total += item.value
+            totals[category] = total
 
         net = p.get('net_profit')
         net_f = safe_float(net) if net is not None else None
-        upsert_metric(con, period_end=pe, source='rootfi', revenue=total_rev, cogs=total_cogs, expenses=total_exp, net_profit=net_f)
-        metrics_inserted += 1
-
-    return {
-        'source': 'rootfi',
-        'inserted_facts': inserted,
-        'inserted_metrics': metrics_inserted,
-        'periods': sorted(periods_set),
-    }
\ No newline at end of file
+        metrics.append((pe, totals['revenue'], totals['cogs'], totals['expense'], net_f))
+
+    return ParsedReport('rootfi', specs.specs, facts, metrics, sorted(periods_set), records)
+
+
+@span("parser.ingest_rootfi")
+def ingest_rootfi(con: Connection, payload: Dict[str, Any], full: bool = False):
+    """
+    Ingests a RootFi report payload into the database, incrementally: periods whose
+    rootfi_updated_at is not newer than what was stored are skipped (not even parsed),
+    changed periods replace their facts and metrics, and soft-deleted periods are removed.
+    `full` rewrites every live period regardless of the stored state.
+    """
+    records = []
+    for p in _periods(payload):
+        pe = _period_bounds(p)[1]
+        if pe:
+            records.append(_sync_record(p, pe))
+    plan = plan_sync(con, 'rootfi', records, force=full)
+    return write_report(con, parse_rootfi(payload, plan.changed), sync=plan)
\ No newline at end of file
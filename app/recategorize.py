@@ -0,0 +1,75 @@
+"""
+Manage category rules/overrides and re-categorize stored accounts without re-ingesting.
+
+Usage:
+  python -m app.recategorize list
+  python -m app.recategorize add-rule --source quickbooks contains "freight" cogs --priority 5
+  python -m app.recategorize override quickbooks "Shipping" cogs
+  python -m app.recategorize override quickbooks "Shipping" --clear
+  python -m app.recategorize apply [--source quickbooks] [--dry-run]
+"""
+
+from __future__ import annotations
+import argparse, json, sys
+from typing import List
+
+from app.config import settings
+from app.db.db import get_con, init_db
+from app.services.categorization import CATEGORIES, MATCH_KINDS, add_rule, recategorize, set_override
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.recategorize")
+    ap.add_argument("--db", default=settings.db_path)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("list", help="Show rules (in evaluation order) and account overrides")
+
+    r = sub.add_parser("add-rule", help="Add a categorization rule")
+    r.add_argument("match", choices=MATCH_KINDS)
+    r.add_argument("pattern")
+    r.add_argument("category", choices=CATEGORIES)
+    r.add_argument("--source", default=None, help="Limit to one source (default: all sources)")
+    r.add_argument("--priority", type=int, default=100, help="Lower is tried first")
+
+    o = sub.add_parser("override", help="Pin the category of one account")
+    o.add_argument("source")
+    o.add_argument("account", help="Account full path as returned by the API")
+    o.add_argument("category", nargs="?", choices=CATEGORIES)
+    o.add_argument("--clear", action="store_true", help="Remove the override")
+
+    a = sub.add_parser("apply", help="Re-categorize accounts and update metrics in bulk")
+    a.add_argument("--source", default=None)
+    a.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+
+    args = ap.parse_args(argv)
+    con = get_con(args.db)
+    init_db(con)
+
+    if args.cmd == "list":
+        for row in con.execute(
+            "SELECT id, COALESCE(source, '*') AS source, match, pattern, category, priority "
+            "FROM category_rules ORDER BY priority, id"
+        ).fetchall():
+            print(json.dumps(dict(row)))
+        for row in con.execute("SELECT source, full_path, category FROM category_overrides ORDER BY source, full_path").fetchall():
+            print(json.dumps({"override": dict(row)}))
+        return 0
+    if args.cmd == "add-rule":
+        rid = add_rule(con, args.source, args.match, args.pattern, args.category, args.priority)
+        print(f"[OK] rule {rid} added; run 'apply' to re-categorize stored accounts")
+        return 0
+    if args.cmd == "override":
+        if not args.clear and args.category is None:
+            print("[ERR] category is required unless --clear is given", file=sys.stderr)
+            return 2
+        set_override(con, args.source, args.account, None if args.clear else args.category)
+        print(f"[OK] override {'cleared' if args.clear else 'saved'}; run 'apply' to re-categorize stored accounts")
+        return 0
+    out = recategorize(con, args.source, args.dry_run)
+    print(json.dumps(out, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
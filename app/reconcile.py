@@ -0,0 +1,57 @@
+"""
+Map accounts across sources and refresh the QuickBooks vs Rootfi reconciliation.
+
+Usage:
+  python -m app.reconcile maps
+  python -m app.reconcile map quickbooks "Payroll Expenses / Salaries" payroll
+  python -m app.reconcile map rootfi "expense / Payroll / Salaries" payroll
+  python -m app.reconcile map rootfi "expense / Payroll / Salaries" --clear
+  python -m app.reconcile run [--month 2024-01 --month 2024-02]
+"""
+
+from __future__ import annotations
+import argparse, json, sys
+from typing import List
+
+from app.config import settings
+from app.db.db import get_con, init_db
+from app.services.reconciliation import reconcile, set_mapping
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.reconcile")
+    ap.add_argument("--db", default=settings.db_path)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("maps", help="Show account mappings")
+
+    m = sub.add_parser("map", help="Map one account to a reconciliation key shared across sources")
+    m.add_argument("source")
+    m.add_argument("account", help="Account full path as returned by the API")
+    m.add_argument("key", nargs="?")
+    m.add_argument("--clear", action="store_true", help="Remove the mapping")
+
+    r = sub.add_parser("run", help="Recompute reconciliation rows")
+    r.add_argument("--month", action="append", default=None, help="YYYY-MM to refresh (repeatable; default all)")
+
+    args = ap.parse_args(argv)
+    con = get_con(args.db)
+    init_db(con)
+
+    if args.cmd == "maps":
+        for row in con.execute("SELECT recon_key, source, full_path FROM recon_account_map ORDER BY recon_key, source, full_path").fetchall():
+            print(json.dumps(dict(row)))
+        return 0
+    if args.cmd == "map":
+        if not args.clear and args.key is None:
+            print("[ERR] key is required unless --clear is given", file=sys.stderr)
+            return 2
+        set_mapping(con, args.source, args.account, None if args.clear else args.key)
+        print(f"[OK] mapping {'cleared' if args.clear else 'saved'}; run 'run' to refresh the reconciliation")
+        return 0
+    print(json.dumps(reconcile(con, args.month), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+from __future__ import annotations
+from sqlite3 import Connection
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.obs.spans import span
+from app.services.categorization import Categorizer
+
+
+class AccountMap:
+    """
+    In-memory full_path -> accounts.id map for one source, used while ingesting.
+    Existing accounts are loaded once; unseen ones are categorized and inserted in bulk by
+    `resolve`, so each account is categorized at most once per ingest.
+    """
+
+    def __init__(self, con: Connection, source: str, categorizer: Optional[Categorizer] = None):
+        self.con = con
+        self.source = source
+        self.categorizer = categorizer or Categorizer.load(con)
+        self.ids: Dict[str, int] = {
+            r[0]: r[1] for r in con.execute("SELECT full_path, id FROM accounts WHERE source=?", (source,)).fetchall()
+        }
+
+    def resolve(self, specs: Iterable[Tuple[str, str, Optional[str], Optional[str], Optional[str]]]) -> List[int]:
+        """
+        Ids of (full_path, leaf_name, default_category, parent, external_id) specs, inserting
+        the new accounts in bulk, each linked to `parent` if it is stored or listed before it.
+        `default_category` is the structural category used when no rule or override matches.
+        Runs inside the caller's transaction, so new accounts commit (or roll back) with the
+        facts that reference them.
+        """
+        specs = list(specs)
+        new: Dict[str, tuple] = {}
+        for full_path, leaf_name, default_category, parent, external_id in specs:
+            if full_path not in self.ids and full_path not in new:
+                category = self.categorizer.categorize(self.source, full_path, default_category)
+                new[full_path] = (full_path, leaf_name, category, parent, external_id)
+        if new:
+            # Rows are inserted in order, so a parent listed earlier is found by the subselect
+            self.con.executemany(
+                """
+                INSERT INTO accounts(source, full_path, leaf_name, category, parent_id, account_id, depth)
+                SELECT :source, :full_path, :leaf_name, :category, p.id, :external_id, COALESCE(p.depth + 1, 0)
+                FROM (SELECT 1) LEFT JOIN accounts p ON p.source = :source AND p.full_path = :parent
+                """,
+                [{"source": self.source, "full_path": fp, "leaf_name": leaf, "category": cat, "parent": parent,
+                  "external_id": ext} for fp, leaf, cat, parent, ext in new.values()],
+            )
+            paths = list(new)
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                marks = ",".join("?" for _ in chunk)
+                self.ids.update(self.con.execute(
+                    f"SELECT full_path, id FROM accounts WHERE source=? AND full_path IN ({marks})",
+                    [self.source, *chunk],
+                ).fetchall())
+            added = [self.ids[fp] for fp in paths]
+            self.con.executemany(
+                """
+                INSERT INTO account_closure(ancestor_id, descendant_id, depth)
+                SELECT c.ancestor_id, a.id, c.depth + 1 FROM accounts a
+                JOIN account_closure c ON c.descendant_id = a.parent_id WHERE a.id = :id
+                UNION ALL SELECT :id, :id, 0
+                """,
+                [{"id": aid} for aid in added],
+            )
+            self.con.executemany(
+                "UPDATE accounts SET is_leaf=0 WHERE is_leaf=1 AND id = (SELECT parent_id FROM accounts WHERE id=?)",
+                [(aid,) for aid in added],
+            )
+        return [self.ids[spec[0]] for spec in specs]
+
+
+def rebuild_hierarchy(con: Connection):
+    """
+    Recompute depth, is_leaf and the closure table from parent_id for every account.
+    Rootfi accounts without a parent are linked to the account at their path prefix.
+    """
+    rows = con.execute("SELECT id, source, full_path, parent_id FROM accounts").fetchall()
+    by_path = {(r[1], r[2]): r[0] for r in rows}
+    ids = set(by_path.values())
+    parent: Dict[int, Optional[int]] = {}
+    for aid, source, path, pid in rows:
+        if pid is None and source == "rootfi" and " / " in path:
+            pid = by_path.get((source, path.rsplit(" / ", 1)[0]))
+        parent[aid] = pid if pid in ids else None
+    closure: List[Tuple[int, int, int]] = []
+    depth: Dict[int, int] = {}
+    for aid in parent:
+        d, cur, seen = 0, aid, {aid}
+        closure.append((aid, aid, 0))
+        while parent.get(cur) is not None and parent[cur] not in seen:
+            cur = parent[cur]
+            seen.add(cur)
+            d += 1
+            closure.append((cur, aid, d))
+        depth[aid] = d
+    has_children = {p for p in parent.values() if p is not None}
+    with con:
+        con.execute("DELETE FROM account_closure")
+        con.executemany("INSERT INTO account_closure(ancestor_id, descendant_id, depth) VALUES(?,?,?)", closure)
+        con.executemany(
+            "UPDATE accounts SET parent_id=?, depth=?, is_leaf=? WHERE id=?",
+            [(parent[a], depth[a], 0 if a in has_children else 1, a) for a in parent],
+        )
+
+
+def rollup_sql(level: Optional[int], leaf_only: bool) -> Tuple[str, str, str, List[Any]]:
+    """
+    SQL fragments that bucket facts `f` (joined to their account `a`) for aggregation:
+    (extra joins, bucket account-id expression, extra WHERE clause, join params).
+
+    - default: every stored node is its own bucket (Rootfi parents and children both count)
+    - leaf_only: only detail facts of leaf accounts, so nothing is counted twice
+    - level=N: leaf detail facts rolled up to their ancestor at depth N (or the leaf itself if shallower)
+    """
+    if level is not None:
+        return (
+            "JOIN account_closure c ON c.descendant_id = f.account_id "
+            "JOIN accounts b ON b.id = c.ancestor_id AND b.depth = MIN(a.depth, ?)",
+            "b.id",
+            " AND a.is_leaf=1 AND f.kind='amount'",
+            [level],
+        )
+    if leaf_only:
+        return "", "f.account_id", " AND a.is_leaf=1 AND f.kind='amount'", []
+    return "", "f.account_id", "", []
+
+
+def _month_range(year: Optional[int]) -> Tuple[str, List[Any]]:
+    """
+    Year filter as a month_key range, so it can use ix_facts_acct(account_id, month_key).
+    """
+    if not year:
+        return "", []
+    return " AND f.month_key BETWEEN ? AND ?", [f"{year:04d}-01", f"{year:04d}-12"]
+
+
+@span("repo.list_accounts")
+def list_accounts(
+    con: Connection,
+    source: Optional[str] = None,
+    category: Optional[str] = None,
+    level: Optional[int] = None,
+    leaf_only: bool = False,
+    limit: int = 1000,
+) -> Dict[str, Any]:
+    """
+    Returns accounts with their hierarchy attributes, ordered by source and path.
+    """
+    where, params = [], []
+    for col, val in (("source", source), ("category", category), ("depth", level)):
+        if val is not None:
+            where.append(f"{col}=?")
+            params.append(val)
+    if leaf_only:
+        where.append("is_leaf=1")
+    q = "SELECT id, source, full_path, leaf_name, category, parent_id, depth, is_leaf, account_id FROM accounts"
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY source, full_path LIMIT ?"
+    params.append(limit)
+    rows = [dict(r) for r in con.execute(q, params).fetchall()]
+    for r in rows:
+        r["is_leaf"] = bool(r["is_leaf"])
+    return {"rows": rows}
+
+
+@span("repo.account_totals")
+def account_totals(
+    con: Connection,
+    category: Optional[str] = None,
+    year: Optional[int] = None,
+    source: Optional[str] = None,
+    level: Optional[int] = None,
+    leaf_only: bool = False,
+    limit: int = 100,
+) -> Dict[str, Any]:
+    """
+    Returns per-account totals, optionally leaf-only or rolled up to hierarchy level N.
+    """
+    joins, bucket, extra, params = rollup_sql(level, leaf_only)
+    where = ["1=1"]
+    if category:
+        where.append("a.category=?")
+        params.append(category)
+    if source:
+        where.append("a.source=?")
+        params.append(source)
+    yr, yparams = _month_range(year)
+    params.extend(yparams)
+    params.append(limit)
+    cur = con.execute(
+        f"""
+        WITH per_account AS (
+            SELECT {bucket} AS account_id, SUM(f.amount) AS amount, COUNT(DISTINCT f.month_key) AS months
+            FROM facts f JOIN accounts a ON a.id = f.account_id {joins}
+            WHERE {' AND '.join(where)}{yr}{extra}
+            GROUP BY 1
+        )
+        SELECT t.full_path AS account, t.source, t.category, t.depth, p.amount, p.months
+        FROM per_account p JOIN accounts t ON t.id = p.account_id
+        ORDER BY p.amount DESC
+        LIMIT ?
+        """,
+        params,
+    )
+    return {"level": level, "leaf_only": leaf_only or level is not None, "rows": [dict(r) for r in cur.fetchall()]}
+
+
+@span("repo.account_drilldown")
+def drilldown(
+    con: Connection,
+    account: str,
+    source: Optional[str] = None,
+    year: Optional[int] = None,
+    leaf_only: bool = True,
+) -> Dict[str, Any]:
+    """
+    Monthly totals of everything under an account (matched by full path or leaf name,
+    case-insensitive): one range scan of the closure table per matched account, then
+    ix_facts_acct per descendant.
+    """
+    q = "SELECT id, source, full_path FROM accounts WHERE (full_path=? COLLATE NOCASE OR leaf_name=? COLLATE NOCASE)"
+    params: List[Any] = [account, account]
+    if source:
+        q += " AND source=?"
+        params.append(source)
+    matched = [dict(r) for r in con.execute(q, params).fetchall()]
+    out: Dict[str, Any] = {"account": account, "matched": matched, "leaf_only": leaf_only, "months": [], "total": 0.0}
+    if not matched:
+        return out
+    marks = ",".join("?" for _ in matched)
+    yr, yparams = _month_range(year)
+    leaf = " AND a.is_leaf=1 AND f.kind='amount'" if leaf_only else ""
+    cur = con.execute(
+        f"""
+        SELECT f.month_key, SUM(f.amount) AS amount
+        FROM account_closure c
+        CROSS JOIN facts f ON f.account_id = c.descendant_id  -- CROSS JOIN pins the closure as outer loop
+        JOIN accounts a ON a.id = f.account_id
+        WHERE c.ancestor_id IN ({marks}){yr}{leaf}
+        GROUP BY f.month_key
+        ORDER BY f.month_key
+        """,
+        [m["id"] for m in matched] + yparams,
+    )
+    out["months"] = [dict(r) for r in cur.fetchall()]
+    out["total"] = sum(m["amount"] or 0.0 for m in out["months"])
+    return out
@@ -1,55 +1,72 @@
 from __future__ import annotations
 from sqlite3 import Connection
 from app.utils.normalization import ym_key
-from typing import Any, List, Dict, Optional
+from app.obs.spans import span
+from app.repositories.accounts import rollup_sql
+from typing import Any, List, Dict, Optional, Tuple
 
 
 def insert_fact(
     con: Connection,
     period_start: str | None,
     period_end: str | None,
-    source: str,
-    account: str,
-    category: str,
+    account_id: int,
     kind: str,
     amount: float,
 ):
     """
     Insert a fact record into the facts table.
+    The account (and with it source and category) is referenced by its accounts.id.
     Computes the month key from period_end.
     """
     mk = ym_key(period_end) if period_end else None
     with con:
         con.execute(
             """
-            INSERT INTO facts(period_start, period_end, month_key, source, account, category, kind, amount)
-            VALUES(?,?,?,?,?,?,?,?)
+            INSERT INTO facts(period_start, period_end, month_key, account_id, kind, amount)
+            VALUES(?,?,?,?,?,?)
             """,
-            (period_start, period_end, mk, source, account, category, kind, amount)
+            (period_start, period_end, mk, account_id, kind, amount)
         )
 
 
+def insert_facts(con: Connection, rows: List[Tuple[Any, ...]]):
+    """
+    Bulk-insert (period_start, period_end, month_key, account_id, kind, amount) rows.
+    Runs inside the caller's transaction.
+    """
+    con.executemany(
+        "INSERT INTO facts(period_start, period_end, month_key, account_id, kind, amount) VALUES(?,?,?,?,?,?)",
+        rows,
+    )
+
+
+@span("repo.expenses_increase_top")
 def expenses_increase_top(
     con: Connection,
     year: int,
     source: Optional[str] = None,
     limit: int = 5,
+    level: Optional[int] = None,
+    leaf_only: bool = False,
 ) -> Dict[str, Any]:
     """
     Returns the top accounts with the largest increase in expenses for a given year.
     Optionally filters by source and limits the number of results.
+    `leaf_only` skips Rootfi parent items (whose values include their children);
+    `level` rolls leaf expenses up to their ancestor at that hierarchy depth.
     """
     params_firstlast: List[Any] = [str(year)]
     src_clause = ""
     if source:
-        src_clause = " AND source=?"
+        src_clause = " AND a.source=?"
         params_firstlast.append(source)
 
     row = con.execute(
         f"""
-        SELECT MIN(month_key) AS first, MAX(month_key) AS last
-        FROM facts
-        WHERE category='expense' AND substr(month_key,1,4)=?{src_clause}
+        SELECT MIN(f.month_key) AS first, MAX(f.month_key) AS last
+        FROM facts f JOIN accounts a ON a.id = f.account_id
+        WHERE a.category='expense' AND substr(f.month_key,1,4)=?{src_clause}
         """,
         params_firstlast,
     ).fetchone()
@@ -59,7 +76,8 @@ def expenses_increase_top(
     if not first or not last:
         return {"year": year, "first_month": first, "last_month": last, "top": []}
 
-    params: List[Any] = [str(year)]
+    joins, bucket, extra, params = rollup_sql(level, leaf_only)
+    params.append(str(year))
     if source:
         params.append(source)
     params.extend([first, last, limit])
@@ -67,22 +85,22 @@ def expenses_increase_top(
     cur = con.execute(
         f"""
         WITH per_month AS (
-            SELECT account, month_key, SUM(amount) AS amt
-            FROM facts
-            WHERE category='expense' AND substr(month_key,1,4)=?{src_clause}
-            GROUP BY account, month_key
+            SELECT {bucket} AS account_id, f.month_key, SUM(f.amount) AS amt
+            FROM facts f JOIN accounts a ON a.id = f.account_id {joins}
+            WHERE a.category='expense' AND substr(f.month_key,1,4)=?{src_clause}{extra}
+            GROUP BY 1, f.month_key
         ),
         edges AS (
-            SELECT a.account,
-                   (SELECT amt FROM per_month WHERE account=a.account AND month_key=?) AS first_amt,
-                   (SELECT amt FROM per_month WHERE account=a.account AND month_key=?) AS last_amt
-            FROM (SELECT DISTINCT account FROM per_month) a
+            SELECT p.account_id,
+                   (SELECT amt FROM per_month WHERE account_id=p.account_id AND month_key=?) AS first_amt,
+                   (SELECT amt FROM per_month WHERE account_id=p.account_id AND month_key=?) AS last_amt
+            FROM (SELECT DISTINCT account_id FROM per_month) p
         )
-        SELECT account,
-               COALESCE(last_amt,0) - COALESCE(first_amt,0) AS increase,
-               COALESCE(first_amt,0) AS first,
-               COALESCE(last_amt,0)  AS last
-        FROM edges
+        SELECT a.full_path AS account,
+               COALESCE(e.last_amt,0) - COALESCE(e.first_amt,0) AS increase,
+               COALESCE(e.first_amt,0) AS first,
+               COALESCE(e.last_amt,0)  AS last
+        FROM edges e JOIN accounts a ON a.id = e.account_id
         ORDER BY increase DESC
         LIMIT ?
         """,
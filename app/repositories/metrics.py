@@ -1,6 +1,21 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from sqlite3 import Connection
+from app.obs.spans import span
+from app.repositories.period_index import get_index, invalidate, month_ordinal, ordinal_month
+
+
+# Upsert keyed on (period_end, source); gross profit is derived from revenue and COGS
+UPSERT_METRIC_SQL = """
+INSERT INTO metrics(period_end, source, revenue, cogs, gross_profit, expenses, net_profit)
+VALUES(?,?,?,?,?,?,?)
+ON CONFLICT(period_end, source) DO UPDATE SET
+revenue=excluded.revenue,
+cogs=excluded.cogs,
+gross_profit=excluded.gross_profit,
+expenses=excluded.expenses,
+net_profit=excluded.net_profit
+"""
 
 
 def upsert_metric(
@@ -18,21 +33,22 @@ def upsert_metric(
     """
     gross = (revenue or 0.0) - (cogs or 0.0)
     with con:
-        con.execute(
-            """
-            INSERT INTO metrics(period_end, source, revenue, cogs, gross_profit, expenses, net_profit)
-            VALUES(?,?,?,?,?,?,?)
-            ON CONFLICT(period_end, source) DO UPDATE SET
-            revenue=excluded.revenue,
-            cogs=excluded.cogs,
-            gross_profit=excluded.gross_profit,
-            expenses=excluded.expenses,
-            net_profit=excluded.net_profit
-            """,
-            (period_end, source, revenue, cogs, gross, expenses, net_profit)
-        )
+        con.execute(UPSERT_METRIC_SQL, (period_end, source, revenue, cogs, gross, expenses, net_profit))
+    invalidate()
+
 
+def upsert_metrics(con: Connection, source: str, rows: List[Tuple[str, float, float, float, Optional[float]]]):
+    """
+    Bulk upsert of (period_end, revenue, cogs, expenses, net_profit) rows for one source.
+    Runs inside the caller's transaction; the caller invalidates the period index after commit,
+    so no reader can pick up the new generation while the rows are still uncommitted.
+    """
+    con.executemany(UPSERT_METRIC_SQL, [
+        (pe, source, rev, cogs, (rev or 0.0) - (cogs or 0.0), exp, net) for pe, rev, cogs, exp, net in rows
+    ])
 
+
+@span("repo.summary")
 def summary(
     con: Connection,
     year: int | None,
@@ -56,6 +72,7 @@ def summary(
     return {"rows": [dict(r) for r in cur.fetchall()]}
 
 
+@span("repo.trend")
 def trend(
     con: Connection,
     metric: str,
@@ -80,6 +97,7 @@ def trend(
     return {"metric": metric, "points": [dict(r) for r in cur.fetchall()]}
 
 
+@span("repo.sum_between")
 def sum_between(
     con: Connection,
     month_begin: int,
@@ -89,6 +107,22 @@ def sum_between(
 ) -> Dict[str, float]:
     """
     Returns the sum of revenue, cogs, gross profit, expenses, and net profit between two months for a given year and source.
+    Served from the in-memory prefix-sum index (see app.repositories.period_index).
+    """
+    lo, hi = year * 12 + month_begin - 1, year * 12 + month_end - 1
+    totals, _ = get_index(con).total(source, lo, hi)
+    return totals
+
+
+def sum_between_sql(
+    con: Connection,
+    month_begin: int,
+    month_end: int,
+    year: int,
+    source: str | None
+) -> Dict[str, float]:
+    """
+    Same as sum_between with a SUM scan over `metrics`; the reference for tests and benchmarks.
     """
     where = ["substr(period_end,1,4)=?", "CAST(substr(period_end,6,2) AS INTEGER) BETWEEN ? AND ?"]
     params: List[Any] = [str(year), month_begin, month_end]
@@ -97,4 +131,75 @@ def sum_between(
         params.append(source)
     q = f"SELECT SUM(revenue) rev, SUM(cogs) cogs, SUM(gross_profit) gp, SUM(expenses) exp, SUM(COALESCE(net_profit,0)) np FROM metrics WHERE {' AND '.join(where)}"
     r = con.execute(q, params).fetchone()
-    return {"revenue": r[0] or 0.0, "cogs": r[1] or 0.0, "gross_profit": r[2] or 0.0, "expenses": r[3] or 0.0, "net_profit": r[4] or 0.0}
\ No newline at end of file
+    return {"revenue": r[0] or 0.0, "cogs": r[1] or 0.0, "gross_profit": r[2] or 0.0, "expenses": r[3] or 0.0, "net_profit": r[4] or 0.0}
+
+
+@span("repo.range_totals")
+def range_totals(
+    con: Connection,
+    month_from: str,
+    month_to: str,
+    source: str | None
+) -> Dict[str, Any]:
+    """
+    Metric totals over an arbitrary inclusive 'YYYY-MM' range (quarters, halves, fiscal years,
+    trailing twelve months), for one source or all of them with a per-source breakdown.
+    """
+    idx = get_index(con)
+    lo, hi = month_ordinal(month_from), month_ordinal(month_to)
+    totals, months = idx.total(source, lo, hi)
+    out: Dict[str, Any] = {
+        "from": ordinal_month(lo), "to": ordinal_month(hi), "source": source,
+        "months_with_data": months, "totals": totals,
+    }
+    if source is None:
+        out["by_source"] = {}
+        for src in idx.sources():
+            t, n = idx.total(src, lo, hi)
+            out["by_source"][src] = {"months_with_data": n, "totals": t}
+    return out
+
+
+# Period bucketing for period_series: (ordinal SQL over y/m, YoY offset in periods)
+GRAINS: Dict[str, Tuple[str, int]] = {
+    "month": ("y * 12 + m - 1", 12),
+    "quarter": ("y * 4 + (m - 1) / 3", 4),
+    "year": ("y", 1),
+}
+
+
+@span("repo.period_series")
+def period_series(con: Connection, grain: str, source: str | None) -> List[Dict[str, Any]]:
+    """
+    Every metric per period (month | quarter | year) with the previous period, the same period
+    a year earlier and the trailing-twelve-month total, in one windowed pass over `metrics`.
+    Offsets are RANGE frames over the period ordinal rather than LAG over rows, so missing
+    periods yield NULL instead of silently comparing against an older one.
+    The whole history is scanned: cost does not depend on the range the caller keeps.
+    """
+    ord_sql, k = GRAINS[grain]
+    cols = ("revenue", "cogs", "gross_profit", "expenses", "net_profit")
+    windowed = ",\n".join(
+        f"{c}, SUM({c}) OVER prev AS {c}_prev, SUM({c}) OVER yoy AS {c}_yoy, SUM({c}) OVER ttm AS {c}_ttm" for c in cols
+    )
+    q = f"""
+    SELECT ord, months, first_month, last_month,
+        {windowed},
+        SUM(months) OVER ttm AS ttm_months
+    FROM (
+        SELECT {ord_sql} AS ord, COUNT(DISTINCT ym) AS months, MIN(ym) AS first_month, MAX(ym) AS last_month,
+            SUM(revenue) AS revenue, SUM(cogs) AS cogs, SUM(gross_profit) AS gross_profit,
+            SUM(expenses) AS expenses, SUM(net_profit) AS net_profit
+        FROM (
+            SELECT substr(period_end, 1, 7) AS ym, CAST(substr(period_end, 1, 4) AS INTEGER) AS y,
+                CAST(substr(period_end, 6, 2) AS INTEGER) AS m, revenue, cogs, gross_profit, expenses, net_profit
+            FROM metrics {'WHERE source=?' if source else ''}
+        )
+        GROUP BY ord
+    )
+    WINDOW prev AS (ORDER BY ord RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING),
+        yoy AS (ORDER BY ord RANGE BETWEEN {k} PRECEDING AND {k} PRECEDING),
+        ttm AS (ORDER BY ord RANGE BETWEEN {k - 1} PRECEDING AND CURRENT ROW)
+    ORDER BY ord
+    """
+    return [dict(r) for r in con.execute(q, [source] if source else []).fetchall()]
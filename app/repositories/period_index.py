@@ -0,0 +1,136 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from itertools import accumulate
+from sqlite3 import Connection
+from typing import Dict, List, Optional, Tuple
+from app.obs.spans import span
+
+METRIC_COLUMNS = ("revenue", "cogs", "gross_profit", "expenses", "net_profit")
+# Series key for the sum over every source (sum_between with source=None)
+ALL_SOURCES = "*"
+# Connections whose index is kept; the cache holds them, so an id is never reused under it
+MAX_CACHED = 8
+
+
+def month_ordinal(ym: str) -> int:
+    """
+    'YYYY-MM' (or any ISO date) -> months since year 0, so consecutive months differ by 1.
+    """
+    return int(ym[:4]) * 12 + int(ym[5:7]) - 1
+
+
+def ordinal_month(n: int) -> str:
+    return f"{n // 12:04d}-{n % 12 + 1:02d}"
+
+
+class _Series:
+    """
+    Cumulative sums over one source's contiguous monthly timeline [first, last]:
+    prefix[k][i] is the total of METRIC_COLUMNS[k] over the first i months, and
+    counts[i] the number of months among them that have a metrics row.
+    """
+
+    __slots__ = ("first", "last", "prefix", "counts")
+
+    def __init__(self, by_month: Dict[int, List[float]]):
+        self.first, self.last = min(by_month), max(by_month)
+        zero = [0.0] * len(METRIC_COLUMNS)
+        months = [by_month.get(m, zero) for m in range(self.first, self.last + 1)]
+        self.prefix = [list(accumulate((row[k] for row in months), initial=0.0)) for k in range(len(METRIC_COLUMNS))]
+        self.counts = list(accumulate((1 if m in by_month else 0 for m in range(self.first, self.last + 1)), initial=0))
+
+    def total(self, lo: int, hi: int) -> Tuple[List[float], int]:
+        """
+        Totals over months lo..hi (ordinals, inclusive): two lookups per metric.
+        """
+        a, b = max(lo, self.first) - self.first, min(hi, self.last) - self.first + 1
+        if a >= b:
+            return [0.0] * len(METRIC_COLUMNS), 0
+        return [p[b] - p[a] for p in self.prefix], self.counts[b] - self.counts[a]
+
+
+class PeriodIndex:
+    """
+    In-memory prefix-sum index of the `metrics` table per source (plus ALL_SOURCES),
+    so any month range costs one subtraction per metric instead of a table scan.
+    """
+
+    def __init__(self, series: Dict[str, _Series], generation: int, data_version: int):
+        self.series = series
+        self.generation = generation
+        self.data_version = data_version
+
+    @classmethod
+    def build(cls, con: Connection, generation: int, data_version: int) -> "PeriodIndex":
+        acc: Dict[str, Dict[int, List[float]]] = {}
+        for src, pe, *vals in con.execute(
+            "SELECT source, period_end, revenue, cogs, gross_profit, expenses, net_profit FROM metrics"
+        ).fetchall():
+            m = month_ordinal(pe)
+            for key in (src, ALL_SOURCES):
+                row = acc.setdefault(key, {}).setdefault(m, [0.0] * len(METRIC_COLUMNS))
+                for k, v in enumerate(vals):
+                    row[k] += v or 0.0
+        return cls({key: _Series(by_month) for key, by_month in acc.items()}, generation, data_version)
+
+    def sources(self) -> List[str]:
+        return sorted(k for k in self.series if k != ALL_SOURCES)
+
+    def total(self, source: Optional[str], lo: int, hi: int) -> Tuple[Dict[str, float], int]:
+        """
+        Metric totals and number of months with data for ordinals lo..hi of one source (None = all).
+        """
+        s = self.series.get(source or ALL_SOURCES)
+        vals, months = s.total(lo, hi) if s else ([0.0] * len(METRIC_COLUMNS), 0)
+        return dict(zip(METRIC_COLUMNS, vals)), months
+
+
+_LOCK = threading.Lock()
+_CACHE: "OrderedDict[Connection, PeriodIndex]" = OrderedDict()
+_GENERATION = 0
+
+
+def invalidate():
+    """
+    Mark every cached index stale; called by the metrics writers in this process.
+    Writes from other processes are caught by PRAGMA data_version.
+    """
+    global _GENERATION
+    _GENERATION += 1
+
+
+def data_generation(con: Connection) -> Tuple[int, int]:
+    """
+    Version of the metrics visible to `con`: changes with every write in this process
+    (invalidate) or any commit from another connection (PRAGMA data_version).
+    """
+    return _GENERATION, con.execute("PRAGMA data_version").fetchone()[0]
+
+
+def get_index(con: Connection) -> PeriodIndex:
+    """
+    Current index for `con`, rebuilt only when metrics changed since it was built.
+    """
+    data_version = con.execute("PRAGMA data_version").fetchone()[0]
+    idx = _CACHE.get(con)
+    if idx is not None and idx.generation == _GENERATION and idx.data_version == data_version:
+        return idx
+    with _LOCK:
+        idx = _CACHE.get(con)
+        if idx is None or idx.generation != _GENERATION or idx.data_version != data_version:
+            generation = _GENERATION  # read before the scan: a concurrent write forces another rebuild
+            with span("repo.period_index.build"):
+                idx = PeriodIndex.build(con, generation, data_version)
+            _CACHE[con] = idx
+        _CACHE.move_to_end(con)
+        while len(_CACHE) > MAX_CACHED:
+            _CACHE.popitem(last=False)
+    return idx
+
+
+def warm(con: Connection):
+    """
+    Rebuild the index right after an ingest so the first range query doesn't pay for it.
+    """
+    get_index(con)
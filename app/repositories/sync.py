@@ -0,0 +1,138 @@
+from __future__ import annotations
+from datetime import datetime
+from sqlite3 import Connection
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+from app.utils.normalization import ym_key
+
+
+class SyncRecord(NamedTuple):
+    """
+    Upstream bookkeeping of one period record (Rootfi's rootfi_id / rootfi_updated_at /
+    rootfi_deleted_at). Records without an external id are keyed by period_end.
+    """
+    company_id: str
+    external_id: str
+    period_end: str
+    updated_at: Optional[str]
+    deleted_at: Optional[str]
+
+
+class SyncPlan(NamedTuple):
+    """
+    What an incremental ingest has to do: periods to (re)write, periods to tombstone, and
+    the number of records left alone. `records` are the ones whose state gets saved.
+    """
+    source: str
+    changed: Set[str]
+    deleted: Set[str]
+    skipped: int
+    records: List[SyncRecord]
+
+
+def check_company(con: Connection, source: str, companies: Set[str]):
+    """
+    Facts and metrics are stored per (source, period), not per company, so a database holds
+    one company of each synced source: a payload mixing companies, or for a company other
+    than the one already stored, would overwrite another company's months. Raises ValueError.
+    """
+    if len(companies) > 1:
+        raise ValueError(f"payload mixes {source} companies {sorted(companies)}; ingest one company per database")
+    stored = {r[0] for r in con.execute("SELECT DISTINCT company_id FROM sync_state WHERE source = ?", (source,))}
+    if companies and stored and companies != stored:
+        raise ValueError(f"database holds {source} company {sorted(stored)[0]!r}, payload is for {sorted(companies)[0]!r}")
+
+
+def plan_sync(con: Connection, source: str, records: Iterable[SyncRecord], force: bool = False) -> SyncPlan:
+    """
+    Compare records against the stored sync state. A record is rewritten when it is new,
+    its updated_at is newer than the stored one (or unknown), or `force` is set; it is
+    tombstoned when it carries deleted_at and is not tombstoned yet; otherwise it is skipped.
+    Replays of older exports never roll a period back. Records must all belong to the
+    company already stored for `source` (see check_company).
+    """
+    records = list(records)
+    state: Dict[tuple, Any] = {}
+    companies = sorted({r.company_id for r in records})
+    check_company(con, source, set(companies))
+    if companies:
+        marks = ",".join("?" for _ in companies)
+        for row in con.execute(
+            f"SELECT company_id, external_id, updated_at, deleted_at FROM sync_state "
+            f"WHERE source = ? AND company_id IN ({marks})",
+            [source, *companies],
+        ):
+            state[(row[0], row[1])] = (row[2], row[3])
+    changed: Set[str] = set()
+    deleted: Set[str] = set()
+    todo: List[SyncRecord] = []
+    skipped = 0
+    for r in records:
+        prev = state.get((r.company_id, r.external_id))
+        if r.deleted_at:
+            if prev is not None and prev[1] and not force:
+                skipped += 1
+                continue
+            deleted.add(r.period_end)
+        elif force or prev is None or prev[1] or r.updated_at is None or prev[0] is None or r.updated_at > prev[0]:
+            changed.add(r.period_end)
+        else:
+            skipped += 1
+            continue
+        todo.append(r)
+    # A period both deleted (one record) and live (another) keeps the live data
+    return SyncPlan(source, changed, deleted - changed, skipped, todo)
+
+
+def delete_periods(con: Connection, source: str, period_ends: Iterable[str]):
+    """
+    Remove the facts and metrics `source` holds for `period_ends`.
+    Runs inside the caller's transaction.
+    """
+    pes = [(ym_key(pe), pe, source) for pe in period_ends]
+    if not pes:
+        return
+    con.executemany(
+        "DELETE FROM facts WHERE month_key = ? AND period_end = ? "
+        "AND account_id IN (SELECT id FROM accounts WHERE source = ?)",
+        pes,
+    )
+    con.executemany("DELETE FROM metrics WHERE period_end = ? AND source = ?", [(pe, s) for _, pe, s in pes])
+
+
+def save_sync(con: Connection, plan: SyncPlan):
+    """
+    Store the state of the records a plan acted on and advance the per-company high-water
+    marks (the newest updated_at / deleted_at seen). Runs inside the caller's transaction.
+    """
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    con.executemany(
+        """
+        INSERT INTO sync_state(source, company_id, external_id, period_end, updated_at, deleted_at, synced_at)
+        VALUES(?,?,?,?,?,?,?)
+        ON CONFLICT(source, company_id, external_id) DO UPDATE SET period_end=excluded.period_end,
+            updated_at=excluded.updated_at, deleted_at=excluded.deleted_at, synced_at=excluded.synced_at
+        """,
+        [(plan.source, *r, now) for r in plan.records],
+    )
+    marks: Dict[str, str] = {}
+    for r in plan.records:
+        ts = max(filter(None, (r.updated_at, r.deleted_at)), default=None)
+        if ts and ts > marks.get(r.company_id, ""):
+            marks[r.company_id] = ts
+    con.executemany(
+        """
+        INSERT INTO sync_watermarks(source, company_id, high_water, synced_at) VALUES(?,?,?,?)
+        ON CONFLICT(source, company_id) DO UPDATE SET
+            high_water=MAX(high_water, excluded.high_water), synced_at=excluded.synced_at
+        """,
+        [(plan.source, c, ts, now) for c, ts in marks.items()],
+    )
+
+
+def watermarks(con: Connection, source: str) -> Dict[str, str]:
+    """
+    Per-company high-water marks of `source`.
+    """
+    return {r[0]: r[1] for r in con.execute(
+        "SELECT company_id, high_water FROM sync_watermarks WHERE source = ? ORDER BY company_id", (source,)
+    )}
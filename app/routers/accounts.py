@@ -0,0 +1,55 @@
+from __future__ import annotations
+from sqlite3 import Connection
+from fastapi import APIRouter, Query, Depends
+from app.db.db_con import db_conn
+from app.repositories.accounts import list_accounts, account_totals, drilldown
+
+# Create a FastAPI router for the account hierarchy endpoints
+router = APIRouter(prefix="/api/v1/accounts", tags=["accounts"])
+
+CATEGORY_PATTERN = r"^(revenue|cogs|expense|other)$"
+
+
+@router.get("")
+def accounts_api(
+    source: str | None = None,
+    category: str | None = Query(None, pattern=CATEGORY_PATTERN),
+    level: int | None = Query(None, ge=0),
+    leaf_only: bool = False,
+    limit: int = Query(1000, ge=1, le=10000),
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint to list accounts with depth, parent and leaf flags.
+    """
+    return list_accounts(con, source, category, level, leaf_only, limit)
+
+
+@router.get("/totals")
+def account_totals_api(
+    category: str | None = Query(None, pattern=CATEGORY_PATTERN),
+    year: int | None = None,
+    source: str | None = None,
+    level: int | None = Query(None, ge=0),
+    leaf_only: bool = False,
+    limit: int = Query(100, ge=1, le=10000),
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint to get per-account totals, leaf-only or rolled up to hierarchy level N.
+    """
+    return account_totals(con, category, year, source, level, leaf_only, limit)
+
+
+@router.get("/drilldown")
+def drilldown_api(
+    account: str,
+    year: int | None = None,
+    source: str | None = None,
+    leaf_only: bool = True,
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint to get monthly totals of everything under an account, e.g. expenses under Payroll.
+    """
+    return drilldown(con, account, source, year, leaf_only)
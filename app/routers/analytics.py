@@ -1,9 +1,9 @@
 from __future__ import annotations
 from sqlite3 import Connection
 from fastapi import APIRouter, Query, Depends
-from app.services.analytics import anomalies
-from app.repositories.facts import expenses_increase_top
+from app.services.cache import cached_anomalies, cached_top_increase
 from app.db.db_con import db_conn
+from app.utils.jsonfast import FastJSONResponse
 
 # Create a FastAPI router for analytics endpoints
 router = APIRouter(prefix="/api/v1", tags=["analytics"])
@@ -13,30 +13,18 @@ def expenses_top_increase_api(
     year: int,
     source: str | None = None,
     limit: int = 5,
+    level: int | None = Query(None, ge=0),
+    leaf_only: bool = False,
     con: Connection = Depends(db_conn),
 ):
     """
     API endpoint to get accounts with the largest increase in expenses for a given year.
-    Returns a valid response shape even if no data is found.
+    `leaf_only=true` avoids counting Rootfi parent items together with their children;
+    `level=N` rolls leaf expenses up to hierarchy depth N.
+    Returns a valid response shape (HTTP 200) even if no data is found.
+    Served from the response cache until the data changes.
     """
-    # Fast existence check to avoid 500s on empty years
-    params = [str(year)]
-    src_sql = ""
-    if source:
-        src_sql = " AND source=?"
-        params.append(source)
-
-    row = con.execute(
-        f"SELECT COUNT(1) AS c FROM facts "
-        f"WHERE category='expense' AND substr(month_key,1,4)=?{src_sql}",
-        params,
-    ).fetchone()
-    if not row or (row["c"] or 0) == 0:
-        # Always return a valid shape (HTTP 200) even if no data
-        return {"year": year, "first_month": None, "last_month": None, "top": []}
-
-    # Normal path: return top expense increases
-    return expenses_increase_top(con, year, source, limit)
+    return cached_top_increase(con, year, source, limit, level, leaf_only)
 
 @router.get("/analytics/anomalies")
 def anomalies_api(
@@ -48,5 +36,6 @@ def anomalies_api(
 ):
     """
     API endpoint to detect anomalies in a given metric for a year/source using z-score.
+    Rendered directly without jsonable_encoder; served from the response cache until the data changes.
     """
-    return anomalies(con, metric, year, source, z)
\ No newline at end of file
+    return FastJSONResponse(cached_anomalies(con, metric, year, source, z))
\ No newline at end of file
@@ -0,0 +1,28 @@
+from __future__ import annotations
+from sqlite3 import Connection
+from fastapi import APIRouter, Depends, HTTPException
+from app.config import settings
+from app.db.db_con import db_conn
+from app.domain.models import BatchRequest
+from app.services.batch import run_batch
+from app.utils.jsonfast import FastJSONResponse
+
+# Create a FastAPI router for batched dashboard queries
+router = APIRouter(prefix="/api/v1", tags=["batch"])
+
+
+@router.post("/batch")
+def batch_api(body: BatchRequest, con: Connection = Depends(db_conn)):
+    """
+    API endpoint running several dashboard queries (summary, trend, anomalies, top_increase,
+    range, compare) in one round trip. Summaries, trends and anomalies with the same year and
+    source share one `metrics` scan, duplicates run once, and independent parts run
+    concurrently. Results come back in request order, each with `ok` and `result` or `error`.
+    """
+    if len(body.queries) > settings.batch_max_queries:
+        raise HTTPException(422, f"at most {settings.batch_max_queries} queries per batch")
+    try:
+        out = run_batch(con, [q.model_dump() for q in body.queries], settings.db_path)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    return FastJSONResponse(out)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+from sqlite3 import Connection
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.db.db_con import db_conn
+from app.services.export import DATASETS, FORMATS, MEDIA_TYPES, arrow_available, export_stream
+
+# Create a FastAPI router for bulk data export
+router = APIRouter(prefix="/api/v1", tags=["export"])
+
+EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "arrow": "arrows"}
+
+
+@router.get("/export/{dataset}")
+def export_api(
+    request: Request,
+    dataset: str = Path(..., pattern="^(" + "|".join(DATASETS) + ")$"),
+    format: str = Query("csv", pattern="^(" + "|".join(FORMATS) + ")$"),
+    source: str | None = None,
+    category: str | None = None,
+    account: str | None = None,
+    year_from: int | None = Query(None, ge=1900, le=2999),
+    year_to: int | None = Query(None, ge=1900, le=2999),
+    batch_size: int | None = Query(None, ge=1, le=100000),
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint streaming facts, metrics or ai_traces as CSV, NDJSON or (with pyarrow
+    installed) an Arrow IPC stream. Rows are read in fixed-size keyset batches and sent
+    chunked, gzip-compressed when the client accepts it, so memory stays flat whatever
+    the size of the export. source / category / account apply to the datasets that have them.
+    """
+    if year_from is not None and year_to is not None and year_from > year_to:
+        raise HTTPException(422, "year_from must not be after year_to")
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(501, "Arrow export requires pyarrow")
+    gzip = "gzip" in request.headers.get("accept-encoding", "")
+    try:
+        body = export_stream(
+            con, dataset, format, {"source": source, "category": category, "account": account},
+            year_from, year_to, batch_size or settings.export_batch_size, gzip,
+        )
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    headers = {
+        "Content-Disposition": f'attachment; filename="{dataset}.{EXTENSIONS[format]}"',
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers=headers)
@@ -1,5 +1,8 @@
 from __future__ import annotations
 from fastapi import APIRouter
+from app.services.prewarm import WARM_STATUS
+from app.services.startup import READINESS
+from app.utils.jsonfast import FastJSONResponse
 
 # Create a FastAPI router for health and root endpoints
 router = APIRouter(tags=["health"])
@@ -17,15 +20,29 @@ def root():
             "ingest_rootfi": "/ingest/rootfi",
             "metrics_summary": "/api/v1/metrics/summary?year=2024&source=rootfi",
             "metrics_trend": "/api/v1/metrics/trend?metric=revenue&year=2024",
+            "metrics_range": "/api/v1/metrics/range?from=2024-01&to=2024-06",
+            "metrics_compare": "/api/v1/metrics/compare?grain=quarter&year=2024&metrics=revenue,expenses",
             "expenses_top_increase": "/api/v1/expenses/top_increase?year=2024",
             "anomalies": "/api/v1/analytics/anomalies?metric=revenue&year=2024",
+            "accounts": "/api/v1/accounts?source=rootfi&leaf_only=true",
+            "account_totals": "/api/v1/accounts/totals?category=expense&year=2024&level=1",
+            "account_drilldown": "/api/v1/accounts/drilldown?account=Payroll&year=2024",
+            "reconcile": "/api/v1/reconcile?flagged_only=true&level=metric",
+            "export": "/api/v1/export/facts?format=ndjson&source=rootfi&year_from=2024",
+            "batch": "/api/v1/batch",
             "nlq": "/api/v1/nlq"
         }
     }
 
 @router.get("/health")
-def health():
+def health(require_ready: bool = False):
     """
-    Simple health check endpoint.
+    Health check. `ready` turns true once background startup work (warm-up,
+    auto-ingest) has finished; with ?require_ready=true it answers 503 until then,
+    for use as a readiness probe. `cache_warm` reports the post-ingest cache warm-up.
     """
-    return {"status": "ok"}
\ No newline at end of file
+    body = {"status": "ok", "ready": READINESS.ready, "startup": READINESS.snapshot(),
+            "cache_warm": WARM_STATUS.snapshot()}
+    if require_ready and not READINESS.ready:
+        return FastJSONResponse(body, status_code=503)
+    return body
\ No newline at end of file
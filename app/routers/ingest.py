@@ -1,35 +1,69 @@
 from __future__ import annotations
 from sqlite3 import Connection
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Any, Dict
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.exceptions import RequestValidationError
 from app.db.db_con import db_conn
 from app.domain.models import IngestBody, IngestResponse
 from app.services.ingestion import ingest_quickbooks_payload, ingest_rootfi_payload
+from app.utils.jsonfast import loads
 
 # Create a FastAPI router for ingestion endpoints
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
+# Keep the documented request schema even though the body is decoded by hand
+_INGEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": IngestBody.model_json_schema()}},
+    }
+}
 
-@router.post("/quickbooks", response_model=IngestResponse)
-def ingest_qb(body: IngestBody, con: Connection = Depends(db_conn)):
+
+async def ingest_payload(request: Request) -> Dict[str, Any]:
+    """
+    Decode the raw ingest body with the fast JSON backend and return `payload`.
+    Skips pydantic's per-node walk of the (large, free-form) payload dict;
+    malformed bodies still produce the usual 422 validation error shape.
+    """
+    raw = await request.body()
+    try:
+        body = loads(raw)
+    except ValueError as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body",), "msg": f"JSON decode error: {e}", "input": None}])
+    payload = body.get("payload") if isinstance(body, dict) else None
+    if not isinstance(payload, dict):
+        raise RequestValidationError([{"type": "dict_type", "loc": ("body", "payload"), "msg": "Input should be a valid dictionary", "input": None}])
+    return payload
+
+
+@router.post("/quickbooks", response_model=IngestResponse, openapi_extra=_INGEST_OPENAPI)
+def ingest_qb(payload: Dict[str, Any] = Depends(ingest_payload), con: Connection = Depends(db_conn)):
     """
     Ingest endpoint for QuickBooks data.
     Accepts a JSON payload and stores the data in the database.
     Returns an IngestResponse or raises HTTP 400 on error.
     """
     try:
-        return ingest_quickbooks_payload(con, body.payload)
+        return ingest_quickbooks_payload(con, payload)
     except Exception as e:
         raise HTTPException(400, f"QuickBooks ingest failed: {e}")
 
 
-@router.post("/rootfi", response_model=IngestResponse)
-def ingest_rf(body: IngestBody, con: Connection = Depends(db_conn)):
+@router.post("/rootfi", response_model=IngestResponse, openapi_extra=_INGEST_OPENAPI)
+def ingest_rf(
+    payload: Dict[str, Any] = Depends(ingest_payload),
+    full: bool = False,
+    con: Connection = Depends(db_conn),
+):
     """
     Ingest endpoint for Rootfi data.
-    Accepts a JSON payload and stores the data in the database.
+    Accepts a JSON payload and stores the data in the database, incrementally: only periods
+    whose rootfi_updated_at moved are rewritten and soft-deleted ones are removed; the
+    response counts skipped / updated / deleted periods. `full=true` rewrites every period.
     Returns an IngestResponse or raises HTTP 400 on error.
     """
     try:
-        return ingest_rootfi_payload(con, body.payload)
+        return ingest_rootfi_payload(con, payload, full)
     except Exception as e:
-        raise HTTPException(400, f"Rootfi ingest failed: {e}")
\ No newline at end of file
+        raise HTTPException(400, f"Rootfi ingest failed: {e}")
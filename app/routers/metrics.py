@@ -1,12 +1,17 @@
 from __future__ import annotations
 from sqlite3 import Connection
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends
 from app.db.db_con import db_conn
-from app.repositories.metrics import summary, trend
+from app.repositories.metrics import range_totals
+from app.services.cache import cached_summary, cached_trend
+from app.services.compare import METRICS, compare
+from app.utils.jsonfast import FastJSONResponse
 
 # Create a FastAPI router for metrics endpoints
 router = APIRouter(prefix="/api/v1/metrics", tags=["metrics"])
 
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
 @router.get("/summary")
 def metrics_summary(
     year: int | None = Query(None),
@@ -16,8 +21,10 @@ def metrics_summary(
     """
     API endpoint to get a summary of all metrics for a given year and/or source.
     Returns a list of metric records.
+    Rows are plain JSON types, so they are rendered directly without jsonable_encoder.
+    Served from the response cache until the data changes.
     """
-    return summary(con, year, source)
+    return FastJSONResponse(cached_summary(con, year, source))
 
 @router.get("/trend")
 def metrics_trend(
@@ -29,5 +36,49 @@ def metrics_trend(
     """
     API endpoint to get a time series trend for a given metric, year, and/or source.
     Returns a list of (period_end, value, source) points.
+    Served from the response cache until the data changes.
+    """
+    return cached_trend(con, metric, year, source)
+
+@router.get("/range")
+def metrics_range(
+    month_from: str = Query(..., alias="from", pattern=MONTH_PATTERN),
+    month_to: str = Query(..., alias="to", pattern=MONTH_PATTERN),
+    source: str | None = None,
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint to get metric totals over any inclusive month range (YYYY-MM .. YYYY-MM),
+    e.g. a quarter, a fiscal year or trailing twelve months. Answered from the prefix-sum
+    period index, so the cost does not depend on the length of the range.
+    """
+    if month_from > month_to:
+        raise HTTPException(422, "'from' must not be after 'to'")
+    return FastJSONResponse(range_totals(con, month_from, month_to, source))
+
+
+@router.get("/compare")
+def metrics_compare(
+    grain: str = Query("month", pattern=r"^(month|quarter|year)$"),
+    metrics: str | None = Query(None, description="Comma-separated subset of revenue,cogs,gross_profit,expenses,net_profit"),
+    year: int | None = None,
+    month_from: str | None = Query(None, alias="from", pattern=MONTH_PATTERN),
+    month_to: str | None = Query(None, alias="to", pattern=MONTH_PATTERN),
+    source: str | None = None,
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint for period-over-period comparisons: per month | quarter | year, each metric
+    with the previous period (MoM/QoQ), the same period a year earlier (YoY) and the trailing
+    twelve months (TTM). `year` is shorthand for from=YYYY-01&to=YYYY-12; omit both for all history.
     """
-    return trend(con, metric, year, source)
\ No newline at end of file
+    wanted = [m.strip() for m in metrics.split(",") if m.strip()] if metrics else list(METRICS)
+    bad = [m for m in wanted if m not in METRICS]
+    if bad:
+        raise HTTPException(422, f"unknown metric(s): {', '.join(bad)}")
+    if year is not None:
+        month_from = month_from or f"{year:04d}-01"
+        month_to = month_to or f"{year:04d}-12"
+    if month_from and month_to and month_from > month_to:
+        raise HTTPException(422, "'from' must not be after 'to'")
+    return FastJSONResponse(compare(con, grain, wanted, source, month_from, month_to))
@@ -1,31 +1,48 @@
 from sqlite3 import Connection
-from fastapi import APIRouter, Depends, Header
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
 from app.db.db_con import db_conn
-from app.services.nlq import nlq as nlq_service
+from app.services import admission
+from app.services.nlq import nlq_begin, nlq_finish, nlq_llm
 from app.domain.models import NLQRequest, NLQResponse
 
 # Create a FastAPI router for NLQ (Natural Language Query) endpoints
 router = APIRouter(prefix="/api/v1", tags=["nlq"])
 
 @router.post("/nlq", response_model=NLQResponse)
-def nlq(
+async def nlq(
     req: NLQRequest,
+    request: Request,
     con: Connection = Depends(db_conn),
-    x_model: str | None = Header(default=None, convert_underscores=False),
+    x_model: str | None = Header(default=None, alias="X-Model"),
 ):
     """
     API endpoint for natural language queries (NLQ).
     Accepts a NLQRequest and returns a NLQResponse with the answer and trace.
     Optionally allows model override via the X-Model header.
+    Questions needing the LLM go through admission control: a per-client rate limit (429)
+    and a bounded LLM queue (503), both with Retry-After; while the circuit breaker is open
+    they get a rule-based-only answer.
     """
-    out = nlq_service(
-        con=con,
-        query=req.query,
-        conversation_id=req.conversation_id,
-        openai_api_key=settings.openai_api_key,
-        default_model_name=settings.model_name,
-        model_variants_str=settings.model_variants, 
-        prefer_model=x_model,                          
-    )
+    turn = await run_in_threadpool(nlq_begin, con, req.query, req.conversation_id)
+    if turn["answer"] is None:
+        llm_args = (turn, settings.openai_api_key, settings.model_name, settings.model_variants, x_model)
+        if not settings.openai_api_key or admission.BREAKER.is_open():
+            # Answered without calling the LLM; no need to take a slot
+            nlq_llm(*llm_args)
+        else:
+            try:
+                key = admission.client_key(request.headers, request.client.host if request.client else None)
+                wait = admission.RATE_LIMITER.check(key)
+                if wait:
+                    raise admission.Rejected(429, "rate_limited", wait)
+                await admission.LLM_GATE.run(nlq_llm, *llm_args)
+            except admission.Rejected as e:
+                admission.shed(e.reason)
+                turn["trace"].append({"event": "llm_shed", "reason": e.reason})
+                turn["answer"] = f"Too many requests ({e.reason}); retry in {e.headers()['Retry-After']}s."
+                await run_in_threadpool(nlq_finish, con, turn)
+                raise HTTPException(e.status, turn["answer"], headers=e.headers())
+    out = await run_in_threadpool(nlq_finish, con, turn)
     return NLQResponse(**out)
@@ -1,26 +1,97 @@
 from __future__ import annotations
 from sqlite3 import Connection
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from app.db.db_con import db_conn
-from app.obs.traces import traces_recent, traces_by_conv
+from app.obs.traces import traces_recent, traces_by_conv, trace_rollups
+from app.obs.queries import PROFILER
+from app.obs.spans import span_trees
+from app.services.llm_stats import llm_stats
+from app.utils.jsonfast import FastJSONResponse
 
 # Create a FastAPI router for observability endpoints
 router = APIRouter(prefix="/api/v1/obs", tags=["observability"])
 
 
 @router.get("/traces/recent")
-def recent_traces(con: Connection = Depends(db_conn), limit: int = 50):
+def recent_traces(
+    con: Connection = Depends(db_conn),
+    limit: int = Query(50, ge=1, le=1000),
+    before_id: int | None = None,
+    tool_calls: bool = False,
+    spans: bool = True,
+):
     """
-    API endpoint to get the most recent trace records.
-    Returns a list of trace rows, up to the specified limit.
+    API endpoint to get the most recent trace records, newest first.
+    Pass the returned `next_cursor` as `before_id` to fetch the next page.
+    Rendered directly without jsonable_encoder; pages can be large.
     """
-    return {"rows": traces_recent(con, limit)}
+    return FastJSONResponse(traces_recent(con, limit, before_id, tool_calls, spans))
 
 
 @router.get("/traces/by_conv")
-def by_conv(conversation_id: str, con: Connection = Depends(db_conn)):
+def by_conv(
+    conversation_id: str,
+    con: Connection = Depends(db_conn),
+    limit: int = Query(50, ge=1, le=1000),
+    before_id: int | None = None,
+    tool_calls: bool = False,
+    spans: bool = True,
+):
     """
-    API endpoint to get all trace records for a given conversation ID.
-    Returns a list of trace rows for the specified conversation.
+    API endpoint to get trace records for a given conversation ID, newest first.
+    Pass the returned `next_cursor` as `before_id` to fetch the next page.
     """
-    return {"rows": traces_by_conv(con, conversation_id)}
\ No newline at end of file
+    return traces_by_conv(con, conversation_id, limit, before_id, tool_calls, spans)
+
+
+@router.get("/traces/rollups")
+def rollups(
+    since: str | None = None,
+    until: str | None = None,
+    model: str | None = None,
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint to get hourly per-model latency and token rollups.
+    These are kept after raw traces expire.
+    """
+    return {"rows": trace_rollups(con, since, until, model)}
+
+
+@router.get("/traces/spans")
+def spans_by_request(request_id: str, con: Connection = Depends(db_conn)):
+    """
+    API endpoint to get the span tree of any request by its x-request-id.
+    """
+    return {"request_id": request_id, "spans": span_trees(con, [request_id]).get(request_id, [])}
+
+
+@router.get("/queries")
+def slow_queries(
+    limit: int = 20,
+    order: str = Query("max_ms", pattern=r"^(max_ms|total_ms|calls)$"),
+    reset: bool = False,
+):
+    """
+    API endpoint to get the top-N SQL fingerprints collected by the query profiler.
+    Optionally clears the collected statistics after reading them.
+    """
+    out = PROFILER.top(limit, order)
+    if reset:
+        PROFILER.reset()
+    return out
+
+
+@router.get("/llm/stats")
+def llm_stats_api(
+    hours: int = Query(24, ge=1),
+    since: str | None = None,
+    until: str | None = None,
+    group_by: str = Query("model,intent", pattern=r"^(model|intent)(,(model|intent))?$"),
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint for LLM latency percentiles, tokens/s, cost estimates and error rates.
+    Window is the last `hours` unless `since`/`until` ('YYYY-MM-DDTHH') are given.
+    """
+    return llm_stats(con, hours, since, until, group_by)
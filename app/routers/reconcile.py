@@ -0,0 +1,35 @@
+from __future__ import annotations
+from sqlite3 import Connection
+from fastapi import APIRouter, Depends, Query
+from app.db.db_con import db_conn
+from app.services.reconciliation import reconciliation_page
+from app.utils.jsonfast import FastJSONResponse
+
+# Create a FastAPI router for cross-source reconciliation
+router = APIRouter(prefix="/api/v1", tags=["reconcile"])
+
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+
+@router.get("/reconcile")
+def reconcile_api(
+    level: str | None = Query(None, pattern=r"^(metric|account)$"),
+    flagged_only: bool = False,
+    month_from: str | None = Query(None, alias="from", pattern=MONTH_PATTERN),
+    month_to: str | None = Query(None, alias="to", pattern=MONTH_PATTERN),
+    item: str | None = None,
+    abs_tol: float | None = Query(None, ge=0),
+    rel_tol: float | None = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    con: Connection = Depends(db_conn),
+):
+    """
+    API endpoint listing QuickBooks vs Rootfi variances per month, by metric and by mapped
+    account, newest month first. Rows are refreshed after every ingest. Pass the returned
+    `next_cursor` as `cursor` for the next page; `abs_tol` / `rel_tol` override the configured
+    tolerances when deciding `flagged`.
+    """
+    return FastJSONResponse(reconciliation_page(
+        con, level, flagged_only, month_from, month_to, item, abs_tol, rel_tol, limit, cursor,
+    ))
@@ -0,0 +1,229 @@
+from __future__ import annotations
+import asyncio, contextvars, hashlib, math, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from app.config import settings
+from app.obs.metrics import registry as prom_registry
+
+
+class Rejected(Exception):
+    """
+    A request refused before reaching the LLM: HTTP `status` (429 | 503), a short
+    `reason` (rate_limited | queue_full | queue_timeout) and seconds until a retry may succeed.
+    """
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class RateLimiter:
+    """
+    Token bucket per client key: `rate_per_s` tokens refill up to `burst`. The least recently
+    seen clients are forgotten beyond `max_clients`, so memory stays bounded.
+    """
+
+    def __init__(self, rate_per_s: float, burst: int, max_clients: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_s
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self.clock = clock
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> float:
+        """
+        Take a token for `key`. Returns 0.0 if allowed, else the seconds until one is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = [float(self.burst), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+                prom_registry().RATE_LIMIT_CLIENTS.set(len(self._buckets))
+            else:
+                self._buckets.move_to_end(key)
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+            if b[0] >= 1.0:
+                b[0] -= 1.0
+                return 0.0
+            return (1.0 - b[0]) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive LLM errors; while open, callers skip the LLM. After
+    `cooldown_s` one probe call is let through (half-open): success closes it, failure reopens it.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failures: int, cooldown_s: float, clock: Callable[[], float] = time.monotonic):
+        self.threshold = max(1, failures)
+        self.cooldown_s = cooldown_s
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set(self, state: str):
+        if state != self.state:
+            self.state = state
+            prom_registry().LLM_BREAKER.set(self.GAUGE[state])
+
+    def is_open(self) -> bool:
+        """
+        True while calls are being refused (open and still cooling down, or a probe is out).
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                return self.clock() - self.opened_at < self.cooldown_s
+            return self.state == self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go to the LLM now; the first call after the cooldown becomes the probe.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.cooldown_s:
+                self._set(self.HALF_OPEN)
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._set(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+                self._set(self.OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures}
+
+
+class LLMGate:
+    """
+    Runs LLM-bound calls on a dedicated pool of `limit` threads, so a slow LLM never holds the
+    server's shared threadpool. At most `queue_size` calls wait for a slot; beyond that callers
+    are refused at once, and a call that waited longer than `queue_timeout_s` is dropped
+    unstarted. Callers await without holding a thread.
+    """
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout_s: float):
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout_s = queue_timeout_s
+        self.in_flight = 0
+        self.queued = 0
+        self.ewma_ms = 1000.0  # running estimate of one call, for Retry-After
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _publish(self):
+        m = prom_registry()
+        m.LLM_INFLIGHT.set(self.in_flight)
+        m.LLM_QUEUED.set(self.queued)
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the current queue has likely drained.
+        """
+        return (self.queued / self.limit + 1) * self.ewma_ms / 1000.0
+
+    def has_capacity(self) -> bool:
+        """
+        True if a call submitted now would start at once rather than queue.
+        """
+        return self.in_flight + self.queued < self.limit
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        with self._lock:
+            if self.in_flight + self.queued >= self.limit + self.queue_size:
+                raise Rejected(503, "queue_full", self.retry_after())
+            self.queued += 1
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.limit, thread_name_prefix="llm")
+            self._publish()
+        enqueued = time.monotonic()
+
+        def task():
+            with self._lock:
+                self.queued -= 1
+                stale = time.monotonic() - enqueued > self.queue_timeout_s
+                if not stale:
+                    self.in_flight += 1
+                self._publish()
+            if stale:
+                raise Rejected(503, "queue_timeout", self.retry_after())
+            t0 = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                ms = (time.perf_counter() - t0) * 1000.0
+                with self._lock:
+                    self.in_flight -= 1
+                    self.ewma_ms = 0.8 * self.ewma_ms + 0.2 * ms
+                    self._publish()
+
+        # Copy the caller's context so spans recorded on the LLM thread join the request's tree
+        ctx = contextvars.copy_context()
+        return self._pool.submit(ctx.run, task)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Blocking `run` for background threads (cache warm-up): same limits and accounting.
+        """
+        return self._submit(fn, *args).result()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"in_flight": self.in_flight, "queued": self.queued, "limit": self.limit,
+                "queue_size": self.queue_size, "ewma_ms": round(self.ewma_ms, 1)}
+
+
+def client_key(headers: Dict[str, str], client_host: Optional[str]) -> str:
+    """
+    Rate-limit key of a request: its API key (X-API-Key, else the Authorization header),
+    hashed so no secret is kept in memory; otherwise the client IP.
+    """
+    cred = headers.get("x-api-key") or headers.get("authorization")
+    if cred:
+        return "key:" + hashlib.sha256(cred.encode()).hexdigest()[:16]
+    return "ip:" + (client_host or "unknown")
+
+
+def shed(reason: str):
+    """
+    Count a request refused before the LLM.
+    """
+    prom_registry().LLM_SHED.labels(reason).inc()
+
+
+RATE_LIMITER = RateLimiter(settings.nlq_rate_per_min / 60.0, settings.nlq_burst)
+BREAKER = CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_cooldown_s)
+LLM_GATE = LLMGate(settings.llm_max_concurrency, settings.llm_queue_size, settings.llm_queue_timeout_s)
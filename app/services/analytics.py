@@ -1,9 +1,12 @@
 from __future__ import annotations
 from typing import Any, Dict, List
 from sqlite3 import Connection
+from app.repositories.facts import expenses_increase_top
 from app.repositories.metrics import trend
+from app.obs.spans import span
 
 
+@span("service.anomalies")
 def anomalies(
     con: Connection,
     metric: str,
@@ -15,20 +18,56 @@ def anomalies(
     Detects anomalies in a metric's time series using z-score thresholding.
     Returns points with z-scores above the threshold, along with mean and stddev.
     """
-    tr = trend(con, metric, year, source)
-    vals = [p['value'] for p in tr['points'] if p['value'] is not None]
+    return zscore_flags(metric, trend(con, metric, year, source)['points'], z)
+
+
+def zscore_flags(metric: str, points: List[Dict[str, Any]], z: float = 2.0) -> Dict[str, Any]:
+    """
+    The anomaly result for trend points already fetched (shared by /batch with other queries).
+    """
+    vals = [p['value'] for p in points if p['value'] is not None]
     if len(vals) < 3:
         # Not enough data to compute anomalies
-        return {"metric": metric, "points": tr['points'], "flags": []}
+        return {"metric": metric, "points": points, "flags": []}
     mu = sum(vals) / len(vals)
     sd = (sum((v - mu) ** 2 for v in vals) / (len(vals) - 1)) ** 0.5 if len(vals) > 1 else 0
     flags: List[Dict[str, Any]] = []
     if sd > 0:
-        for p in tr['points']:
+        for p in points:
             v = p['value']
             if v is None:
                 continue
             zscore = (v - mu) / sd
             if abs(zscore) >= z:
                 flags.append({"period_end": p['period_end'], "value": v, "z": round(zscore, 2)})
-    return {"metric": metric, "points": tr['points'], "flags": flags, "mu": mu, "sd": sd}
\ No newline at end of file
+    return {"metric": metric, "points": points, "flags": flags, "mu": mu, "sd": sd}
+
+
+@span("service.top_increase")
+def top_increase(
+    con: Connection,
+    year: int,
+    source: str | None = None,
+    limit: int = 5,
+    level: int | None = None,
+    leaf_only: bool = False,
+) -> Dict[str, Any]:
+    """
+    Expense accounts with the largest increase in a year, or an empty result (same shape)
+    when the year has no expense rows.
+    """
+    # Fast existence check to avoid 500s on empty years
+    params = [str(year)]
+    src_sql = ""
+    if source:
+        src_sql = " AND a.source=?"
+        params.append(source)
+
+    row = con.execute(
+        f"SELECT COUNT(1) AS c FROM facts f JOIN accounts a ON a.id = f.account_id "
+        f"WHERE a.category='expense' AND substr(f.month_key,1,4)=?{src_sql}",
+        params,
+    ).fetchone()
+    if not row or (row["c"] or 0) == 0:
+        return {"year": year, "first_month": None, "last_month": None, "top": []}
+    return expenses_increase_top(con, year, source, limit, level, leaf_only)
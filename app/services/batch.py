@@ -0,0 +1,264 @@
+from __future__ import annotations
+import contextvars, re, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from sqlite3 import Connection
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from app.config import settings
+from app.obs.queries import ProfilingConnection
+from app.obs.spans import span
+from app.repositories.metrics import range_totals
+from app.services.analytics import zscore_flags
+from app.services.cache import cached_summary, cached_top_increase
+from app.services.compare import METRICS, compare
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def _metric(v: Any) -> str:
+    if v not in METRICS:
+        raise ValueError(f"unknown metric {v!r}")
+    return v
+
+
+def _month(v: Any) -> str:
+    if not isinstance(v, str) or not MONTH_RE.match(v):
+        raise ValueError(f"expected YYYY-MM, got {v!r}")
+    return v
+
+
+def _metric_list(v: Any) -> Tuple[str, ...]:
+    items = [m.strip() for m in v.split(",")] if isinstance(v, str) else list(v)
+    return tuple(_metric(m) for m in items if m)
+
+
+def _grain(v: Any) -> str:
+    if v not in ("month", "quarter", "year"):
+        raise ValueError(f"unknown grain {v!r}")
+    return v
+
+
+def _bool(v: Any) -> bool:
+    if isinstance(v, str):
+        return v.lower() in ("1", "true", "yes")
+    return bool(v)
+
+
+# Parameters each op accepts: name -> (coercion, default). A default of ... means required.
+OPS: Dict[str, Dict[str, Tuple[Callable[[Any], Any], Any]]] = {
+    "summary": {"year": (int, None), "source": (str, None)},
+    "trend": {"metric": (_metric, ...), "year": (int, None), "source": (str, None)},
+    "anomalies": {"metric": (_metric, ...), "year": (int, None), "source": (str, None), "z": (float, 2.0)},
+    "top_increase": {"year": (int, ...), "source": (str, None), "limit": (int, 5), "level": (int, None),
+                     "leaf_only": (_bool, False)},
+    "range": {"from": (_month, ...), "to": (_month, ...), "source": (str, None)},
+    "compare": {"grain": (_grain, "month"), "metrics": (_metric_list, METRICS), "year": (int, None),
+                "from": (_month, None), "to": (_month, None), "source": (str, None)},
+}
+# Ops answered from one shared `metrics` scan per (year, source)
+METRICS_SCAN_OPS = ("summary", "trend", "anomalies")
+
+
+class SubQuery(NamedTuple):
+    """
+    One validated sub-query: its position in the request, op and normalized parameters.
+    """
+    index: int
+    id: Optional[str]
+    op: str
+    params: Dict[str, Any]
+
+
+def validate(queries: List[Dict[str, Any]]) -> List[SubQuery]:
+    """
+    Check ops and coerce parameters. Raises ValueError naming the offending sub-query.
+    """
+    out: List[SubQuery] = []
+    for i, q in enumerate(queries):
+        op = q.get("op")
+        spec = OPS.get(op)
+        label = q.get("id") or f"#{i}"
+        if spec is None:
+            raise ValueError(f"query {label}: unknown op {op!r}; expected one of {', '.join(OPS)}")
+        raw = q.get("params") or {}
+        unknown = set(raw) - set(spec)
+        if unknown:
+            raise ValueError(f"query {label}: unknown param(s) {', '.join(sorted(unknown))} for {op}")
+        params: Dict[str, Any] = {}
+        for name, (coerce, default) in spec.items():
+            v = raw.get(name)
+            if v is None:
+                if default is ...:
+                    raise ValueError(f"query {label}: {op} requires {name}")
+                params[name] = default
+                continue
+            try:
+                params[name] = coerce(v)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"query {label}: bad {name}: {e}")
+        if op == "range" and params["from"] > params["to"]:
+            raise ValueError(f"query {label}: 'from' must not be after 'to'")
+        out.append(SubQuery(i, q.get("id"), op, params))
+    return out
+
+
+def _freeze(params: Dict[str, Any]) -> tuple:
+    return tuple(sorted(params.items()))
+
+
+class Plan(NamedTuple):
+    """
+    Sub-queries grouped into independent units of work. `scans` maps (year, source) to the
+    metric-scan ops it serves; `singles` maps a distinct (op, params) to the positions asking for it.
+    """
+    scans: Dict[Tuple[Optional[int], Optional[str]], List[SubQuery]]
+    singles: Dict[Tuple[str, tuple], List[SubQuery]]
+
+
+def plan(subqueries: List[SubQuery]) -> Plan:
+    """
+    Group sub-queries: every summary / trend / anomalies with the same year and source shares
+    one `metrics` scan, and identical other sub-queries run once.
+    """
+    scans: Dict[Tuple[Optional[int], Optional[str]], List[SubQuery]] = {}
+    singles: Dict[Tuple[str, tuple], List[SubQuery]] = {}
+    for q in subqueries:
+        if q.op in METRICS_SCAN_OPS:
+            scans.setdefault((q.params["year"], q.params["source"]), []).append(q)
+        else:
+            singles.setdefault((q.op, _freeze(q.params)), []).append(q)
+    return Plan(scans, singles)
+
+
+def _from_scan(rows: List[Dict[str, Any]], q: SubQuery) -> Dict[str, Any]:
+    """
+    Answer one metrics-scan op from the shared summary rows.
+    """
+    if q.op == "summary":
+        return {"rows": rows}
+    metric = q.params["metric"]
+    points = [{"period_end": r["period_end"], "value": r[metric], "source": r["source"]} for r in rows]
+    if q.op == "trend":
+        return {"metric": metric, "points": points}
+    return zscore_flags(metric, points, q.params["z"])
+
+
+def _run_scan(con: Connection, read_con: Connection, key: Tuple[Optional[int], Optional[str]],
+              qs: List[SubQuery]) -> List[Tuple[SubQuery, Any]]:
+    """
+    Answer the metric-scan ops of one (year, source) from the cached summary, computed on
+    `read_con` on a miss.
+    """
+    rows = cached_summary(con, key[0], key[1], read_con=read_con)["rows"]
+    return [(q, _from_scan(rows, q)) for q in qs]
+
+
+def _run_single(con: Connection, read_con: Connection, qs: List[SubQuery]) -> List[Tuple[SubQuery, Any]]:
+    """
+    Run one distinct sub-query and hand its result to every position that asked for it.
+    """
+    res = _single(con, read_con, qs[0].op, qs[0].params)
+    return [(q, res) for q in qs]
+
+
+def _single(con: Connection, read_con: Connection, op: str, p: Dict[str, Any]) -> Any:
+    if op == "top_increase":
+        return cached_top_increase(con, p["year"], p["source"], p["limit"], p["level"], p["leaf_only"],
+                                   read_con=read_con)
+    if op == "range":
+        return range_totals(read_con, p["from"], p["to"], p["source"])
+    month_from, month_to = p["from"], p["to"]
+    if p["year"] is not None:
+        month_from = month_from or f"{p['year']:04d}-01"
+        month_to = month_to or f"{p['year']:04d}-12"
+    return compare(read_con, p["grain"], list(p["metrics"]), p["source"], month_from, month_to)
+
+
+# Worker threads, each with its own read-only connection to the app database
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=settings.batch_workers, thread_name_prefix="batch")
+        return _POOL
+
+
+def _ro_uri(db_path: str) -> str:
+    """
+    Read-only URI of `db_path`, which may itself be a `file:` URI or contain '?' or '#'.
+    """
+    if db_path.startswith("file:"):
+        return db_path + ("&" if "?" in db_path else "?") + "mode=ro"
+    return Path(db_path).resolve().as_uri() + "?mode=ro"
+
+
+def _read_con(db_path: str) -> Connection:
+    """
+    This worker thread's read-only connection to `db_path`, opened on first use.
+    """
+    con = getattr(_LOCAL, "con", None)
+    if con is None or getattr(_LOCAL, "path", None) != db_path:
+        con = sqlite3.connect(_ro_uri(db_path), uri=True, check_same_thread=False, factory=ProfilingConnection)
+        con.row_factory = sqlite3.Row
+        _LOCAL.con, _LOCAL.path = con, db_path
+    return con
+
+
+def _concurrent(db_path: Optional[str], units: int) -> bool:
+    return bool(db_path) and db_path != ":memory:" and settings.batch_workers > 1 and units > 1
+
+
+@span("service.batch")
+def run_batch(con: Connection, queries: List[Dict[str, Any]], db_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Validate, plan and run a list of {"id", "op", "params"} sub-queries. Independent units run
+    concurrently on worker threads with read-only connections when `db_path` names a database
+    file; otherwise they run in order on `con`. Summaries and top increases go through the
+    response cache, keyed by `con` whichever connection computes a miss. A failing sub-query
+    reports its error without failing the others. Results come back in request order.
+    """
+    t0 = time.perf_counter()
+    subqueries = validate(queries)
+    p = plan(subqueries)
+    units: List[Callable[[Connection], List[Tuple[SubQuery, Any]]]] = []
+    for key, qs in p.scans.items():
+        units.append(lambda c, key=key, qs=qs: _run_scan(con, c, key, qs))
+    for qs in p.singles.values():
+        units.append(lambda c, qs=qs: _run_single(con, c, qs))
+
+    def _guarded(unit, c):
+        try:
+            return unit(c), None
+        except Exception as e:  # reported per sub-query
+            return None, f"{type(e).__name__}: {e}"
+
+    concurrent = _concurrent(db_path, len(units))
+    if concurrent:
+        def _task(unit):
+            return _guarded(unit, _read_con(db_path))
+        # Copy the request context so spans in worker threads keep the request id
+        futures = [_pool().submit(contextvars.copy_context().run, _task, u) for u in units]
+        outcomes = [f.result() for f in futures]
+    else:
+        outcomes = [_guarded(u, con) for u in units]
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(subqueries)
+    groups = [*p.scans.values(), *p.singles.values()]
+    for qs, (pairs, error) in zip(groups, outcomes):
+        if error is not None:
+            for q in qs:
+                results[q.index] = {"id": q.id, "op": q.op, "ok": False, "error": error}
+            continue
+        for q, res in pairs:
+            results[q.index] = {"id": q.id, "op": q.op, "ok": True, "result": res}
+    return {
+        "results": results,
+        "plan": {"queries": len(subqueries), "metrics_scans": len(p.scans), "units": len(units),
+                 "concurrent": concurrent},
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 3),
+    }
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from sqlite3 import Connection
+from typing import Any, Callable, Hashable, Optional, Tuple
+from app.config import settings
+from app.obs.metrics import registry as prom_registry
+from app.repositories.metrics import summary, trend
+from app.repositories.period_index import data_generation
+from app.services.analytics import anomalies, top_increase
+
+
+def generation(con: Connection) -> Tuple[Any, ...]:
+    """
+    Version of the data behind `con`'s answers (bumped by metrics and reconciliation writes,
+    and by commits from other connections). Read it before computing a result, so a write
+    racing the computation leaves the entry stale rather than wrong.
+    """
+    return (id(con), *data_generation(con))
+
+
+class DataCache:
+    """
+    LRU of computed results, each tagged with the data generation it was computed at; an
+    entry from an older generation is a miss. Values are shared between callers and must
+    not be mutated.
+    """
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[Any, ...], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, con: Connection, key: Hashable) -> Optional[Any]:
+        """
+        The cached value for `key` if it is current, else None.
+        """
+        entry = self._entries.get(key)
+        hit = entry is not None and entry[0] == generation(con)
+        prom_registry().CACHE_LOOKUPS.labels(self.name, "hit" if hit else "miss").inc()
+        if not hit:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, gen: Tuple[Any, ...]):
+        with self._lock:
+            self._entries[key] = (gen, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, con: Connection, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        The cached value, else `fn()` cached under `con`'s generation. `fn` may read through
+        another connection to the same database (batch workers): its later snapshot holds
+        everything committed before the generation was read, so the tag is never too new.
+        """
+        value = self.get(con, key)
+        if value is None:
+            gen = generation(con)
+            value = fn()
+            self.put(key, value, gen)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Dashboard read responses, and NLQ answers keyed by normalized question
+RESPONSE_CACHE = DataCache("response", settings.response_cache_size)
+NLQ_CACHE = DataCache("nlq", settings.nlq_cache_size)
+
+
+# Each helper keys and tags entries by the app connection `con`; `read_con`, when given,
+# runs the query on a miss (see DataCache.get_or_compute)
+
+def cached_summary(con: Connection, year: Optional[int], source: Optional[str],
+                   read_con: Optional[Connection] = None):
+    return RESPONSE_CACHE.get_or_compute(con, ("summary", year, source),
+                                         lambda: summary(read_con or con, year, source))
+
+
+def cached_trend(con: Connection, metric: str, year: Optional[int], source: Optional[str]):
+    return RESPONSE_CACHE.get_or_compute(con, ("trend", metric, year, source), lambda: trend(con, metric, year, source))
+
+
+def cached_anomalies(con: Connection, metric: str, year: Optional[int], source: Optional[str], z: float = 2.0):
+    return RESPONSE_CACHE.get_or_compute(con, ("anomalies", metric, year, source, z),
+                                         lambda: anomalies(con, metric, year, source, z))
+
+
+def cached_top_increase(con: Connection, year: int, source: Optional[str] = None, limit: int = 5,
+                        level: Optional[int] = None, leaf_only: bool = False,
+                        read_con: Optional[Connection] = None):
+    return RESPONSE_CACHE.get_or_compute(con, ("top_increase", year, source, limit, level, leaf_only),
+                                         lambda: top_increase(read_con or con, year, source, limit, level, leaf_only))
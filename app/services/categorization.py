@@ -0,0 +1,206 @@
+from __future__ import annotations
+import re
+from sqlite3 import Connection
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from app.repositories.period_index import invalidate
+from app.services.reconciliation import reconcile
+
+CATEGORIES = ("revenue", "cogs", "expense", "other")
+MATCH_KINDS = ("exact", "prefix", "contains", "regex")
+
+# Seed rule set: the QuickBooks keyword heuristics, in their original order.
+# (source, match, pattern, category); priority follows list order.
+DEFAULT_RULES: List[Tuple[Optional[str], str, str, str]] = [
+    ("quickbooks", "contains", "income", "revenue"),
+    ("quickbooks", "prefix", "revenue", "revenue"),
+    ("quickbooks", "contains", "sales", "revenue"),
+    ("quickbooks", "contains", "cost of goods sold", "cogs"),
+    ("quickbooks", "contains", "payroll expense - cos", "cogs"),
+    ("quickbooks", "contains", "direct parts", "cogs"),
+    ("quickbooks", "contains", "expense", "expense"),
+    ("quickbooks", "contains", "shipping", "expense"),
+    ("quickbooks", "contains", "technology", "expense"),
+]
+
+
+class Rule(NamedTuple):
+    id: Optional[int]
+    source: Optional[str]  # None applies to every source
+    match: str
+    pattern: str
+    category: str
+    priority: int
+
+
+def seed_rules(con: Connection):
+    """
+    Insert DEFAULT_RULES into an empty category_rules table.
+    """
+    with con:
+        con.executemany(
+            "INSERT INTO category_rules(source, match, pattern, category, priority) VALUES(?,?,?,?,?)",
+            [(s, m, p, c, (i + 1) * 10) for i, (s, m, p, c) in enumerate(DEFAULT_RULES)],
+        )
+
+
+def _compile(rule: Rule) -> Callable[[str], bool]:
+    """
+    Turn one rule into a predicate over the lowercased account path.
+    """
+    pat = rule.pattern.lower()
+    if rule.match == "exact":
+        return lambda s: s == pat
+    if rule.match == "prefix":
+        return lambda s: s.startswith(pat)
+    if rule.match == "contains":
+        return lambda s: pat in s
+    if rule.match == "regex":
+        return re.compile(rule.pattern, re.IGNORECASE).search
+    raise ValueError(f"unknown match kind {rule.match!r}; choose from {', '.join(MATCH_KINDS)}")
+
+
+def structural_default(source: str, full_path: str) -> Optional[str]:
+    """
+    Category implied by the payload structure, if any. Rootfi paths start with the
+    section they were flattened from ('revenue', 'cogs', 'expense').
+    """
+    if source == "rootfi":
+        root = full_path.split(" / ", 1)[0]
+        if root in CATEGORIES:
+            return root
+    return None
+
+
+class Categorizer:
+    """
+    Compiled category rules plus per-account overrides, memoized per (source, account).
+    Resolution order: account override, then the source's rules and global rules by
+    priority, then the caller's default (structural category) or 'other'.
+    """
+
+    def __init__(self, rules: List[Rule], overrides: Dict[Tuple[str, str], str]):
+        self.rules = sorted(rules, key=lambda r: (r.priority, r.id or 0))
+        self.overrides = overrides
+        self._compiled: Dict[str, List[Tuple[Callable[[str], bool], str]]] = {}
+        self._memo: Dict[Tuple[str, str, Optional[str]], str] = {}
+
+    @classmethod
+    def load(cls, con: Connection) -> "Categorizer":
+        rules = [Rule(*r) for r in con.execute(
+            "SELECT id, source, match, pattern, category, priority FROM category_rules"
+        ).fetchall()]
+        overrides = {(r[0], r[1]): r[2] for r in con.execute(
+            "SELECT source, full_path, category FROM category_overrides"
+        ).fetchall()}
+        return cls(rules, overrides)
+
+    def _for_source(self, source: str) -> List[Tuple[Callable[[str], bool], str]]:
+        compiled = self._compiled.get(source)
+        if compiled is None:
+            compiled = self._compiled[source] = [
+                (_compile(r), r.category) for r in self.rules if r.source is None or r.source == source
+            ]
+        return compiled
+
+    def categorize(self, source: str, full_path: str, default: Optional[str] = None) -> str:
+        key = (source, full_path, default)
+        cat = self._memo.get(key)
+        if cat is None:
+            cat = self._memo[key] = self._resolve(source, full_path, default)
+        return cat
+
+    def _resolve(self, source: str, full_path: str, default: Optional[str]) -> str:
+        cat = self.overrides.get((source, full_path))
+        if cat is not None:
+            return cat
+        s = (full_path or "").lower()
+        for pred, category in self._for_source(source):
+            if pred(s):
+                return category
+        return default or "other"
+
+
+def add_rule(con: Connection, source: Optional[str], match: str, pattern: str, category: str, priority: int = 100) -> int:
+    """
+    Validate and store a rule; returns its id. Takes effect on the next ingest or recategorize.
+    """
+    rule = Rule(None, source, match, pattern, category, priority)
+    _compile(rule)
+    with con:
+        cur = con.execute(
+            "INSERT INTO category_rules(source, match, pattern, category, priority) VALUES(?,?,?,?,?)",
+            (source, match, pattern, category, priority),
+        )
+    return cur.lastrowid
+
+
+def set_override(con: Connection, source: str, full_path: str, category: Optional[str]):
+    """
+    Pin (or with category=None, unpin) the category of one account.
+    """
+    with con:
+        if category is None:
+            con.execute("DELETE FROM category_overrides WHERE source=? AND full_path=?", (source, full_path))
+        else:
+            con.execute(
+                """
+                INSERT INTO category_overrides(source, full_path, category) VALUES(?,?,?)
+                ON CONFLICT(source, full_path) DO UPDATE SET category=excluded.category
+                """,
+                (source, full_path, category),
+            )
+
+
+def recategorize(con: Connection, source: Optional[str] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Re-run the current rules over every stored account and apply changes in bulk:
+    one UPDATE for the changed accounts (facts reference them by id) and one for the
+    metrics of the months those accounts have facts in. No re-ingest needed.
+    """
+    cat = Categorizer.load(con)
+    q = "SELECT id, source, full_path, category FROM accounts"
+    params: List[Any] = []
+    if source:
+        q += " WHERE source=?"
+        params.append(source)
+    changes = []
+    for r in con.execute(q, params).fetchall():
+        default = structural_default(r[1], r[2]) or (r[3] if r[1] == "rootfi" else None)
+        new = cat.categorize(r[1], r[2], default)
+        if new != r[3]:
+            changes.append({"id": r[0], "source": r[1], "account": r[2], "from": r[3], "to": new})
+    out: Dict[str, Any] = {"changed_accounts": len(changes), "changes": changes[:100], "metrics_updated": 0, "dry_run": dry_run}
+    if dry_run or not changes:
+        return out
+    with con:
+        con.execute("CREATE TEMP TABLE IF NOT EXISTS recat_ids(id INTEGER PRIMARY KEY)")
+        con.execute("DELETE FROM recat_ids")
+        con.executemany("INSERT INTO recat_ids(id) VALUES(?)", [(c["id"],) for c in changes])
+        con.executemany("UPDATE accounts SET category=? WHERE id=?", [(c["to"], c["id"]) for c in changes])
+        cur = con.execute(
+            """
+            UPDATE metrics
+            SET revenue = sums.revenue, cogs = sums.cogs, expenses = sums.expenses,
+                gross_profit = sums.revenue - sums.cogs
+            FROM (
+                WITH touched AS (
+                    SELECT DISTINCT a.source, f.month_key
+                    FROM facts f JOIN accounts a ON a.id = f.account_id
+                    WHERE f.account_id IN (SELECT id FROM recat_ids)
+                )
+                SELECT a.source, f.month_key,
+                       SUM(CASE WHEN a.category='revenue' THEN f.amount ELSE 0 END) AS revenue,
+                       SUM(CASE WHEN a.category='cogs' THEN f.amount ELSE 0 END) AS cogs,
+                       SUM(CASE WHEN a.category='expense' THEN f.amount ELSE 0 END) AS expenses
+                FROM facts f JOIN accounts a ON a.id = f.account_id
+                JOIN touched t ON t.source = a.source AND t.month_key = f.month_key
+                GROUP BY a.source, f.month_key
+            ) AS sums
+            WHERE metrics.source = sums.source AND substr(metrics.period_end, 1, 7) = sums.month_key
+            """
+        )
+        out["metrics_updated"] = max(cur.rowcount, 0)
+        con.execute("DELETE FROM recat_ids")
+    invalidate()
+    out["reconciliation"] = reconcile(con)
+    return out
@@ -0,0 +1,103 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence
+from sqlite3 import Connection
+from app.obs.spans import span
+from app.repositories.metrics import GRAINS, period_series
+
+METRICS = ("revenue", "cogs", "gross_profit", "expenses", "net_profit")
+# Name of the period-over-period comparison for each grain
+POP_NAMES = {"month": "mom", "quarter": "qoq", "year": "yoy"}
+
+
+def period_label(grain: str, ordinal: int) -> str:
+    """
+    Display label for a period ordinal as produced by period_series.
+    """
+    if grain == "month":
+        return f"{ordinal // 12:04d}-{ordinal % 12 + 1:02d}"
+    if grain == "quarter":
+        return f"{ordinal // 4:04d}-Q{ordinal % 4 + 1}"
+    return f"{ordinal:04d}"
+
+
+def period_ordinal(grain: str, ym: str) -> int:
+    """
+    Ordinal of the period containing month 'YYYY-MM' at the given grain.
+    """
+    y, m = int(ym[:4]), int(ym[5:7])
+    if grain == "month":
+        return y * 12 + m - 1
+    if grain == "quarter":
+        return y * 4 + (m - 1) // 3
+    return y
+
+
+def pct_change(cur: Optional[float], prev: Optional[float]) -> Optional[float]:
+    """
+    Percentage change against the magnitude of the base; None when there is no base.
+    """
+    if cur is None or prev is None or prev == 0:
+        return None
+    return round((cur - prev) / abs(prev) * 100.0, 2)
+
+
+def _cents(x: Optional[float]) -> Optional[float]:
+    return None if x is None else round(x, 2)
+
+
+def _metric_block(row: Dict[str, Any], metric: str) -> Dict[str, Any]:
+    v, p, y = _cents(row[metric]), _cents(row[f"{metric}_prev"]), _cents(row[f"{metric}_yoy"])
+    return {
+        "value": v,
+        "prev": p,
+        "change": None if v is None or p is None else _cents(v - p),
+        "pct": pct_change(v, p),
+        "yoy_prev": y,
+        "yoy_change": None if v is None or y is None else _cents(v - y),
+        "yoy_pct": pct_change(v, y),
+        "ttm": _cents(row[f"{metric}_ttm"]),
+    }
+
+
+@span("service.compare")
+def compare(
+    con: Connection,
+    grain: str = "month",
+    metrics: Sequence[str] | None = None,
+    source: str | None = None,
+    month_from: str | None = None,
+    month_to: str | None = None,
+) -> Dict[str, Any]:
+    """
+    Period-over-period (MoM / QoQ / YoY), year-over-year and trailing-twelve-month figures for
+    every requested metric, per period of `grain`. Periods overlapping [month_from, month_to]
+    are returned; comparisons may reach outside the range (e.g. YoY for the first year shown).
+    `ttm` is the total of the trailing twelve months ending with the period; `ttm_months` says
+    how many of them have data (12 = complete). Amounts are rounded to cents.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"unknown grain {grain!r}; choose from {', '.join(GRAINS)}")
+    metrics = list(metrics or METRICS)
+    bad = [m for m in metrics if m not in METRICS]
+    if bad:
+        raise ValueError(f"unknown metric(s) {', '.join(bad)}; choose from {', '.join(METRICS)}")
+    lo = period_ordinal(grain, month_from) if month_from else None
+    hi = period_ordinal(grain, month_to) if month_to else None
+    rows: List[Dict[str, Any]] = []
+    for r in period_series(con, grain, source):
+        if (lo is not None and r["ord"] < lo) or (hi is not None and r["ord"] > hi):
+            continue
+        out = {
+            "period": period_label(grain, r["ord"]),
+            "first_month": r["first_month"],
+            "last_month": r["last_month"],
+            "months": r["months"],
+            "ttm_months": r["ttm_months"],
+        }
+        for m in metrics:
+            out[m] = _metric_block(r, m)
+        rows.append(out)
+    return {
+        "grain": grain, "pop": POP_NAMES[grain], "source": source, "metrics": metrics,
+        "from": month_from, "to": month_to, "rows": rows,
+    }
@@ -0,0 +1,225 @@
+from __future__ import annotations
+import csv, io, zlib
+from sqlite3 import Connection
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from app.utils.jsonfast import dumps
+
+FORMATS = ("csv", "ndjson", "arrow")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class Dataset(NamedTuple):
+    """
+    An exportable table: FROM clause, keyset column, output columns as (name, SQL
+    expression, type) with type one of int | float | str, and the SQL of each filter it
+    supports. `years` is the sortable date column the year range applies to.
+    """
+    from_sql: str
+    key: str
+    columns: Tuple[Tuple[str, str, str], ...]
+    years: str
+    filters: Dict[str, str]
+
+
+DATASETS: Dict[str, Dataset] = {
+    "facts": Dataset(
+        "facts f JOIN accounts a ON a.id = f.account_id",
+        "f.id",
+        (("id", "f.id", "int"), ("period_start", "f.period_start", "str"), ("period_end", "f.period_end", "str"),
+         ("month_key", "f.month_key", "str"), ("source", "a.source", "str"), ("account", "a.full_path", "str"),
+         ("category", "a.category", "str"), ("kind", "f.kind", "str"), ("amount", "f.amount", "float")),
+        "f.month_key",
+        {"source": "a.source = ?", "category": "a.category = ?",
+         "account": "(a.full_path = ? COLLATE NOCASE OR a.leaf_name = ? COLLATE NOCASE)"},
+    ),
+    "metrics": Dataset(
+        "metrics m",
+        "m.id",
+        (("id", "m.id", "int"), ("period_end", "m.period_end", "str"), ("source", "m.source", "str"),
+         ("revenue", "m.revenue", "float"), ("cogs", "m.cogs", "float"), ("gross_profit", "m.gross_profit", "float"),
+         ("expenses", "m.expenses", "float"), ("net_profit", "m.net_profit", "float")),
+        "m.period_end",
+        {"source": "m.source = ?"},
+    ),
+    "ai_traces": Dataset(
+        "ai_traces t",
+        "t.id",
+        (("id", "t.id", "int"), ("ts", "t.ts", "str"), ("conversation_id", "t.conversation_id", "str"),
+         ("question", "t.question", "str"), ("answer", "t.answer", "str"), ("model", "t.model", "str"),
+         ("tokens_prompt", "t.tokens_prompt", "int"), ("tokens_completion", "t.tokens_completion", "int"),
+         ("latency_ms", "t.latency_ms", "float"), ("tool_calls", "t.tool_calls", "str"),
+         ("request_id", "t.request_id", "str")),
+        "t.ts",
+        {},
+    ),
+}
+
+
+def export_query(
+    dataset: str,
+    filters: Dict[str, Optional[str]],
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    SQL and parameters of one keyset batch of `dataset`; the caller appends the last key
+    seen and the batch size. Raises ValueError on an unknown dataset or unsupported filter.
+    """
+    ds = DATASETS.get(dataset)
+    if ds is None:
+        raise ValueError(f"unknown dataset {dataset!r}; expected one of {', '.join(DATASETS)}")
+    where: List[str] = []
+    params: List[Any] = []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        sql = ds.filters.get(name)
+        if sql is None:
+            raise ValueError(f"{dataset} cannot be filtered by {name}")
+        where.append(sql)
+        params.extend([value] * sql.count("?"))
+    # Year bounds as string ranges, so the date column's index still applies
+    if year_from is not None:
+        where.append(f"{ds.years} >= ?")
+        params.append(f"{year_from:04d}")
+    if year_to is not None:
+        where.append(f"{ds.years} < ?")
+        params.append(f"{year_to + 1:04d}")
+    where.append(f"{ds.key} > ?")
+    cols = ", ".join(expr for _, expr, _ in ds.columns)
+    return f"SELECT {cols} FROM {ds.from_sql} WHERE {' AND '.join(where)} ORDER BY {ds.key} LIMIT ?", params
+
+
+def iter_batches(con: Connection, sql: str, params: List[Any], batch_size: int) -> Iterator[List[tuple]]:
+    """
+    Yield rows of an export_query in batches of `batch_size`, as plain tuples. Each batch is
+    its own short query resuming after the last key (the first column), so no statement
+    stays open on the shared connection between batches and memory stays at one batch.
+    """
+    cur = con.cursor()
+    cur.row_factory = None
+    last = -1
+    while True:
+        rows = cur.execute(sql, [*params, last, batch_size]).fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def encode_csv(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """
+    CSV with a header row, one chunk per batch.
+    """
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(columns)
+    yield buf.getvalue().encode("utf-8")
+    for rows in batches:
+        buf.seek(0)
+        buf.truncate()
+        w.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def encode_ndjson(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """
+    One JSON object per line, one chunk per batch.
+    """
+    for rows in batches:
+        yield b"".join(dumps(dict(zip(columns, r))) + b"\n" for r in rows)
+
+
+class _Chunks:
+    """
+    Write-only file object collecting what pyarrow writes until it is taken.
+    """
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        out, self.parts = b"".join(self.parts), []
+        return out
+
+
+def encode_arrow(ds: Dataset, batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """
+    Arrow IPC stream, one record batch per batch. Requires pyarrow.
+    """
+    import pyarrow as pa
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    schema = pa.schema([(name, types[t]) for name, _, t in ds.columns])
+    sink = _Chunks()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in batches:
+            cols = list(zip(*rows))
+            writer.write_batch(pa.record_batch([pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+def arrow_available() -> bool:
+    """
+    Whether the optional pyarrow dependency is installed.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def gzip_chunks(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compress a chunk stream into one gzip member, flushing per chunk so data keeps flowing.
+    """
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def export_stream(
+    con: Connection,
+    dataset: str,
+    fmt: str,
+    filters: Dict[str, Optional[str]],
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    batch_size: int = 5000,
+    gzip: bool = False,
+) -> Iterator[bytes]:
+    """
+    Stream `dataset` as `fmt` (csv | ndjson | arrow) in constant memory. Arguments are
+    validated before the first chunk, so bad input raises ValueError up front.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    sql, params = export_query(dataset, filters, year_from, year_to)
+    ds = DATASETS[dataset]
+    columns = [name for name, _, _ in ds.columns]
+    batches = iter_batches(con, sql, params, batch_size)
+    if fmt == "csv":
+        chunks = encode_csv(columns, batches)
+    elif fmt == "ndjson":
+        chunks = encode_ndjson(columns, batches)
+    else:
+        chunks = encode_arrow(ds, batches)
+    return gzip_chunks(chunks) if gzip else chunks
@@ -1,28 +1,49 @@
 from __future__ import annotations
 import json, os
 from sqlite3 import Connection
+from typing import Iterable, Optional
 from app.parsers.quickbooks import ingest_quickbooks
 from app.parsers.rootfi import ingest_rootfi
+from app.repositories.period_index import warm as warm_period_index
+from app.services.prewarm import schedule as schedule_warm
+
+
+def after_ingest(con: Connection, periods: Iterable[str]):
+    """
+    Post-ingest hook of every ingest path: rebuild `con`'s period index before returning, so
+    range queries stay O(1), and warm the result caches for `periods` in the background.
+    """
+    warm_period_index(con)
+    schedule_warm(periods)
 
 
 def ingest_quickbooks_payload(con: Connection, payload: dict):
     """
     Ingests a QuickBooks payload using the parser and returns the result.
+    The period index is rebuilt before returning, so range queries stay O(1); the result
+    caches are warmed for the touched periods in the background.
     """
-    return ingest_quickbooks(con, payload)
+    out = ingest_quickbooks(con, payload)
+    after_ingest(con, out["periods"])
+    return out
 
 
-def ingest_rootfi_payload(con: Connection, payload: dict):
+def ingest_rootfi_payload(con: Connection, payload: dict, full: bool = False):
     """
-    Ingests a Rootfi payload using the parser and returns the result.
+    Ingests a Rootfi payload incrementally (see ingest_rootfi) and returns the result.
+    The period index is rebuilt before returning, so range queries stay O(1); the result
+    caches are warmed for the touched periods in the background.
     """
-    return ingest_rootfi(con, payload)
+    out = ingest_rootfi(con, payload, full)
+    after_ingest(con, out["periods"])
+    return out
 
 
-def auto_ingest(con: Connection, qb_file: str, rootfi_file: str):
+def auto_ingest(con: Connection, qb_file: str, rootfi_file: str, serve_con: Optional[Connection] = None):
     """
-    Automatically ingests data from QuickBooks and Rootfi files if they exist.
-    Returns a dictionary with the results for each source.
+    Automatically ingests data from QuickBooks and Rootfi files if they exist, then runs the
+    post-ingest hook on `serve_con`, the connection requests read through (default `con`):
+    the period index is kept per connection. Returns a dictionary with the results for each source.
     """
     out = {}
     if os.path.exists(qb_file):
@@ -31,4 +52,5 @@ def auto_ingest(con: Connection, qb_file: str, rootfi_file: str):
     if os.path.exists(rootfi_file):
         with open(rootfi_file, 'r') as f:
             out['rootfi'] = ingest_rootfi(con, json.load(f))
+    after_ingest(serve_con or con, [p for r in out.values() for p in r.get('periods') or []])
     return out
\ No newline at end of file
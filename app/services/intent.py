@@ -0,0 +1,189 @@
+from __future__ import annotations
+import json, math, os, random, re, threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Bundled labelled questions ({"text", "intent"} per line); "other" means "needs the LLM"
+DATA_PATH = os.path.join(os.path.dirname(__file__), "intent_questions.jsonl")
+NGRAM_RANGE = (2, 4)
+
+
+def _normalize(text: str) -> str:
+    """
+    Lowercase, map digits to 0 (so 2023 and 2024 share features) and keep words only.
+    """
+    return " ".join(re.sub(r"[^a-z0 ]+", " ", re.sub(r"\d", "0", text.lower())).split())
+
+
+def char_ngrams(text: str) -> Counter:
+    """
+    Character n-gram counts within word boundaries (each word padded with spaces).
+    """
+    grams: Counter = Counter()
+    lo, hi = NGRAM_RANGE
+    for word in _normalize(text).split():
+        w = f" {word} "
+        for n in range(lo, hi + 1):
+            for i in range(len(w) - n + 1):
+                grams[w[i:i + n]] += 1
+    return grams
+
+
+def _softmax(scores: List[float]) -> List[float]:
+    top = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+class IntentClassifier:
+    """
+    TF-IDF over character n-grams feeding a multinomial logistic regression, in plain Python.
+    Weights are kept per n-gram, so scoring a question touches only its own n-grams
+    (a few hundred dict lookups, well under a millisecond).
+    """
+
+    def __init__(self, labels: List[str], idf: Dict[str, float], weights: Dict[str, List[float]], bias: List[float]):
+        self.labels = labels
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def fit(cls, texts: List[str], labels: List[str], epochs: int = 15, lr: float = 1.0,
+            l2: float = 1e-4, seed: int = 0) -> "IntentClassifier":
+        """
+        Train with plain SGD on the softmax loss; deterministic for a given seed.
+        """
+        classes = sorted(set(labels))
+        grams = [char_ngrams(t) for t in texts]
+        df: Counter = Counter()
+        for g in grams:
+            df.update(g.keys())
+        n = len(texts)
+        idf = {g: math.log((1 + n) / (1 + c)) + 1.0 for g, c in df.items()}
+        model = cls(classes, idf, {g: [0.0] * len(classes) for g in idf}, [0.0] * len(classes))
+        data = [(model.vectorize_counts(g), classes.index(y)) for g, y in zip(grams, labels)]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1.0 + epoch * 0.1)
+            for vec, y in data:
+                p = model._proba(vec)
+                p[y] -= 1.0
+                for g, v in vec:
+                    w = model.weights[g]
+                    for k, gk in enumerate(p):
+                        w[k] -= step * gk * v
+                for k, gk in enumerate(p):
+                    model.bias[k] -= step * gk
+            decay = 1.0 - step * l2
+            for w in model.weights.values():
+                for k in range(len(w)):
+                    w[k] *= decay
+        return model
+
+    def vectorize_counts(self, grams: Counter) -> List[Tuple[str, float]]:
+        """
+        Sublinear TF-IDF, L2-normalized; n-grams never seen in training are dropped.
+        """
+        vec = [(g, (1.0 + math.log(c)) * self.idf[g]) for g, c in grams.items() if g in self.idf]
+        norm = math.sqrt(sum(v * v for _, v in vec)) or 1.0
+        return [(g, v / norm) for g, v in vec]
+
+    def _proba(self, vec: Iterable[Tuple[str, float]]) -> List[float]:
+        scores = list(self.bias)
+        for g, v in vec:
+            w = self.weights.get(g)
+            if w is not None:
+                for k, wk in enumerate(w):
+                    scores[k] += v * wk
+        return _softmax(scores)
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        return dict(zip(self.labels, self._proba(self.vectorize_counts(char_ngrams(text)))))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Most likely intent and its probability.
+        """
+        p = self._proba(self.vectorize_counts(char_ngrams(text)))
+        k = max(range(len(p)), key=p.__getitem__)
+        return self.labels[k], p[k]
+
+
+def load_examples(path: str = DATA_PATH) -> Tuple[List[str], List[str]]:
+    texts: List[str] = []
+    labels: List[str] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                texts.append(row["text"])
+                labels.append(row["intent"])
+    return texts, labels
+
+
+_MODEL: Optional[IntentClassifier] = None
+_MODEL_LOCK = threading.Lock()
+
+
+def classifier() -> IntentClassifier:
+    """
+    Process-wide classifier, trained on the bundled questions on first use (a fraction of a
+    second; startup warm-up pays it before the first request).
+    """
+    global _MODEL
+    if _MODEL is None:
+        with _MODEL_LOCK:
+            if _MODEL is None:
+                _MODEL = IntentClassifier.fit(*load_examples())
+    return _MODEL
+
+
+# ---- slot extraction ----------------------------------------------------------------------
+
+ORDINALS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4, "last": 4}
+_ORD = r"(first|second|third|fourth|last|1st|2nd|3rd|4th)"
+QUARTER_RE = re.compile(
+    rf"\bq([1-4])\b|\bquarter\s*([1-4])\b|\b{_ORD}\s+(?:and\s+(?:the\s+)?{_ORD}\s+)?quarters?\b"
+)
+HALF_RE = re.compile(r"\bh([12])\b|\b(first|second|1st|2nd)\s+half\b")
+YEARS_RE = re.compile(r"\b((?:19|20)\d{2})\b")
+GRAIN_RES = (
+    ("month", re.compile(r"\b(month(ly)?|mom)\b")),
+    ("quarter", re.compile(r"\b(quarter(ly)?|qoq)\b")),
+    ("year", re.compile(r"\b(year(ly)?|annual(ly)?|yoy)\b")),
+)
+
+
+class Slots(NamedTuple):
+    """
+    Periods and grain mentioned in a question, in order of appearance.
+    """
+    years: List[int]
+    quarters: List[int]
+    half: Optional[int]
+    grain: Optional[str]
+
+
+def extract_slots(qn: str) -> Slots:
+    """
+    Pull years, quarters ("Q1", "quarter 2", "the first and second quarter"), a half
+    ("H1", "second half") and a comparison grain out of a lowercased question.
+    """
+    quarters: List[int] = []
+    for m in QUARTER_RE.finditer(qn):
+        if m.group(1) or m.group(2):
+            quarters.append(int(m.group(1) or m.group(2)))
+        else:
+            quarters.extend(ORDINALS[o] for o in (m.group(3), m.group(4)) if o)
+    hm = HALF_RE.search(qn)
+    half = (int(hm.group(1)) if hm.group(1) else 1 if hm.group(2) in ("first", "1st") else 2) if hm else None
+    grains = [(m.start(), g) for g, rx in GRAIN_RES for m in [rx.search(qn)] if m]
+    return Slots(
+        years=[int(y) for y in YEARS_RE.findall(qn)],
+        quarters=quarters,
+        half=half,
+        grain=min(grains)[1] if grains else None,
+    )
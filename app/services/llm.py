@@ -0,0 +1,58 @@
+from __future__ import annotations
+import threading, time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from app.config import settings
+
+
+class StubLLM:
+    """
+    Deterministic stand-in for the OpenAI client (`client.chat.completions.create`).
+    Answers are derived from the prompt only, token counts from word counts, and each
+    call sleeps LLM_STUB_LATENCY_MS to model network/inference time.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict[str, Any]], **_: Any):
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+        question = messages[-1]["content"] if messages else ""
+        answer = f"[stub:{model}] {question.strip()[:120]}"
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=answer))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(answer.split())),
+        )
+
+
+def make_client(api_key: str | None):
+    """
+    Return the chat client selected by LLM_BACKEND (openai | stub).
+    The openai SDK (~1s to import) is only imported here, never at app import.
+    """
+    if settings.llm_backend == "stub":
+        return StubLLM(settings.llm_stub_latency_ms)
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+
+_CLIENTS: Dict[str | None, Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(api_key: str | None):
+    """
+    Process-wide client per API key, created on first use (the SDK client keeps a
+    connection pool, so it is reused across requests rather than rebuilt per call).
+    """
+    client = _CLIENTS.get(api_key)
+    if client is None:
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.get(api_key)
+            if client is None:
+                client = _CLIENTS[api_key] = make_client(api_key)
+    return client
@@ -0,0 +1,131 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from sqlite3 import Connection
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.obs.traces import LATENCY_BUCKETS_MS, rollup_groups
+from app.services.nlq import TOOLBOX_DOC
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse "model:prompt_usd:completion_usd,..." (USD per 1M tokens) into a lookup.
+    """
+    out: Dict[str, Tuple[float, float]] = {}
+    for part in (spec or "").split(","):
+        bits = part.strip().split(":")
+        if len(bits) != 3:
+            continue
+        try:
+            out[bits[0]] = (float(bits[1]), float(bits[2]))
+        except ValueError:
+            continue
+    return out
+
+
+def _price_for(model: Optional[str], prices: Dict[str, Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """
+    Longest-prefix price match, so 'gpt-4o-mini-2024-07-18' bills as 'gpt-4o-mini'.
+    """
+    if not model:
+        return None
+    best = None
+    for name in prices:
+        if model.startswith(name) and (best is None or len(name) > len(best)):
+            best = name
+    return prices[best] if best else None
+
+
+def hist_percentile(hist: List[int], q: float, max_ms: Optional[float]) -> Optional[float]:
+    """
+    Estimate the q-quantile (0..1) from bucket counts, interpolating linearly inside a bucket.
+    The open-ended last bucket is capped by the observed max.
+    """
+    total = sum(hist)
+    if total == 0:
+        return None
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(hist):
+        if n and seen + n >= rank:
+            lo = LATENCY_BUCKETS_MS[i - 1] if i else 0.0
+            hi = LATENCY_BUCKETS_MS[i]
+            if hi == float("inf") or (max_ms is not None and hi > max_ms):
+                hi = max(lo, max_ms or lo)
+            return round(lo + (hi - lo) * ((rank - seen) / n), 2)
+        seen += n
+    return max_ms
+
+
+def _summarize(g: Dict[str, Any], prices: Dict[str, Tuple[float, float]]) -> Dict[str, Any]:
+    """
+    Turn one summed rollup group into the public stats shape.
+    """
+    calls = g["calls"] or 0
+    hist = g.pop("hist")
+    lat_sum = g.pop("latency_ms_sum") or 0.0
+    lat_max = g.pop("latency_ms_max")
+    tp, tc = g.get("tokens_prompt") or 0, g.get("tokens_completion") or 0
+    price = _price_for(g.get("model"), prices)
+    out = dict(g)
+    if "model" in out:
+        out["model"] = out["model"] or None
+    out.update({
+        "error_rate": round((g["errors"] or 0) / calls, 4) if calls else 0.0,
+        "latency_ms": {
+            "avg": round(lat_sum / calls, 2) if calls else None,
+            "p50": hist_percentile(hist, 0.50, lat_max),
+            "p95": hist_percentile(hist, 0.95, lat_max),
+            "p99": hist_percentile(hist, 0.99, lat_max),
+            "max": round(lat_max, 2) if lat_max is not None else None,
+        },
+        # Completion tokens per second of end-to-end latency
+        "tokens_per_s": round(tc / (lat_sum / 1000.0), 2) if lat_sum and tc else None,
+        "cost_usd": round((tp * price[0] + tc * price[1]) / 1e6, 6) if price else None,
+    })
+    return out
+
+
+def llm_stats(
+    con: Connection,
+    hours: int = 24,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    group_by: str = "model,intent",
+) -> Dict[str, Any]:
+    """
+    Latency percentiles, tokens/s, cost and error rates from the hourly rollups.
+    Cost depends only on the number of hour buckets in the window, never on raw trace volume.
+    """
+    if not since:
+        since = (datetime.utcnow() - timedelta(hours=hours)).strftime("%Y-%m-%dT%H")
+    dims = tuple(d.strip() for d in group_by.split(",") if d.strip())
+    prices = parse_prices(settings.llm_prices)
+    groups = [_summarize(g, prices) for g in rollup_groups(con, since, until, dims)]
+    totals = rollup_groups(con, since, until, ())
+    costs = [g["cost_usd"] for g in groups if g.get("cost_usd") is not None]
+    total = _summarize(totals[0], prices) if totals else None
+    if total is not None:
+        # Per-model prices don't apply to a cross-model total; sum the group costs instead
+        total["cost_usd"] = round(sum(costs), 6) if costs and "model" in dims else None
+    return {
+        "window": {"since": since[:13], "until": until[:13] if until else None},
+        "group_by": list(dims),
+        "groups": groups,
+        "total": total,
+        "routing": routing_stats(rollup_groups(con, since, until, ("intent",))),
+    }
+
+
+def routing_stats(by_intent: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Share of NLQ questions answered by a rule-based tool (regex or classifier) or from the
+    NLQ cache rather than by calling the LLM.
+    """
+    questions = sum(g["calls"] for g in by_intent)
+    rule_based = sum(g["calls"] for g in by_intent if g["intent"] in TOOLBOX_DOC or g["intent"] == "cache_hit")
+    return {
+        "questions": questions,
+        "rule_based": rule_based,
+        "llm_avoidance_rate": round(rule_based / questions, 4) if questions else None,
+    }
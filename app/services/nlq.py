@@ -3,11 +3,18 @@ import os, re, time, random
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 from sqlite3 import Connection
-from openai import OpenAI
 
+from app.config import settings
 from app.obs.traces import trace_log, TraceIn
-from app.obs.metrics import AI_TOKENS
+from app.obs.metrics import registry as prom_registry
+from app.obs.spans import span, current_request_id
+from app.services import admission
+from app.services.cache import NLQ_CACHE, generation as cache_generation
+from app.services.intent import classifier, extract_slots
+from app.services.llm import get_client
 from app.repositories.metrics import sum_between, trend
+from app.services.compare import compare
+from app.services.reconciliation import flagged_months
 from app.repositories.facts import expenses_increase_top
 from app.utils.normalization import parse_quarter, NUM_TO_MONTH
 
@@ -16,9 +23,38 @@ TOOLBOX_DOC = {
     "get_total_profit": "Return net_profit if available else gross_profit for a time window.",
     "revenue_trend": "Return revenue by month for a year.",
     "top_expense_increase": "Return expense accounts with highest increase in the year.",
-    "compare_quarters": "Compare metrics between two quarters in a year.",
+    "compare_quarters": "Compare metrics between two quarters (optionally in different years).",
+    "period_over_period": "MoM / QoQ / YoY change of one metric, per period.",
+    "ttm": "Trailing-twelve-month total of one metric and its change over a year.",
 }
 
+# Metric phrases in questions, most specific first
+METRIC_PHRASES = (
+    ("net profit", "net_profit"), ("net income", "net_profit"), ("gross profit", "gross_profit"), ("gross margin", "gross_profit"),
+    ("cost of goods sold", "cogs"), ("cogs", "cogs"), ("expense", "expenses"), ("revenue", "revenue"),
+    ("sales", "revenue"), ("income", "revenue"), ("profit", "net_profit"),
+)
+# (question pattern, grain, display name, months in a full period)
+POP_GRAINS = (
+    (r"\b(mom|month[- ]over[- ]month)\b", "month", "MoM", 1),
+    (r"\b(qoq|quarter[- ]over[- ]quarter)\b", "quarter", "QoQ", 3),
+    (r"\b(yoy|year[- ]over[- ]year)\b", "year", "YoY", 12),
+)
+POP_NAMES = {grain: (name, full) for _, grain, name, full in POP_GRAINS}
+TTM_RE = re.compile(r"\b(ttm|ltm|trailing (?:twelve|12) months?|last (?:twelve|12) months)\b")
+# Completion cap of every LLM call (also what the warm-up budgets per call)
+LLM_MAX_TOKENS = 300
+YEAR_RE = re.compile(r"\b((?:19|20)\d{2})\b")
+
+
+def _metric_in(qn: str, default: str = "revenue") -> str:
+    for phrase, metric in METRIC_PHRASES:
+        if phrase in qn:
+            return metric
+    return default
+
+
+@span("nlq.ensure_conversation")
 def _ensure_conversation(con: Connection, conv_id: Optional[str]) -> str:
     """
     Ensure a conversation exists in the DB, or create a new one if not provided.
@@ -30,6 +66,7 @@ def _ensure_conversation(con: Connection, conv_id: Optional[str]) -> str:
     return conv
 
 
+@span("nlq.add_message")
 def _add_message(con: Connection, conv_id: str, role: str, content: str):
     """
     Add a message to the conversation in the DB.
@@ -38,174 +75,384 @@ def _add_message(con: Connection, conv_id: str, role: str, content: str):
         con.execute("INSERT INTO messages(conv_id, role, content, ts) VALUES(?,?,?,?)", (conv_id, role, content, datetime.utcnow().isoformat()))
 
 
-def _handle_rule_based(con: Connection, q: str) -> Tuple[Optional[str], Dict[str, Any], List[Dict[str, Any]]]:
+# Each tool answers one intent from already-extracted slots: (answer, data, trace args)
+ToolResult = Tuple[str, Dict[str, Any], Dict[str, Any]]
+
+
+def _tool_total_profit(con: Connection, label: str, year: int, a: int, b: int) -> ToolResult:
     """
-    Handle simple NLQ queries using rule-based logic for speed and determinism.
-    Returns (answer, data, trace) if matched, else (None, {}, trace).
+    Profit over months a..b of a year: net from Rootfi if available, otherwise QuickBooks gross.
     """
-    trace: List[Dict[str, Any]] = []
-    qn = q.lower().strip()
+    sums_rootfi = sum_between(con, a, b, year, source='rootfi')
+    sums_qb = sum_between(con, a, b, year, source='quickbooks')
+    profit = sums_rootfi['net_profit'] or sums_qb['gross_profit']
+    answer = f"{label} {year} profit was {profit:,.2f} (net from Rootfi if available, otherwise gross)."
+    # Say so when the two sources disagree on the like-for-like figure for these months
+    variances = flagged_months(con, [f"{year:04d}-{mo:02d}" for mo in range(a, b + 1)], "gross_profit")
+    if variances:
+        answer += (f" Note: QuickBooks and Rootfi disagree on gross profit in {len(variances)} of these months"
+                   " (see /api/v1/reconcile).")
+    data = {"rootfi": sums_rootfi, "quickbooks": sums_qb, "reconciliation": variances}
+    args = {"quarter": label, "year": year} if label.startswith("Q") else {"period": label, "year": year}
+    return answer, data, args
+
+
+def _tool_revenue_trend(con: Connection, year: int) -> ToolResult:
+    pts = trend(con, 'revenue', year, None)['points']
+    total = sum((p['value'] or 0.0) for p in pts)
+    by_month: Dict[str, float] = {}
+    for p in pts:
+        mnum = int(p['period_end'][5:7])
+        key = NUM_TO_MONTH.get(mnum, '?')
+        by_month[key] = by_month.get(key, 0.0) + (p['value'] or 0.0)
+    answer = f"Revenue trend for {year}: total {total:,.2f}."
+    if by_month:
+        top = sorted(by_month.items(), key=lambda x: x[1], reverse=True)[:3]
+        answer += " Top months: " + ", ".join(f"{k} ({v:,.0f})" for k, v in top)
+    return answer, {"points": pts, "by_month": by_month}, {"year": year}
+
 
+def _tool_top_expense_increase(con: Connection, year: int) -> ToolResult:
+    detail = expenses_increase_top(con, year, None)
+    top = detail.get('top') or []
+    if top:
+        a = top[0]
+        answer = f"In {year}, '{a['account']}' had the highest increase: +{a['increase']:,.2f}."
+    else:
+        answer = f"No expense categories found for {year}."
+    return answer, detail, {"year": year}
+
+
+def _tool_compare_quarters(con: Connection, q1: str, y1: int, q2: str, y2: int, year: int) -> ToolResult:
+    a1, b1 = parse_quarter(q1)
+    a2, b2 = parse_quarter(q2)
+    # Two O(1) lookups in the prefix-sum period index, across years if needed
+    s1 = sum_between(con, a1, b1, y1, None)
+    s2 = sum_between(con, a2, b2, y2, None)
+    label = f"{year}" if y1 == y2 else f"({y1} vs {y2})"
+    answer = (
+        f"{q1} vs {q2} {label}: Revenue {s1['revenue']:,.0f} → {s2['revenue']:,.0f}, "
+        f"Gross Profit {s1['gross_profit']:,.0f} → {s2['gross_profit']:,.0f}, "
+        f"Expenses {s1['expenses']:,.0f} → {s2['expenses']:,.0f}."
+    )
+    return (answer, {"q1": s1, "q2": s2, "year": year, "year1": y1, "year2": y2},
+            {"q1": q1, "q2": q2, "year": year, "year1": y1, "year2": y2})
+
+
+def _tool_period_over_period(con: Connection, grain: str, metric: str, year: Optional[int]) -> ToolResult:
+    pop_name, full = POP_NAMES[grain]
+    out = compare(con, grain, [metric], None,
+                  f"{year:04d}-01" if year else None, f"{year:04d}-12" if year else None)
+    rows = [r for r in out["rows"] if r[metric]["value"] is not None]
+    if year is None:
+        rows = rows[-(12 if grain == "month" else 4 if grain == "quarter" else 3):]
+    name = metric.replace("_", " ")
+    if not rows:
+        answer = f"No {name} data found{f' for {year}' if year else ''}."
+    else:
+        parts = [
+            f"{r['period']} {r[metric]['value']:,.0f}"
+            + (f" ({r[metric]['pct']:+.1f}%)" if r[metric]["pct"] is not None else "")
+            + (f" [{r['months']} of {full} months]" if r["months"] < full else "")
+            for r in rows
+        ]
+        answer = f"{name.capitalize()} {pop_name}{f' {year}' if year else ''}: " + ", ".join(parts) + "."
+    return answer, {"grain": grain, "metric": metric, "rows": rows}, {"grain": grain, "metric": metric, "year": year}
+
+
+def _tool_ttm(con: Connection, metric: str, year: Optional[int]) -> ToolResult:
+    rows = compare(con, "month", [metric], None, None, f"{year:04d}-12" if year else None)["rows"]
+    rows = [r for r in rows if r[metric]["value"] is not None]
+    name = metric.replace("_", " ")
+    if not rows:
+        answer = f"No {name} data found{f' up to {year}' if year else ''}."
+        data: Dict[str, Any] = {"metric": metric, "ttm": None}
+    else:
+        last = rows[-1]
+        ttm = last[metric]["ttm"]
+        year_ago = next((r for r in rows if r["period"] == f"{int(last['period'][:4]) - 1:04d}{last['period'][4:]}"), None)
+        prev_ttm = year_ago[metric]["ttm"] if year_ago else None
+        answer = f"TTM {name} to {last['period']}: {ttm:,.2f}"
+        if last["ttm_months"] < 12:
+            answer += f" (only {last['ttm_months']} months of data)"
+        if prev_ttm:
+            answer += f", vs {prev_ttm:,.2f} a year earlier ({(ttm - prev_ttm) / abs(prev_ttm) * 100.0:+.1f}%"
+            answer += f"; that window has {year_ago['ttm_months']} months of data)" if year_ago["ttm_months"] < 12 else ")"
+        answer += "."
+        data = {"metric": metric, "period": last["period"], "ttm": ttm, "ttm_months": last["ttm_months"], "ttm_year_ago": prev_ttm}
+    return answer, data, {"metric": metric, "year": year}
+
+
+def _regex_route(con: Connection, qn: str) -> Optional[Tuple[str, ToolResult]]:
+    """
+    The hand-written patterns: (tool name, result) for the first one that matches.
+    """
     # Rule: total profit in a quarter
     m = re.search(r"total (profit|net profit|gross profit) in (q[1-4])(?:\s*(\d{4}))?", qn)
     if m:
-        kind, qtr, year_s = m.group(1), m.group(2).upper(), m.group(3)
-        year = int(year_s or datetime.utcnow().year)
+        qtr, year_s = m.group(2).upper(), m.group(3)
         a, b = parse_quarter(qtr)
-        sums_rootfi = sum_between(con, a, b, year, source='rootfi')
-        sums_qb = sum_between(con, a, b, year, source='quickbooks')
-        profit = sums_rootfi['net_profit'] or sums_qb['gross_profit']
-        answer = f"{qtr} {year} profit was {profit:,.2f} (net from Rootfi if available, otherwise gross)."
-        data = {"rootfi": sums_rootfi, "quickbooks": sums_qb}
-        trace.append({"tool": "get_total_profit", "args": {"quarter": qtr, "year": year}})
-        return answer, data, trace
+        return "get_total_profit", _tool_total_profit(con, qtr, int(year_s or datetime.utcnow().year), a, b)
 
     # Rule: revenue trend for a year
     m = re.search(r"revenue (trend|trends).*(\d{4})", qn)
     if m:
-        year = int(m.group(2))
-        pts = trend(con, 'revenue', year, None)['points']
-        total = sum((p['value'] or 0.0) for p in pts)
-        by_month: Dict[str, float] = {}
-        for p in pts:
-            mnum = int(p['period_end'][5:7])
-            key = NUM_TO_MONTH.get(mnum, '?')
-            by_month[key] = by_month.get(key, 0.0) + (p['value'] or 0.0)
-        answer = f"Revenue trend for {year}: total {total:,.2f}."
-        if by_month:
-            top = sorted(by_month.items(), key=lambda x: x[1], reverse=True)[:3]
-            answer += " Top months: " + ", ".join(f"{k} ({v:,.0f})" for k, v in top)
-        data = {"points": pts, "by_month": by_month}
-        trace.append({"tool": "revenue_trend", "args": {"year": year}})
-        return answer, data, trace
+        return "revenue_trend", _tool_revenue_trend(con, int(m.group(2)))
 
     # Rule: top expense increase in a year
     m = re.search(r"which (expense|expenses).*highest increase.*(\d{4})", qn)
     if m:
-        year = int(m.group(2))
-        detail = expenses_increase_top(con, year, None)
-        top = detail.get('top') or []
-        if top:
-            a = top[0]
-            answer = f"In {year}, '{a['account']}' had the highest increase: +{a['increase']:,.2f}."
-        else:
-            answer = f"No expense categories found for {year}."
-        trace.append({"tool": "top_expense_increase", "args": {"year": year}})
-        return answer, detail, trace
-
-    # Rule: compare two quarters
-    m = re.search(r"compare\s*(q[1-4])\s*and\s*(q[1-4])(?:\s*(\d{4}))?", qn)
+        return "top_expense_increase", _tool_top_expense_increase(con, int(m.group(2)))
+
+    # Rule: compare two quarters, e.g. "compare Q1 and Q2 2024" or "compare Q4 2023 with Q1 2024"
+    m = re.search(r"compare\s*(q[1-4])(?:\s*((?:19|20)\d{2}))?\s*(?:and|vs\.?|versus|with|to)\s*(q[1-4])(?:\s*((?:19|20)\d{2}))?", qn)
     if m:
-        q1, q2, year_s = m.group(1).upper(), m.group(2).upper(), m.group(3)
-        year = int(year_s or datetime.utcnow().year)
-        a1, b1 = parse_quarter(q1)
-        a2, b2 = parse_quarter(q2)
-        s1 = sum_between(con, a1, b1, year, None)
-        s2 = sum_between(con, a2, b2, year, None)
-        answer = (
-            f"{q1} vs {q2} {year}: Revenue {s1['revenue']:,.0f} → {s2['revenue']:,.0f}, "
-            f"Gross Profit {s1['gross_profit']:,.0f} → {s2['gross_profit']:,.0f}, "
-            f"Expenses {s1['expenses']:,.0f} → {s2['expenses']:,.0f}."
-        )
-        trace.append({"tool": "compare_quarters", "args": {"q1": q1, "q2": q2, "year": year}})
-        return answer, {"q1": s1, "q2": s2, "year": year}, trace
+        q1, y1_s, q2, y2_s = m.group(1).upper(), m.group(2), m.group(3).upper(), m.group(4)
+        tail = YEAR_RE.search(qn, m.end())
+        year = int(y2_s or y1_s or (tail.group(1) if tail else datetime.utcnow().year))
+        return "compare_quarters", _tool_compare_quarters(con, q1, int(y1_s or year), q2, int(y2_s or year), year)
+
+    # Rule: period-over-period change of a metric, e.g. "revenue QoQ 2024", "month over month expenses"
+    for pattern, grain, _, _ in POP_GRAINS:
+        if re.search(pattern, qn):
+            ym = YEAR_RE.search(qn)
+            return "period_over_period", _tool_period_over_period(con, grain, _metric_in(qn), int(ym.group(1)) if ym else None)
+
+    # Rule: trailing twelve months of a metric, e.g. "TTM revenue", "trailing twelve months expenses to 2024"
+    if TTM_RE.search(qn):
+        ym = YEAR_RE.search(qn)
+        return "ttm", _tool_ttm(con, _metric_in(qn), int(ym.group(1)) if ym else None)
+    return None
+
+
+def _slot_route(con: Connection, intent: str, qn: str) -> Optional[ToolResult]:
+    """
+    Run the tool for a classified intent with slots extracted from the question, or None when
+    a slot the tool needs is missing (the question then goes to the LLM).
+    """
+    slots = extract_slots(qn)
+    year = slots.years[0] if slots.years else None
+    if intent == "get_total_profit":
+        if slots.quarters:
+            qtr = f"Q{slots.quarters[0]}"
+            a, b = parse_quarter(qtr)
+            return _tool_total_profit(con, qtr, year or datetime.utcnow().year, a, b)
+        if slots.half and year:
+            return _tool_total_profit(con, f"H{slots.half}", year, 6 * slots.half - 5, 6 * slots.half)
+        return _tool_total_profit(con, "FY", year, 1, 12) if year else None
+    if intent == "revenue_trend":
+        return _tool_revenue_trend(con, year) if year and _metric_in(qn) == "revenue" else None
+    if intent == "top_expense_increase":
+        return _tool_top_expense_increase(con, year) if year else None
+    if intent == "compare_quarters":
+        if len(slots.quarters) < 2:
+            return None
+        y1 = year or datetime.utcnow().year
+        y2 = slots.years[1] if len(slots.years) > 1 else y1
+        return _tool_compare_quarters(con, f"Q{slots.quarters[0]}", y1, f"Q{slots.quarters[1]}", y2, y2)
+    if intent == "period_over_period":
+        return _tool_period_over_period(con, slots.grain, _metric_in(qn), year) if slots.grain else None
+    if intent == "ttm":
+        return _tool_ttm(con, _metric_in(qn), year)
+    return None
+
+
+def _handle_rule_based(con: Connection, q: str) -> Tuple[Optional[str], Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Handle NLQ queries without the LLM: the regex rules first, then the intent classifier
+    for other wordings it is confident about.
+    Returns (answer, data, trace) if matched, else (None, {}, trace).
+    """
+    trace: List[Dict[str, Any]] = []
+    qn = q.lower().strip()
+
+    hit = _regex_route(con, qn)
+    if hit:
+        tool, (answer, data, args) = hit
+        trace.append({"tool": tool, "args": args})
+        return answer, data, trace
+
+    if settings.intent_classifier:
+        intent, confidence = classifier().predict(qn)
+        res = None
+        if intent != "other" and confidence >= settings.intent_min_confidence:
+            res = _slot_route(con, intent, qn)
+        if res:
+            answer, data, args = res
+            trace.append({"tool": intent, "args": args, "via": "classifier", "confidence": round(confidence, 3)})
+            return answer, data, trace
+        # Kept in the trace to grow the labelled set from real misses
+        trace.append({"classifier": {"intent": intent, "confidence": round(confidence, 3)}})
 
     # No rule matched
     return None, {}, trace
 
 
-def nlq(
-    con: Connection,
-    query: str,
-    conversation_id: Optional[str],
+def cache_key(query: str) -> str:
+    """
+    NLQ cache key: the question lowercased, whitespace collapsed, trailing punctuation dropped.
+    """
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+
+@span("nlq.rule_based")
+def rule_answer(con: Connection, query: str) -> Tuple[Optional[str], Dict[str, Any], List[Dict[str, Any]], str]:
+    """
+    Rule-based answer through the NLQ cache: (answer, data, trace, route) with route one of
+    cache | rule | classifier | llm (no rule answered). Rule answers are cached until the
+    data changes; cached LLM answers are only put there by the post-ingest warm-up.
+    """
+    key = cache_key(query)
+    hit = NLQ_CACHE.get(con, key)
+    if hit is not None:
+        answer, data, trace = hit
+        return answer, data, [{"event": "cache_hit"}, *trace], "cache"
+    gen = cache_generation(con)
+    answer, data, trace = _handle_rule_based(con, query)
+    if answer is None:
+        return None, data, trace, "llm"
+    NLQ_CACHE.put(key, (answer, data, list(trace)), gen)
+    return answer, data, trace, "classifier" if trace[0].get("via") == "classifier" else "rule"
+
+
+def nlq_begin(con: Connection, query: str, conversation_id: Optional[str]) -> Dict[str, Any]:
+    """
+    First NLQ phase: record the user message and try the NLQ cache, then the rule-based
+    intents. Returns the turn state the later phases fill in; `answer` stays None when the
+    LLM is needed.
+    """
+    conv = _ensure_conversation(con, conversation_id)
+    _add_message(con, conv, "user", query)
+    start = time.perf_counter()
+    answer, data, tool_trace, route = rule_answer(con, query)
+    prom_registry().NLQ_ROUTES.labels(route).inc()
+    return {"conversation_id": conv, "query": query, "start": start, "answer": answer, "data": data,
+            "trace": tool_trace, "model": None, "tokens_prompt": None, "tokens_completion": None}
+
+
+def nlq_llm(
+    turn: Dict[str, Any],
     openai_api_key: Optional[str],
     default_model_name: str,
     model_variants_str: str | None = None,
     prefer_model: str | None = None,
 ) -> Dict[str, Any]:
     """
-    Natural-language endpoint:
-      1) Try rule-based intents for determinism and speed.
-      2) Fallback to OpenAI (if key present) to craft a concise narrative.
-      3) Persist a reasoning trace (tool calls) + tokens + latency.
+    Second NLQ phase, LLM fallback: skipped without an API key or while the circuit breaker is
+    open; errors are traced and counted towards opening it.
     """
-    conv = _ensure_conversation(con, conversation_id)
-    _add_message(con, conv, "user", query)
+    tool_trace = turn["trace"]
+    if not openai_api_key:
+        # Explicitly record why we skipped the LLM
+        tool_trace.append({"event": "llm_skipped", "reason": "no_openai_api_key"})
+        turn["answer"] = "Try: 'What was total profit in Q1 2024?' or 'Show me revenue trends for 2024'."
+        return turn
+    if not admission.BREAKER.allow():
+        tool_trace.append({"event": "llm_skipped", "reason": "circuit_open"})
+        turn["answer"] = ("The language model is temporarily unavailable; only rule-based questions are answered. "
+                          "Try: 'What was total profit in Q1 2024?' or 'Show me revenue trends for 2024'.")
+        return turn
+    try:
+        client = get_client(openai_api_key)
 
-    start = time.perf_counter()
-    answer, data, tool_trace = _handle_rule_based(con, query)
+        # Parse variants from config, or fall back to default
+        variants = [m.strip() for m in (model_variants_str or "").split(",") if m.strip()]
+        if not variants:
+            variants = [default_model_name]
 
-    model_used: Optional[str] = None
-    prompt_tokens = completion_tokens = None
+        # Honor explicit forced model via header; else choose randomly
+        model_used = prefer_model if prefer_model else random.choice(variants)
+        # Recorded before the call so a failed call is traced (and rolled up) under its model
+        turn["model"] = model_used
 
-    # LLM fallback only if rule-based didn't answer AND we have an API key
-    if answer is None:
-        if not openai_api_key:
-            # Explicitly record why we skipped the LLM
-            tool_trace.append({"event": "llm_skipped", "reason": "no_openai_api_key"})
-            answer = "Try: 'What was total profit in Q1 2024?' or 'Show me revenue trends for 2024'."
-        else:
-            try:
-                client = OpenAI(api_key=openai_api_key)
-
-                # Parse variants from config, or fall back to default
-                variants = [m.strip() for m in (model_variants_str or "").split(",") if m.strip()]
-                if not variants:
-                    variants = [default_model_name]
-
-                # Honor explicit forced model via header; else choose randomly
-                model_used = prefer_model if prefer_model else random.choice(variants)
-
-                sys_prompt = (
-                    "You are a financial analyst over a monthly P&L SQLite DB. "
-                    "Prefer one-sentence insights with concrete numbers. "
-                    "If asked for profit, prefer net_profit; else gross_profit.\n"
-                )
-                resp = client.chat.completions.create(
-                    model=model_used,
-                    messages=[
-                        {"role": "system", "content": sys_prompt},
-                        {"role": "user", "content": query},
-                    ],
-                    temperature=0.2,
-                    max_tokens=300,
-                )
-                msg = resp.choices[0].message
-                answer = (msg.content or "").strip() or "No answer."
-                
-                if resp.usage:
-                    prompt_tokens = getattr(resp.usage, "prompt_tokens", None)
-                    completion_tokens = getattr(resp.usage, "completion_tokens", None)
-
-                if prompt_tokens:
-                    AI_TOKENS.labels("prompt", model_used).inc(prompt_tokens)
-                if completion_tokens:
-                    AI_TOKENS.labels("completion", model_used).inc(completion_tokens)
-                
-                model_used = getattr(resp, "model", None) or model_used
-                tool_trace.append({"llm": "openai", "model": model_used})
-            except Exception as e:
-                tool_trace.append({"event": "llm_error", "error": str(e)})
-                answer = f"LLM step failed: {e}. Try a simpler phrasing or use explicit endpoints."
-
-    latency_ms = (time.perf_counter() - start) * 1000.0
+        sys_prompt = (
+            "You are a financial analyst over a monthly P&L SQLite DB. "
+            "Prefer one-sentence insights with concrete numbers. "
+            "If asked for profit, prefer net_profit; else gross_profit.\n"
+        )
+        with span("llm.openai.chat", model=model_used) as sp:
+            resp = client.chat.completions.create(
+                model=model_used,
+                messages=[
+                    {"role": "system", "content": sys_prompt},
+                    {"role": "user", "content": turn["query"]},
+                ],
+                temperature=0.2,
+                max_tokens=LLM_MAX_TOKENS,
+            )
+            if resp.usage:
+                sp.set(tokens_prompt=getattr(resp.usage, "prompt_tokens", None) or 0,
+                       tokens_completion=getattr(resp.usage, "completion_tokens", None) or 0)
+        msg = resp.choices[0].message
+        turn["answer"] = (msg.content or "").strip() or "No answer."
+
+        prompt_tokens = completion_tokens = None
+        if resp.usage:
+            prompt_tokens = getattr(resp.usage, "prompt_tokens", None)
+            completion_tokens = getattr(resp.usage, "completion_tokens", None)
+
+        if prompt_tokens:
+            prom_registry().AI_TOKENS.labels("prompt", model_used).inc(prompt_tokens)
+        if completion_tokens:
+            prom_registry().AI_TOKENS.labels("completion", model_used).inc(completion_tokens)
+
+        model_used = getattr(resp, "model", None) or model_used
+        turn.update(model=model_used, tokens_prompt=prompt_tokens, tokens_completion=completion_tokens)
+        tool_trace.append({"llm": "openai", "model": model_used})
+        admission.BREAKER.record_success()
+    except Exception as e:
+        admission.BREAKER.record_failure()
+        tool_trace.append({"event": "llm_error", "error": str(e)})
+        turn["answer"] = f"LLM step failed: {e}. Try a simpler phrasing or use explicit endpoints."
+    return turn
+
+
+def nlq_finish(con: Connection, turn: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Last NLQ phase: persist the reasoning trace (tool calls) + tokens + latency and the
+    assistant message.
+    """
+    latency_ms = (time.perf_counter() - turn["start"]) * 1000.0
 
     # Persist trace (model may be None if LLM not used)
     trace_log(
         con,
         TraceIn(
             ts=datetime.utcnow().isoformat(),
-            conversation_id=conv,
-            question=query,
-            answer=answer,
-            model=model_used,  # <-- None unless LLM actually ran
-            tokens_prompt=prompt_tokens,
-            tokens_completion=completion_tokens,
+            conversation_id=turn["conversation_id"],
+            question=turn["query"],
+            answer=turn["answer"],
+            model=turn["model"],  # <-- None unless the LLM was called
+            tokens_prompt=turn["tokens_prompt"],
+            tokens_completion=turn["tokens_completion"],
             latency_ms=latency_ms,
-            tool_calls=tool_trace,
+            tool_calls=turn["trace"],
+            request_id=current_request_id(),
         ),
     )
 
-    _add_message(con, conv, "assistant", answer)
+    _add_message(con, turn["conversation_id"], "assistant", turn["answer"])
+
+    return {"answer": turn["answer"], "data": turn["data"], "trace": turn["trace"]}
+
 
-    return {"answer": answer, "data": data, "trace": tool_trace}
\ No newline at end of file
+def nlq(
+    con: Connection,
+    query: str,
+    conversation_id: Optional[str],
+    openai_api_key: Optional[str],
+    default_model_name: str,
+    model_variants_str: str | None = None,
+    prefer_model: str | None = None,
+) -> Dict[str, Any]:
+    """
+    Natural-language endpoint:
+      1) Try rule-based intents for determinism and speed.
+      2) Fallback to OpenAI (if key present) to craft a concise narrative.
+      3) Persist a reasoning trace (tool calls) + tokens + latency.
+    """
+    turn = nlq_begin(con, query, conversation_id)
+    # LLM fallback only if rule-based didn't answer
+    if turn["answer"] is None:
+        nlq_llm(turn, openai_api_key, default_model_name, model_variants_str, prefer_model)
+    return nlq_finish(con, turn)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import contextvars, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from sqlite3 import Connection
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import settings
+from app.db.db import get_con
+from app.obs.logger import logger
+from app.obs.spans import span
+from app.services.admission import LLM_GATE, RATE_LIMITER, Rejected, shed
+from app.services.cache import (NLQ_CACHE, cached_anomalies, cached_summary, cached_top_increase, cached_trend,
+                                generation)
+from app.services.compare import METRICS
+from app.services.nlq import LLM_MAX_TOKENS, cache_key, nlq_llm, rule_answer
+
+# NLQ questions answered ahead of time for every touched year
+CANONICAL_QS = (
+    "What was the total profit in Q1 {y}?",
+    "What was the total profit in Q2 {y}?",
+    "What was the total profit in Q3 {y}?",
+    "What was the total profit in Q4 {y}?",
+    "Show me revenue trends for {y}",
+    "Which expense category had the highest increase {y}?",
+    "Compare Q1 and Q2 performance {y}",
+    "Compare Q3 and Q4 performance {y}",
+)
+# Rate-limiter key of warm-up LLM calls
+PREWARM_CLIENT = "internal:prewarm"
+# Narrative questions sent to the LLM for the latest year, within WARM_LLM_TOKEN_BUDGET
+LLM_SUMMARY_QS = (
+    "Summarize our {y} financial performance in one sentence with concrete numbers.",
+    "In one sentence: what drove margin changes across months in {y}?",
+    "Identify any unusual spikes or dips in {y} and explain them in one sentence.",
+)
+
+
+def _years(periods: Iterable[str]) -> List[int]:
+    return sorted({int(p[:4]) for p in periods if p and p[:4].isdigit()})
+
+
+def _latest_year(con: Connection) -> Optional[int]:
+    row = con.execute("SELECT MAX(period_end) FROM metrics").fetchone()
+    return int(row[0][:4]) if row and row[0] else None
+
+
+def _warm_llm(con: Connection, year: int, budget: int) -> Dict[str, Any]:
+    """
+    Ask the LLM the summary questions for `year` while a call's full completion (LLM_MAX_TOKENS)
+    still fits in what is left of `budget`, caching each answer in the NLQ cache. Calls go through the admission gate and take rate-limit tokens
+    like any client's; warming stops (`llm_stopped`) rather than queue behind user traffic,
+    and on a refusal or an error (open circuit breaker included), which is not cached.
+    """
+    spent = answers = 0
+    stopped = None
+    for q in LLM_SUMMARY_QS:
+        q = q.format(y=year)
+        key = cache_key(q)
+        if NLQ_CACHE.get(con, key) is not None or rule_answer(con, q)[0] is not None:
+            continue
+        if spent + LLM_MAX_TOKENS > budget:
+            break
+        if not LLM_GATE.has_capacity():
+            stopped = "busy"
+            break
+        if RATE_LIMITER.check(PREWARM_CLIENT) > 0:
+            stopped = "rate_limited"
+            break
+        gen = generation(con)
+        turn: Dict[str, Any] = {"query": q, "answer": None, "data": {}, "trace": [], "model": None,
+                                "tokens_prompt": None, "tokens_completion": None}
+        try:
+            LLM_GATE.call(nlq_llm, turn, settings.openai_api_key, settings.model_name, settings.model_variants)
+        except Rejected as e:
+            shed(e.reason)
+            stopped = e.reason
+            break
+        spent += (turn["tokens_prompt"] or 0) + (turn["tokens_completion"] or 0)
+        if "llm" not in turn["trace"][-1]:
+            stopped = "llm_error"
+            break
+        NLQ_CACHE.put(key, (turn["answer"], {}, turn["trace"]), gen)
+        answers += 1
+    out: Dict[str, Any] = {"llm_answers": answers, "llm_tokens": spent}
+    if stopped is not None:
+        out["llm_stopped"] = stopped
+    return out
+
+
+@span("service.prewarm")
+def warm(con: Connection, periods: Iterable[str], llm_token_budget: int = 0) -> Dict[str, Any]:
+    """
+    Fill the response and NLQ caches for the years of `periods`: summary (all sources and
+    per source), trend and anomalies of every metric, top expense increases, and the canonical
+    NLQ questions. With a token budget, also cache LLM summaries of the latest year.
+    """
+    t0 = time.perf_counter()
+    years = _years(periods)
+    responses = nlq = 0
+    if years:
+        cached_summary(con, None, None)
+        responses += 1
+    for y in years:
+        for source in (None, "quickbooks", "rootfi"):
+            cached_summary(con, y, source)
+            responses += 1
+        for m in METRICS:
+            cached_trend(con, m, y, None)
+            cached_anomalies(con, m, y, None)
+            responses += 2
+        cached_top_increase(con, y)
+        responses += 1
+        for q in CANONICAL_QS:
+            nlq += rule_answer(con, q.format(y=y))[0] is not None
+    out: Dict[str, Any] = {"years": years, "responses": responses, "nlq_answers": nlq}
+    latest = _latest_year(con) if years else None
+    if llm_token_budget > 0 and settings.openai_api_key and latest is not None:
+        out.update(_warm_llm(con, latest, llm_token_budget))
+    out["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return out
+
+
+class WarmStatus:
+    """
+    Post-ingest warm-up state, reported by /health: runs done, the last result, and
+    whether more periods are waiting.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.pending: set = set()
+        self.running = False
+        self.last: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"runs": self.runs, "running": self.running, "pending": bool(self.pending),
+                               "last": self.last}
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+WARM_STATUS = WarmStatus()
+_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prewarm")
+_LOCK = threading.Lock()
+
+
+def _drain():
+    with _LOCK:
+        periods = sorted(WARM_STATUS.pending)
+        WARM_STATUS.pending.clear()
+        WARM_STATUS.running = True
+    try:
+        # The app's own connection, so the cached entries carry the generation requests see
+        WARM_STATUS.last = warm(get_con(settings.db_path), periods, settings.warm_llm_token_budget)
+        WARM_STATUS.error = None
+    except Exception as e:
+        WARM_STATUS.error = f"{type(e).__name__}: {e}"
+        logger.exception("prewarm_failed", extra={"periods": len(periods)})
+    finally:
+        WARM_STATUS.running = False
+        WARM_STATUS.runs += 1
+
+
+def schedule(periods: Iterable[str]) -> Optional[Future]:
+    """
+    Queue a warm-up of `periods` on the background worker and return at once. Periods from
+    ingests arriving while one is queued are merged into it.
+    """
+    periods = list(periods)
+    if not settings.warm_after_ingest or not periods:
+        return None
+    with _LOCK:
+        queued = bool(WARM_STATUS.pending)
+        WARM_STATUS.pending.update(periods)
+    if queued:
+        return None
+    # A fresh context: the warm-up is not part of the ingest request's span tree
+    return _POOL.submit(contextvars.Context().run, _drain)
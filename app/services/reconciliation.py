@@ -0,0 +1,211 @@
+from __future__ import annotations
+from datetime import datetime
+from sqlite3 import Connection
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import settings
+from app.obs.spans import span
+from app.repositories.period_index import invalidate
+
+LEVELS = ("metric", "account")
+RECON_METRICS = ("revenue", "cogs", "gross_profit", "expenses", "net_profit")
+
+# Months present in recon_months that both sources have metrics for
+_BOTH_MONTHS = """
+    SELECT substr(m.period_end, 1, 7) AS month_key
+    FROM metrics m JOIN recon_months t ON t.month_key = substr(m.period_end, 1, 7)
+    WHERE m.source IN ('quickbooks', 'rootfi')
+    GROUP BY 1 HAVING COUNT(DISTINCT m.source) = 2
+"""
+
+_METRIC_UNPIVOT = " UNION ALL ".join(
+    f"SELECT mk, source, '{c}' AS item, {c} AS v FROM per_src" for c in RECON_METRICS
+)
+
+# Metric level: per month, each metric of one source against the other
+METRIC_SQL = f"""
+INSERT INTO reconciliation(month_key, level, item, quickbooks, rootfi, diff, rel_diff, flagged, updated_at)
+SELECT mk, 'metric', item, qb, rf, rf - qb, ABS(rf - qb) / NULLIF(MAX(ABS(qb), ABS(rf)), 0),
+       ABS(rf - qb) > :abs_tol AND COALESCE(ABS(rf - qb) / NULLIF(MAX(ABS(qb), ABS(rf)), 0), 0) > :rel_tol,
+       :now
+FROM (
+    WITH both_months AS ({_BOTH_MONTHS}),
+    per_src AS (
+        SELECT substr(m.period_end, 1, 7) AS mk, m.source,
+               SUM(m.revenue) AS revenue, SUM(m.cogs) AS cogs, SUM(m.gross_profit) AS gross_profit,
+               SUM(m.expenses) AS expenses, SUM(m.net_profit) AS net_profit
+        FROM metrics m JOIN both_months b ON b.month_key = substr(m.period_end, 1, 7)
+        WHERE m.source IN ('quickbooks', 'rootfi')
+        GROUP BY 1, 2
+    ),
+    unpivoted AS ({_METRIC_UNPIVOT})
+    SELECT mk, item,
+           SUM(CASE WHEN source = 'quickbooks' THEN v END) AS qb,
+           SUM(CASE WHEN source = 'rootfi' THEN v END) AS rf
+    FROM unpivoted GROUP BY mk, item
+)
+WHERE qb IS NOT NULL AND rf IS NOT NULL
+"""
+
+# Account level: leaf accounts grouped by recon key (explicit mapping, else leaf name).
+# Leaf-name matches are kept only when both sources have them; an explicit key is always
+# reconciled, with a missing side counted as 0.
+ACCOUNT_SQL = """
+INSERT INTO reconciliation(month_key, level, item, quickbooks, rootfi, diff, rel_diff, flagged, updated_at)
+SELECT mk, 'account', item, qb, rf, rf - qb, ABS(rf - qb) / NULLIF(MAX(ABS(qb), ABS(rf)), 0),
+       ABS(rf - qb) > :abs_tol AND COALESCE(ABS(rf - qb) / NULLIF(MAX(ABS(qb), ABS(rf)), 0), 0) > :rel_tol,
+       :now
+FROM (
+    WITH both_months AS (""" + _BOTH_MONTHS + """),
+    per_key AS (
+        SELECT f.month_key AS mk, COALESCE(r.recon_key, lower(a.leaf_name)) AS item, a.source,
+               MAX(r.recon_key IS NOT NULL) AS mapped, SUM(f.amount) AS v
+        FROM facts f
+        JOIN both_months b ON b.month_key = f.month_key
+        JOIN accounts a ON a.id = f.account_id
+        LEFT JOIN recon_account_map r ON r.source = a.source AND r.full_path = a.full_path
+        WHERE f.kind = 'amount' AND a.source IN ('quickbooks', 'rootfi')
+          AND (a.is_leaf = 1 OR r.recon_key IS NOT NULL)
+        GROUP BY 1, 2, 3
+    )
+    SELECT mk, item,
+           COALESCE(SUM(CASE WHEN source = 'quickbooks' THEN v END), 0.0) AS qb,
+           COALESCE(SUM(CASE WHEN source = 'rootfi' THEN v END), 0.0) AS rf
+    FROM per_key GROUP BY mk, item
+    HAVING MAX(mapped) = 1 OR COUNT(DISTINCT source) = 2
+)
+"""
+
+
+def _stage_months(con: Connection, months: Optional[Iterable[str]]):
+    """
+    Fill the temp table recon_months with the months to refresh (all months with metrics if None).
+    """
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS recon_months(month_key TEXT PRIMARY KEY)")
+    con.execute("DELETE FROM recon_months")
+    if months is None:
+        con.execute("INSERT INTO recon_months SELECT DISTINCT substr(period_end, 1, 7) FROM metrics WHERE period_end IS NOT NULL")
+    else:
+        con.executemany("INSERT OR IGNORE INTO recon_months(month_key) VALUES(?)", [(m,) for m in months])
+
+
+@span("service.reconcile")
+def reconcile(con: Connection, months: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Recompute the reconciliation rows of `months` ('YYYY-MM'; None = every month) in one
+    transaction: delete them, then one set-based INSERT ... SELECT per level. Only months
+    that both sources have data for produce rows; nothing is loaded into Python.
+    """
+    params = {"abs_tol": settings.recon_abs_tol, "rel_tol": settings.recon_rel_tol,
+              "now": datetime.utcnow().isoformat(timespec="seconds")}
+    with con:
+        _stage_months(con, months)
+        con.execute("DELETE FROM reconciliation WHERE month_key IN (SELECT month_key FROM recon_months)")
+        metric_rows = con.execute(METRIC_SQL, params).rowcount
+        account_rows = con.execute(ACCOUNT_SQL, params).rowcount
+        con.execute("DELETE FROM recon_months")
+    # Cached NLQ profit answers quote reconciliation flags
+    invalidate()
+    flagged = con.execute(
+        "SELECT level, COUNT(*) FROM reconciliation WHERE flagged = 1 GROUP BY level"
+    ).fetchall()
+    return {"metric_rows": max(metric_rows, 0), "account_rows": max(account_rows, 0),
+            "flagged": {r[0]: r[1] for r in flagged}}
+
+
+def set_mapping(con: Connection, source: str, full_path: str, recon_key: Optional[str]):
+    """
+    Map (or with recon_key=None, unmap) one account to a cross-source reconciliation key.
+    Takes effect on the next reconcile.
+    """
+    with con:
+        if recon_key is None:
+            con.execute("DELETE FROM recon_account_map WHERE source=? AND full_path=?", (source, full_path))
+        else:
+            con.execute(
+                """
+                INSERT INTO recon_account_map(source, full_path, recon_key) VALUES(?,?,?)
+                ON CONFLICT(source, full_path) DO UPDATE SET recon_key=excluded.recon_key
+                """,
+                (source, full_path, recon_key),
+            )
+
+
+@span("service.reconcile_page")
+def reconciliation_page(
+    con: Connection,
+    level: Optional[str] = None,
+    flagged_only: bool = False,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+    item: Optional[str] = None,
+    abs_tol: Optional[float] = None,
+    rel_tol: Optional[float] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Keyset page of stored reconciliation rows, newest month first, then level and item.
+    `next_cursor` is passed back as `cursor`. Tolerances default to the ones the rows were
+    flagged with; passing either re-evaluates `flagged` on the fly.
+    """
+    where: List[str] = []
+    params: List[Any] = []
+    if abs_tol is None and rel_tol is None:
+        flag_sql = "flagged"
+    else:
+        flag_sql = "(ABS(diff) > ? AND COALESCE(rel_diff, 0) > ?)"
+    flag_params = [] if flag_sql == "flagged" else [
+        settings.recon_abs_tol if abs_tol is None else abs_tol,
+        settings.recon_rel_tol if rel_tol is None else rel_tol,
+    ]
+    if level:
+        where.append("level = ?")
+        params.append(level)
+    if month_from:
+        where.append("month_key >= ?")
+        params.append(month_from)
+    if month_to:
+        where.append("month_key <= ?")
+        params.append(month_to)
+    if item:
+        where.append("item = ?")
+        params.append(item)
+    if flagged_only:
+        where.append(flag_sql)
+        params.extend(flag_params)
+    if cursor:
+        mk, lvl, it = cursor.split("|", 2)
+        where.append("(month_key < ? OR (month_key = ? AND (level, item) > (?, ?)))")
+        params.extend([mk, mk, lvl, it])
+    q = (f"SELECT month_key, level, item, quickbooks, rootfi, diff, rel_diff, {flag_sql} AS flagged, updated_at "
+         "FROM reconciliation")
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY month_key DESC, level, item LIMIT ?"
+    rows = [dict(r) for r in con.execute(q, flag_params + params + [limit]).fetchall()]
+    for r in rows:
+        r["flagged"] = bool(r["flagged"])
+    last = rows[-1] if len(rows) == limit else None
+    return {
+        "rows": rows,
+        "next_cursor": f"{last['month_key']}|{last['level']}|{last['item']}" if last else None,
+        "tolerances": {
+            "abs": settings.recon_abs_tol if abs_tol is None else abs_tol,
+            "rel": settings.recon_rel_tol if rel_tol is None else rel_tol,
+        },
+    }
+
+
+def flagged_months(con: Connection, months: Iterable[str], item: str) -> List[Dict[str, Any]]:
+    """
+    Stored metric-level variances for `item` that are flagged in any of `months`.
+    """
+    months = list(months)
+    if not months:
+        return []
+    marks = ",".join("?" for _ in months)
+    return [dict(r) for r in con.execute(
+        f"SELECT month_key, quickbooks, rootfi, diff, rel_diff FROM reconciliation "
+        f"WHERE level = 'metric' AND item = ? AND flagged = 1 AND month_key IN ({marks}) ORDER BY month_key",
+        [item, *months],
+    ).fetchall()]
@@ -0,0 +1,95 @@
+from __future__ import annotations
+import sqlite3, threading, time
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.obs.logger import logger
+
+
+class Readiness:
+    """
+    Startup state reported by /health. The server accepts requests as soon as the schema
+    exists; deferred work (warming lazily-imported modules, auto-ingest) runs in a
+    background thread and flips `ready` when it is done.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.phase = "starting"
+        self.t0 = time.perf_counter()
+        self.ready_ms: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.auto_ingest: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"phase": self.phase, "ready_ms": self.ready_ms, "steps_ms": dict(self.steps)}
+        if self.auto_ingest is not None:
+            out["auto_ingest"] = self.auto_ingest
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+READINESS = Readiness()
+
+
+def _step(name: str, fn):
+    READINESS.phase = name
+    t = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        READINESS.steps[name] = round((time.perf_counter() - t) * 1000.0, 3)
+
+
+def _warmup():
+    """
+    Pay the import cost of deferred modules here rather than on the first request.
+    """
+    from app.obs.metrics import registry
+    registry()
+    if settings.intent_classifier:
+        from app.services.intent import classifier
+        classifier()
+    if settings.llm_backend != "stub" and settings.openai_api_key:
+        from app.services.llm import get_client
+        get_client(settings.openai_api_key)
+
+
+def _auto_ingest() -> Dict[str, Any]:
+    from app.db.db import get_con
+    from app.services.ingestion import auto_ingest
+    # Own connection: the request path keeps using the shared one while this writes; the
+    # shared one gets the post-ingest warm-up
+    con = sqlite3.connect(settings.db_path, timeout=30.0)
+    con.row_factory = sqlite3.Row
+    try:
+        out = auto_ingest(con, settings.qb_file, settings.rootfi_file, serve_con=get_con(settings.db_path))
+    finally:
+        con.close()
+    return {src: {"inserted_facts": r.get("inserted_facts"), "periods": len(r.get("periods") or [])} for src, r in out.items()}
+
+
+def _run():
+    try:
+        if settings.startup_warmup:
+            _step("warmup", _warmup)
+        if settings.auto_ingest:
+            READINESS.auto_ingest = _step("auto_ingest", _auto_ingest)
+    except Exception as e:
+        # Still become ready: the API serves whatever data is there; the error is visible on /health
+        READINESS.error = f"{type(e).__name__}: {e}"
+        logger.exception("startup_init_failed", extra={"phase": READINESS.phase})
+    READINESS.ready_ms = round((time.perf_counter() - READINESS.t0) * 1000.0, 3)
+    READINESS.phase = "ready"
+    READINESS.ready = True
+    logger.info("startup_ready", extra=READINESS.snapshot())
+
+
+def start_background_init() -> threading.Thread:
+    """
+    Run deferred startup work on a daemon thread; /health reports progress.
+    """
+    t = threading.Thread(target=_run, name="startup-init", daemon=True)
+    t.start()
+    return t
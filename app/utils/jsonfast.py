@@ -0,0 +1,67 @@
+from __future__ import annotations
+import json, math
+from typing import Any, Callable, Optional
+from fastapi.responses import JSONResponse
+
+try:  # optional fast backend
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+# Name of the active backend, for diagnostics and benchmarks
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: bytes | str) -> Any:
+    """
+    Decode JSON bytes/str with orjson when installed, else the stdlib.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _finite(obj: Any) -> Any:
+    """
+    Copy of `obj` with NaN and infinities replaced by None, as orjson writes them.
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    return obj
+
+
+def _std_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    try:
+        text = json.dumps(obj, default=default, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    except ValueError as e:
+        if "float" not in str(e):  # e.g. a circular reference
+            raise
+        # Rare: only documents holding NaN or +-inf take the second pass
+        text = json.dumps(_finite(obj), default=default, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    Encode to compact UTF-8 JSON bytes with orjson when installed, else the stdlib.
+    Either way NaN and infinities are written as null.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return _std_dumps(obj, default)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by the fast backend. Returning one directly from an
+    endpoint also skips FastAPI's jsonable_encoder walk over the content.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return _std_dumps(content)
@@ -0,0 +1,95 @@
+"""
+Timing, result I/O and baseline comparison shared by the benchmark suites.
+"""
+
+from __future__ import annotations
+import json, os, platform, statistics, subprocess, sys, time
+from typing import Any, Callable, Dict, List, Optional
+
+
+def measure(fn: Callable[[], Any], min_runs: int = 5, max_runs: int = 200,
+            min_time_s: float = 0.3, warmup: int = 1, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """
+    Time `fn` repeatedly until both `min_runs` and `min_time_s` are reached (capped at `max_runs`).
+    `setup`, if given, runs untimed before every call and its result is passed to `fn`.
+    """
+    call = (lambda: fn(setup())) if setup else fn
+    for _ in range(warmup):
+        call()
+    samples: List[float] = []
+    spent = 0.0
+    while len(samples) < max_runs and (len(samples) < min_runs or spent < min_time_s):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg) if setup else fn()
+        dt = time.perf_counter() - t0
+        samples.append(dt * 1000.0)
+        spent += dt
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+    }
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def write_results(path: str, params: Dict[str, Any], results: Dict[str, Dict[str, Any]]):
+    """
+    Save a run as JSON with enough metadata to judge whether two runs are comparable.
+    """
+    doc = {
+        "meta": {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "params": params,
+        },
+        "results": results,
+    }
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+
+
+def compare(baseline_path: str, current_path: str, threshold: float = 0.15, metric: str = "median_ms") -> int:
+    """
+    Print a per-benchmark ratio table; returns the number of regressions
+    (current slower than baseline by more than `threshold`).
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(current_path, encoding="utf-8") as f:
+        cur = json.load(f)
+    if base["meta"].get("params") != cur["meta"].get("params"):
+        print(f"[WARN] params differ: baseline={base['meta'].get('params')} current={cur['meta'].get('params')}")
+    regressions = 0
+    names = sorted(set(base["results"]) | set(cur["results"]))
+    width = max((len(n) for n in names), default=10)
+    print(f"{'benchmark':<{width}}  {'baseline':>12}  {'current':>12}  {'ratio':>7}")
+    for n in names:
+        b = base["results"].get(n, {}).get(metric)
+        c = cur["results"].get(n, {}).get(metric)
+        if b is None or c is None:
+            print(f"{n:<{width}}  {b if b is not None else '-':>12}  {c if c is not None else '-':>12}  {'n/a':>7}")
+            continue
+        ratio = c / b if b else float("inf")
+        flag = ""
+        if ratio > 1.0 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1.0 - threshold:
+            flag = "  improved"
+        print(f"{n:<{width}}  {b:>12.4f}  {c:>12.4f}  {ratio:>6.2f}x{flag}")
+    return regressions
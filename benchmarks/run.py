@@ -0,0 +1,300 @@
+"""
+Reproducible benchmark suite for ingestion, repository queries, range totals, NLQ routing,
+JSON encode/decode, in-process endpoint latency and middleware overhead.
+
+Usage:
+  python -m benchmarks.run run --months 36 --accounts 40 --depth 3 --out benchmarks/results/current.json
+  python -m benchmarks.run compare benchmarks/results/baseline.json benchmarks/results/current.json
+"""
+
+from __future__ import annotations
+import argparse, os, sqlite3, sys, tempfile
+from typing import Any, Callable, Dict, List
+
+from benchmarks.harness import compare, measure, write_results
+from benchmarks.synth import quickbooks_payload, rootfi_payload
+
+# Canonical NLQ questions plus one that falls through every rule
+ROUTING_QS = {
+    "profit_q1": "What was the total profit in Q1 {y}?",
+    "revenue_trend": "Show me revenue trends for {y}",
+    "top_expense": "Which expense category had the highest increase {y}?",
+    "compare_q1_q2": "Compare Q1 and Q2 {y}",
+    "revenue_qoq": "Revenue QoQ {y}",
+    "classified_profit": "What was profit for the first quarter of {y}",
+    "miss": "Summarize our {y} financial performance in one sentence.",
+}
+
+
+def _fresh_con() -> sqlite3.Connection:
+    """
+    An empty, initialized in-memory database using the app's connection class.
+    """
+    from app.db.db import init_db
+    from app.obs.queries import ProfilingConnection
+    con = sqlite3.connect(":memory:", check_same_thread=False, factory=ProfilingConnection)
+    con.row_factory = sqlite3.Row
+    init_db(con)
+    return con
+
+
+def suite_ingest(ctx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Parser + insert throughput on a fresh database per run.
+    """
+    from app.parsers.quickbooks import ingest_quickbooks
+    from app.parsers.rootfi import ingest_rootfi
+    out = {}
+    for name, fn, payload in (("ingest.quickbooks", ingest_quickbooks, ctx["qb"]),
+                              ("ingest.rootfi", ingest_rootfi, ctx["rf"])):
+        facts = fn(_fresh_con(), payload)["inserted_facts"]
+        r = measure(lambda con: fn(con, payload), setup=_fresh_con, min_runs=3, max_runs=20, min_time_s=1.0)
+        r["facts"] = facts
+        r["facts_per_s"] = round(facts / (r["median_ms"] / 1000.0), 1)
+        out[name] = r
+    return out
+
+
+def suite_repo(ctx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Latency of each repository function against a loaded database.
+    """
+    from app.repositories.metrics import summary, trend, sum_between
+    from app.repositories.facts import expenses_increase_top
+    con, y = ctx["con"], ctx["year"]
+    cases: Dict[str, Callable[[], Any]] = {
+        "repo.summary.all": lambda: summary(con, None, None),
+        "repo.summary.year": lambda: summary(con, y, None),
+        "repo.trend.revenue": lambda: trend(con, "revenue", y, None),
+        "repo.sum_between.q1": lambda: sum_between(con, 1, 3, y, "quickbooks"),
+        "repo.expenses_increase_top": lambda: expenses_increase_top(con, y, None),
+    }
+    return {name: measure(fn) for name, fn in cases.items()}
+
+
+def suite_ranges(ctx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Range totals from the prefix-sum period index vs the SQL SUM scan, the index rebuild cost,
+    and the period-comparison service over one year vs the whole history.
+    """
+    from app.repositories.metrics import range_totals, sum_between, sum_between_sql
+    from app.repositories.period_index import PeriodIndex
+    con, y = ctx["con"], ctx["year"]
+    ranges = {"q1": (1, 3), "h2": (7, 12), "year": (1, 12)}
+    out = {}
+    for name, (a, b) in ranges.items():
+        for src in ("quickbooks", None):
+            label = src or "all"
+            out[f"range.{name}.{label}.index"] = measure(lambda a=a, b=b, src=src: sum_between(con, a, b, y, src))
+            out[f"range.{name}.{label}.sql"] = measure(lambda a=a, b=b, src=src: sum_between_sql(con, a, b, y, src))
+    ttm = (f"{y - 1:04d}-07", f"{y:04d}-06")
+    out["range.ttm.all.index"] = measure(lambda: range_totals(con, ttm[0], ttm[1], None))
+    out["range.ttm.all.sql"] = measure(lambda: con.execute(
+        "SELECT source, SUM(revenue), SUM(cogs), SUM(gross_profit), SUM(expenses), SUM(COALESCE(net_profit,0)) "
+        "FROM metrics WHERE substr(period_end,1,7) BETWEEN ? AND ? GROUP BY source", ttm).fetchall())
+    out["range.index_build"] = measure(lambda: PeriodIndex.build(con, 0, 0))
+    # One windowed pass regardless of how much of the history is returned
+    from app.services.compare import compare
+    out["compare.month.one_year"] = measure(lambda: compare(con, "month", None, None, f"{y:04d}-01", f"{y:04d}-12"))
+    out["compare.month.all_history"] = measure(lambda: compare(con, "month"))
+    out["compare.quarter.all_history"] = measure(lambda: compare(con, "quarter"))
+    return out
+
+
+def suite_routing(ctx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Cost of _handle_rule_based per canonical question (includes the queries it runs).
+    """
+    from app.services.intent import classifier
+    from app.services.nlq import _handle_rule_based
+    con, y = ctx["con"], ctx["year"]
+    out = {f"routing.{k}": measure(lambda q=q.format(y=y): _handle_rule_based(con, q))
+           for k, q in ROUTING_QS.items()}
+    model = classifier()
+    out["routing.classifier.predict"] = measure(lambda: model.predict(ROUTING_QS["classified_profit"].format(y=y)))
+    return out
+
+
+def suite_json(ctx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    stdlib json vs the fast backend (app.utils.jsonfast) on the test_data ingest payloads
+    and on a full-history /metrics/summary response.
+    """
+    import json, pathlib
+    from app.repositories.metrics import summary
+    from app.utils import jsonfast
+    data = pathlib.Path("test_data")
+    bodies = {p.stem: p.read_bytes() for p in sorted(data.glob("data_set_*.json"))} if data.exists() else {}
+    bodies["synth_qb"] = json.dumps({"payload": ctx["qb"]}).encode()
+    resp = summary(ctx["con"], None, None)
+    out = {}
+    for name, raw in bodies.items():
+        out[f"json.decode.{name}.stdlib"] = measure(lambda raw=raw: json.loads(raw))
+        out[f"json.decode.{name}.{jsonfast.BACKEND}"] = measure(lambda raw=raw: jsonfast.loads(raw))
+    out["json.encode.summary.stdlib"] = measure(
+        lambda: json.dumps(resp, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode())
+    out[f"json.encode.summary.{jsonfast.BACKEND}"] = measure(lambda: jsonfast.FastJSONResponse(resp).body)
+    return out
+
+
+def suite_endpoints(ctx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    End-to-end latency through the full middleware stack with an in-process ASGI client.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+    y = ctx["year"]
+    out = {}
+    with TestClient(app) as client:
+        client.post("/ingest/quickbooks", json={"payload": ctx["qb"]}).raise_for_status()
+        client.post("/ingest/rootfi", json={"payload": ctx["rf"]}).raise_for_status()
+        gets = {
+            "http.health": "/health",
+            "http.metrics_summary": f"/api/v1/metrics/summary?year={y}",
+            "http.metrics_trend": f"/api/v1/metrics/trend?metric=revenue&year={y}",
+            "http.metrics_range": f"/api/v1/metrics/range?from={y - 1}-07&to={y}-06",
+            "http.expenses_top_increase": f"/api/v1/expenses/top_increase?year={y}",
+            "http.anomalies": f"/api/v1/analytics/anomalies?metric=revenue&year={y}",
+        }
+        for name, url in gets.items():
+            out[name] = measure(lambda url=url: client.get(url).raise_for_status())
+        # A dashboard page: the same eight queries as separate GETs vs one POST /batch
+        page = [f"/api/v1/metrics/summary?year={y}",
+                *(f"/api/v1/metrics/trend?metric={m}&year={y}"
+                  for m in ("revenue", "cogs", "gross_profit", "expenses", "net_profit")),
+                f"/api/v1/expenses/top_increase?year={y}",
+                f"/api/v1/analytics/anomalies?metric=revenue&year={y}"]
+        batch = {"queries": [
+            {"op": "summary", "params": {"year": y}},
+            *({"op": "trend", "params": {"metric": m, "year": y}}
+              for m in ("revenue", "cogs", "gross_profit", "expenses", "net_profit")),
+            {"op": "top_increase", "params": {"year": y}},
+            {"op": "anomalies", "params": {"metric": "revenue", "year": y}},
+        ]}
+        out["http.dashboard_separate"] = measure(lambda: [client.get(u).raise_for_status() for u in page])
+        out["http.dashboard_batch"] = measure(lambda: client.post("/api/v1/batch", json=batch).raise_for_status())
+        body = {"query": ROUTING_QS["compare_q1_q2"].format(y=y)}
+        out["http.nlq_rule_based"] = measure(lambda: client.post("/api/v1/nlq", json=body).raise_for_status())
+    return out
+
+
+def suite_middleware(ctx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-request cost of the middleware stack: the app driven directly over ASGI (no HTTP
+    client in the timing) against a bare FastAPI app serving the same route; the difference
+    is the middleware overhead.
+    """
+    import asyncio
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routers import health
+
+    bare = FastAPI()
+    bare.include_router(health.router)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def call(target, path: str):
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                 "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+                 "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1),
+                 "server": ("bench", 80)}
+        return target(scope, receive, send)
+
+    out = {}
+    with TestClient(app):  # startup hooks
+        loop = asyncio.new_event_loop()
+        try:
+            for name, target in (("asgi.health.stack", app), ("asgi.health.bare", bare)):
+                out[name] = measure(lambda t=target: loop.run_until_complete(call(t, "/health")),
+                                    min_runs=200, max_runs=2000, warmup=20)
+        finally:
+            loop.close()
+    overhead = round(out["asgi.health.stack"]["median_ms"] - out["asgi.health.bare"]["median_ms"], 4)
+    print(f"{'asgi.middleware_overhead':<36} median {overhead:>10.4f} ms")
+    return out
+
+
+SUITES: Dict[str, Callable[[Dict[str, Any]], Dict[str, Dict[str, Any]]]] = {
+    "ingest": suite_ingest,
+    "repo": suite_repo,
+    "ranges": suite_ranges,
+    "routing": suite_routing,
+    "json": suite_json,
+    "endpoints": suite_endpoints,
+    "middleware": suite_middleware,
+}
+
+
+def run(args) -> int:
+    # Point the app at a throwaway DB and keep background work out of the timings
+    tmp = tempfile.mkdtemp(prefix="kudwa_bench_")
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["AUTO_INGEST"] = "0"
+    os.environ["TRACE_COMPACT_INTERVAL_S"] = "0"
+
+    params = {"months": args.months, "accounts": args.accounts, "depth": args.depth,
+              "start_year": args.start_year, "seed": args.seed}
+    qb = quickbooks_payload(args.months, args.accounts, args.depth, args.start_year, seed=args.seed)
+    rf = rootfi_payload(args.months, args.accounts, args.depth, args.start_year, seed=args.seed + 1)
+
+    # Keep JSON log formatting on the measured path but discard the output
+    from app.obs import logger as app_logger
+    app_logger.handler.setStream(open(os.devnull, "w"))
+
+    from app.parsers.quickbooks import ingest_quickbooks
+    from app.parsers.rootfi import ingest_rootfi
+    con = _fresh_con()
+    ingest_quickbooks(con, qb)
+    ingest_rootfi(con, rf)
+    ctx = {"qb": qb, "rf": rf, "con": con, "year": args.start_year + (args.months - 1) // 24}
+
+    selected: List[str] = args.suites.split(",") if args.suites else list(SUITES)
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in selected:
+        if name not in SUITES:
+            print(f"[ERR] unknown suite {name!r}; choose from {', '.join(SUITES)}", file=sys.stderr)
+            return 2
+        res = SUITES[name](ctx)
+        for k, v in res.items():
+            print(f"{k:<36} median {v['median_ms']:>10.4f} ms  p95 {v['p95_ms']:>10.4f} ms  (n={v['runs']})")
+        results.update(res)
+    write_results(args.out, params, results)
+    print(f"[OK] results saved: {args.out}")
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="Run benchmark suites and save results as JSON")
+    r.add_argument("--months", type=int, default=36)
+    r.add_argument("--accounts", type=int, default=40, help="Leaf accounts per category")
+    r.add_argument("--depth", type=int, default=3, help="Nesting depth of account trees")
+    r.add_argument("--start-year", type=int, default=2022)
+    r.add_argument("--seed", type=int, default=7)
+    r.add_argument("--suites", default=None, help=f"Comma-separated subset of: {','.join(SUITES)}")
+    r.add_argument("--out", default="benchmarks/results/current.json")
+
+    c = sub.add_parser("compare", help="Compare a run against a saved baseline")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown flagged as a regression")
+    c.add_argument("--metric", default="median_ms")
+
+    args = ap.parse_args(argv)
+    if args.cmd == "run":
+        return run(args)
+    n = compare(args.baseline, args.current, args.threshold, args.metric)
+    print(f"[{'FAIL' if n else 'OK'}] {n} regression(s) over {args.threshold:.0%}")
+    return 1 if n else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
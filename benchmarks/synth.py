@@ -0,0 +1,169 @@
+"""
+Synthetic QuickBooks and Rootfi payloads at configurable scale.
+
+Shapes mirror test_data/: QuickBooks ProfitAndLoss reports with nested
+Section/Data rows and one Money column per month, and Rootfi period records
+with nested `line_items`. Scale is months x accounts (leaves per category) x
+nesting depth; a fixed seed keeps runs reproducible.
+"""
+
+from __future__ import annotations
+import calendar, random
+from typing import Any, Dict, List, Tuple
+
+# (QuickBooks section title, group, leaf-name stem) — stems chosen so the default category rules map them
+QB_SECTIONS = [
+    ("Income", "Income", "sales"),
+    ("Cost of Goods Sold", "COGS", "cost of goods sold"),
+    ("Expenses", "Expenses", "operations_expense"),
+]
+
+# (Rootfi top-level key, root line-item name)
+RF_SECTIONS = [
+    ("revenue", "Business Revenue"),
+    ("cost_of_goods_sold", "Cost of Sales"),
+    ("operating_expenses", "Operating Expenses"),
+]
+
+
+def month_range(start_year: int, months: int) -> List[Tuple[str, str, str]]:
+    """
+    (start_date, end_date, 'Mon YYYY') for `months` consecutive months.
+    """
+    out = []
+    y, m = start_year, 1
+    for _ in range(months):
+        last = calendar.monthrange(y, m)[1]
+        out.append((f"{y:04d}-{m:02d}-01", f"{y:04d}-{m:02d}-{last:02d}", f"{calendar.month_abbr[m]} {y}"))
+        m += 1
+        if m > 12:
+            y, m = y + 1, 1
+    return out
+
+
+def _split(n: int, parts: int) -> List[int]:
+    """
+    Split n leaves into `parts` near-equal, non-empty groups.
+    """
+    parts = max(1, min(parts, n))
+    base, extra = divmod(n, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def _qb_money(v: float) -> str:
+    return f"{v:.2f}"
+
+
+def _qb_tree(rng: random.Random, stem: str, leaves: int, depth: int, months: int,
+             counter: List[int], fanout: int) -> Tuple[List[dict], List[float]]:
+    """
+    Build nested QuickBooks rows; returns (rows, per-month totals).
+    """
+    totals = [0.0] * months
+    rows: List[dict] = []
+    if depth <= 1 or leaves <= 1:
+        for _ in range(leaves):
+            counter[0] += 1
+            vals = [round(rng.uniform(100, 10000), 2) if rng.random() > 0.1 else 0.0 for _ in range(months)]
+            for i, v in enumerate(vals):
+                totals[i] += v
+            rows.append({
+                "ColData": [{"value": f"{stem}_{counter[0]}", "id": str(counter[0])}]
+                + [{"value": _qb_money(v) if v else ""} for v in vals]
+                + [{"value": _qb_money(sum(vals))}],
+                "type": "Data",
+            })
+        return rows, totals
+    for n in _split(leaves, fanout):
+        counter[0] += 1
+        name = f"{stem}_{counter[0]}"
+        child_rows, child_totals = _qb_tree(rng, stem, n, depth - 1, months, counter, fanout)
+        for i, v in enumerate(child_totals):
+            totals[i] += v
+        rows.append({
+            "Header": {"ColData": [{"value": name, "id": str(counter[0])}] + [{"value": ""}] * (months + 1)},
+            "Rows": {"Row": child_rows},
+            "Summary": {"ColData": [{"value": f"Total {name}"}]
+                        + [{"value": _qb_money(v)} for v in child_totals]
+                        + [{"value": _qb_money(sum(child_totals))}]},
+            "type": "Section",
+        })
+    return rows, totals
+
+
+def quickbooks_payload(months: int = 24, accounts: int = 30, depth: int = 3,
+                       start_year: int = 2022, fanout: int = 3, seed: int = 7) -> Dict[str, Any]:
+    """
+    A QuickBooks ProfitAndLoss payload with `accounts` leaves per section nested `depth` deep.
+    """
+    rng = random.Random(seed)
+    cal = month_range(start_year, months)
+    cols = [{"ColTitle": "", "ColType": "Account", "MetaData": [{"Name": "ColKey", "Value": "account"}]}]
+    for s, e, title in cal:
+        cols.append({"ColTitle": title, "ColType": "Money", "MetaData": [
+            {"Name": "StartDate", "Value": s}, {"Name": "EndDate", "Value": e}, {"Name": "ColKey", "Value": title}]})
+    cols.append({"ColTitle": "Total", "ColType": "Money", "MetaData": [{"Name": "ColKey", "Value": "total"}]})
+
+    counter = [0]
+    rows = []
+    for title, group, stem in QB_SECTIONS:
+        child_rows, totals = _qb_tree(rng, stem, accounts, depth, months, counter, fanout)
+        rows.append({
+            "Header": {"ColData": [{"value": title}] + [{"value": ""}] * (months + 1)},
+            "Rows": {"Row": child_rows},
+            "Summary": {"ColData": [{"value": f"Total {title}"}]
+                        + [{"value": _qb_money(v)} for v in totals]
+                        + [{"value": _qb_money(sum(totals))}]},
+            "type": "Section", "group": group,
+        })
+    return {"data": {
+        "Header": {"ReportName": "ProfitAndLoss", "StartPeriod": cal[0][0], "EndPeriod": cal[-1][1],
+                   "SummarizeColumnsBy": "Month", "Currency": "USD"},
+        "Columns": {"Column": cols},
+        "Rows": {"Row": rows},
+    }}
+
+
+def _rf_tree(rng: random.Random, name: str, leaves: int, depth: int, counter: List[int], fanout: int) -> dict:
+    """
+    Build a nested Rootfi line item whose value is the sum of its children.
+    """
+    counter[0] += 1
+    node: Dict[str, Any] = {"name": name, "account_id": str(3553975000000000000 + counter[0])}
+    if depth <= 1 or leaves <= 1:
+        if leaves <= 1:
+            node["value"] = round(rng.uniform(100, 10000), 2)
+            return node
+        kids = [_rf_tree(rng, f"{name} {i + 1}", 1, 1, counter, fanout) for i in range(leaves)]
+    else:
+        kids = [_rf_tree(rng, f"{name} {i + 1}", n, depth - 1, counter, fanout)
+                for i, n in enumerate(_split(leaves, fanout))]
+    node["value"] = round(sum(k["value"] for k in kids), 2)
+    node["line_items"] = kids
+    return node
+
+
+def rootfi_payload(months: int = 24, accounts: int = 30, depth: int = 3,
+                   start_year: int = 2022, fanout: int = 3, seed: int = 11) -> Dict[str, Any]:
+    """
+    A Rootfi payload: one period record per month with nested line-item trees.
+    """
+    rng = random.Random(seed)
+    periods = []
+    for i, (s, e, _) in enumerate(month_range(start_year, months)):
+        counter = [0]
+        p: Dict[str, Any] = {
+            "rootfi_id": 300000 + i, "rootfi_company_id": 15151,
+            "rootfi_created_at": f"{e}T12:00:00.000Z", "rootfi_updated_at": f"{e}T12:00:00.000Z",
+            "rootfi_deleted_at": None, "platform_id": f"{s}_{e}",
+            "period_start": s, "period_end": e,
+        }
+        totals = {}
+        for key, root in RF_SECTIONS:
+            tree = _rf_tree(rng, root, accounts, depth, counter, fanout)
+            p[key] = [tree]
+            totals[key] = tree["value"]
+        p["gross_profit"] = round(totals["revenue"] - totals["cost_of_goods_sold"], 2)
+        p["net_profit"] = round(p["gross_profit"] - totals["operating_expenses"], 2)
+        periods.append(p)
+    return {"data": periods}
@@ -1,6 +1,7 @@
 import os
 import json
 import pathlib
+import tempfile
 import pytest
 
 # Test mode: 'live' (default) or 'inproc' for different test environments
@@ -8,6 +9,54 @@ TEST_MODE = os.getenv("TEST_MODE", "live")  # live | inproc
 # Base URL for API requests
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 
+if TEST_MODE == "inproc":
+    # Must happen before anything imports app.config: point the app at a throwaway DB,
+    # swap the LLM for the deterministic stub, and keep background threads out of the way.
+    os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="kudwa_test_"), "test.db"))
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("LLM_STUB_LATENCY_MS", "20")
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    os.environ.setdefault("AUTO_INGEST", "0")
+    os.environ.setdefault("TRACE_COMPACT_INTERVAL_S", "0")
+
+# Mark for tests that need the in-process app (stub LLM, perf budgets)
+inproc_only = pytest.mark.skipif(TEST_MODE != "inproc", reason="requires TEST_MODE=inproc")
+
+
+class LiveClient:
+    """
+    Minimal requests-based client with the same call shape as Starlette's TestClient.
+    """
+
+    def __init__(self, base_url: str):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def get(self, path: str, **kw):
+        kw.setdefault("timeout", 30)
+        return self.session.get(f"{self.base_url}{path}", **kw)
+
+    def post(self, path: str, **kw):
+        kw.setdefault("timeout", 30)
+        return self.session.post(f"{self.base_url}{path}", **kw)
+
+
+@pytest.fixture(scope="session")
+def api():
+    """
+    Pytest fixture providing an HTTP client for the API.
+    'live' talks to BASE_URL; 'inproc' boots app.main.app in this process
+    (startup hooks included) against a temp SQLite DB.
+    """
+    if TEST_MODE == "inproc":
+        from fastapi.testclient import TestClient
+        from app.main import app
+        with TestClient(app) as client:
+            yield client
+    else:
+        yield LiveClient(BASE_URL)
+
 
 @pytest.fixture(scope="session")
 def test_data_dir() -> pathlib.Path:
@@ -22,23 +71,47 @@ def test_data_dir() -> pathlib.Path:
 
 
 @pytest.fixture(scope="session")
-def ensure_ingested(test_data_dir):
+def ensure_ingested(api, test_data_dir):
     """
     Pytest fixture to ensure test data is ingested into the API before tests run.
-    Posts QuickBooks and Rootfi datasets to the API and asserts success.
+    Posts QuickBooks and Rootfi datasets to the API once per session and asserts success.
     Returns the API responses for both ingests.
     """
-    import requests
-
     # Load test datasets
     qb_json = json.loads((test_data_dir / "data_set_1.json").read_text())
     rf_json = json.loads((test_data_dir / "data_set_2.json").read_text())
 
     def _post(path, payload):
-        return requests.post(f"{BASE_URL}{path}", json={"payload": payload}, timeout=30)
+        return api.post(path, json={"payload": payload})
 
     r1 = _post("/ingest/quickbooks", qb_json)
     assert r1.status_code == 200, r1.text
     r2 = _post("/ingest/rootfi", rf_json)
     assert r2.status_code == 200, r2.text
-    return {"qb": r1.json(), "rf": r2.json()}
\ No newline at end of file
+    return {"qb": r1.json(), "rf": r2.json()}
+
+
+@pytest.fixture()
+def empty_con():
+    """
+    Pytest fixture providing a fresh in-memory database with the full schema and no data.
+    """
+    import sqlite3
+    from app.db.db import init_db
+    c = sqlite3.connect(":memory:")
+    c.row_factory = sqlite3.Row
+    init_db(c)
+    return c
+
+
+@pytest.fixture()
+def con(empty_con, test_data_dir):
+    """
+    Pytest fixture providing an in-memory database with both test datasets ingested,
+    for service- and repository-level tests that bypass the API.
+    """
+    from app.parsers.quickbooks import ingest_quickbooks
+    from app.parsers.rootfi import ingest_rootfi
+    ingest_quickbooks(empty_con, json.loads((test_data_dir / "data_set_1.json").read_text()))
+    ingest_rootfi(empty_con, json.loads((test_data_dir / "data_set_2.json").read_text()))
+    return empty_con
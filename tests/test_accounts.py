@@ -0,0 +1,125 @@
+import json
+import sqlite3
+
+import pytest
+
+from app.db.db import init_db
+
+NAMED_COLS = "period_start, period_end, month_key, source, account, category, kind, amount"
+
+
+def test_accounts_are_deduplicated_and_linked(con):
+    """
+    Test that each account is stored once and nested Rootfi items point at their parent.
+    """
+    n_facts, n_accounts = con.execute(
+        "SELECT (SELECT COUNT(*) FROM facts), (SELECT COUNT(*) FROM accounts)"
+    ).fetchone()
+    assert n_accounts < n_facts / 10
+    row = con.execute(
+        "SELECT c.leaf_name, c.account_id, p.full_path AS parent FROM accounts c JOIN accounts p ON p.id = c.parent_id "
+        "WHERE c.source='rootfi' AND c.full_path = ?",
+        ("revenue / Business Revenue / Professional Income / Technical Service",),
+    ).fetchone()
+    assert row["leaf_name"] == "Technical Service"
+    assert row["account_id"] == "3553975000000090367"
+    assert row["parent"] == "revenue / Business Revenue / Professional Income"
+    # QuickBooks rows link to their enclosing group headers
+    assert con.execute(
+        "SELECT COUNT(*) FROM accounts WHERE source='quickbooks' AND parent_id IS NOT NULL"
+    ).fetchone()[0] > 0
+
+
+def test_legacy_facts_table_is_migrated(con):
+    """
+    Test that a database with account text in every fact row is migrated to the accounts layout.
+    """
+    expected = [tuple(r) for r in con.execute(f"SELECT id, {NAMED_COLS} FROM facts_named ORDER BY id")]
+    legacy = sqlite3.connect(":memory:")
+    legacy.row_factory = sqlite3.Row
+    legacy.executescript(
+        "CREATE TABLE facts (id INTEGER PRIMARY KEY, period_start TEXT, period_end TEXT, month_key TEXT,"
+        " source TEXT, account TEXT, category TEXT, kind TEXT, amount REAL);"
+        "CREATE INDEX ix_facts_month ON facts(month_key); CREATE INDEX ix_facts_src ON facts(source);"
+    )
+    legacy.executemany("INSERT INTO facts VALUES(?,?,?,?,?,?,?,?,?)", expected)
+    legacy.commit()
+    init_db(legacy)
+    assert [tuple(r) for r in legacy.execute(f"SELECT id, {NAMED_COLS} FROM facts_named ORDER BY id")] == expected
+    assert legacy.execute("SELECT name FROM sqlite_master WHERE name='facts_legacy'").fetchone() is None
+
+
+def test_hierarchy_and_closure(con):
+    """
+    Test depth/is_leaf/closure bookkeeping, and that a full rebuild reproduces the incremental one.
+    """
+    from app.repositories.accounts import rebuild_hierarchy
+    row = con.execute(
+        "SELECT depth, is_leaf FROM accounts WHERE source='rootfi' AND full_path=?",
+        ("revenue / Business Revenue / Professional Income",),
+    ).fetchone()
+    assert (row["depth"], row["is_leaf"]) == (1, 0)
+    snapshot = lambda: (
+        sorted(tuple(r) for r in con.execute("SELECT * FROM account_closure")),
+        sorted(tuple(r) for r in con.execute("SELECT id, parent_id, depth, is_leaf FROM accounts")),
+    )
+    before = snapshot()
+    rebuild_hierarchy(con)
+    assert snapshot() == before
+
+
+def test_leaf_and_level_rollups_do_not_double_count(con):
+    """
+    Test that leaf-only and level-N totals agree, and that level 0 matches a drill-down per top-level item.
+    """
+    from app.repositories.accounts import account_totals, drilldown
+    leaf = account_totals(con, "revenue", 2023, "rootfi", None, True, 1000)["rows"]
+    every = account_totals(con, "revenue", 2023, "rootfi", None, False, 1000)["rows"]
+    level0 = account_totals(con, "revenue", 2023, "rootfi", 0, False, 1000)["rows"]
+    total_leaf = sum(r["amount"] for r in leaf)
+    assert sum(r["amount"] for r in level0) == pytest.approx(total_leaf)
+    assert sum(r["amount"] for r in every) > total_leaf
+    assert all(r["depth"] == 0 for r in level0)
+    for r in level0:
+        dd = drilldown(con, r["account"], "rootfi", 2023)
+        assert dd["total"] == pytest.approx(r["amount"]) and len(dd["months"]) == 12
+
+
+def test_account_endpoints(api, ensure_ingested):
+    """
+    Test the account listing, totals and drill-down endpoint shapes.
+    """
+    r = api.get("/api/v1/accounts", params={"source": "rootfi", "level": 0})
+    assert r.status_code == 200, r.text
+    rows = r.json()["rows"]
+    assert rows and all(x["depth"] == 0 for x in rows)
+    r = api.get("/api/v1/accounts/totals", params={"category": "revenue", "level": 1})
+    assert r.status_code == 200 and r.json()["leaf_only"] is True
+    r = api.get("/api/v1/accounts/drilldown", params={"account": rows[0]["leaf_name"], "source": "rootfi"})
+    assert r.status_code == 200 and r.json()["matched"]
+    r = api.get("/api/v1/expenses/top_increase", params={"year": 2023, "leaf_only": True})
+    assert r.status_code == 200 and "top" in r.json()
+
+
+def test_failed_write_leaves_no_accounts(empty_con, test_data_dir, monkeypatch):
+    """
+    Test new accounts are registered in the facts transaction: a failed write stores none of
+    them, and a retry then loads the same hierarchy as a clean load.
+    """
+    from app.parsers import report
+    from app.parsers.rootfi import ingest_rootfi
+    payload = json.loads((test_data_dir / "data_set_2.json").read_text())
+
+    def _fail(*_):
+        raise sqlite3.OperationalError("disk I/O error")
+    with monkeypatch.context() as m:
+        m.setattr(report, "upsert_metrics", _fail)
+        with pytest.raises(sqlite3.OperationalError):
+            ingest_rootfi(empty_con, payload)
+    assert empty_con.execute("SELECT (SELECT COUNT(*) FROM accounts) + (SELECT COUNT(*) FROM account_closure)").fetchone()[0] == 0
+    ingest_rootfi(empty_con, payload)
+    row = empty_con.execute(
+        "SELECT depth, is_leaf FROM accounts WHERE source='rootfi' AND full_path=?",
+        ("revenue / Business Revenue / Professional Income",),
+    ).fetchone()
+    assert (row["depth"], row["is_leaf"]) == (1, 0)
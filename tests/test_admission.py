@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import pytest
+
+from conftest import inproc_only
+from app.services import admission
+from app.services.admission import CircuitBreaker, LLMGate, RateLimiter, Rejected
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_rate_limiter_token_bucket():
+    """
+    Test a client gets its burst, then one request per refill interval, independently of others.
+    """
+    clock = Clock()
+    rl = RateLimiter(rate_per_s=2.0, burst=3, max_clients=2, clock=clock)
+    assert [rl.check("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert rl.check("a") == pytest.approx(0.5)
+    assert rl.check("b") == 0.0
+    clock.t = 0.5
+    assert rl.check("a") == 0.0 and rl.check("a") > 0
+    rl.check("c")
+    assert len(rl) == 2  # least recently seen client ("b") forgotten
+
+
+def test_circuit_breaker_transitions():
+    """
+    Test the breaker opens after N consecutive failures, lets one probe through after the
+    cooldown, and closes on its success or reopens on its failure.
+    """
+    clock = Clock()
+    br = CircuitBreaker(failures=3, cooldown_s=10.0, clock=clock)
+    br.record_failure(); br.record_success(); br.record_failure(); br.record_failure()
+    assert br.state == br.CLOSED and br.allow()
+    br.record_failure()
+    assert br.state == br.OPEN and br.is_open() and not br.allow()
+    clock.t = 10.0
+    assert not br.is_open() and br.allow() and br.state == br.HALF_OPEN
+    assert br.is_open() and not br.allow()  # only one probe
+    br.record_failure()
+    assert br.state == br.OPEN and not br.allow()
+    clock.t = 20.0
+    assert br.allow()
+    br.record_success()
+    assert br.state == br.CLOSED and br.failures == 0
+
+
+def test_llm_gate_bounds_concurrency_and_queue():
+    """
+    Test the gate runs at most `limit` calls at once, queues up to `queue_size`, and refuses
+    the rest immediately with 503 and a Retry-After.
+    """
+    gate = LLMGate(limit=1, queue_size=1, queue_timeout_s=30.0)
+    release = threading.Event()
+    peak = []
+
+    def call(i):
+        peak.append(gate.in_flight)
+        release.wait(5)
+        return i
+
+    async def scenario():
+        first = asyncio.ensure_future(gate.run(call, 1))
+        second = asyncio.ensure_future(gate.run(call, 2))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Rejected) as e:
+            await gate.run(call, 3)
+        assert e.value.status == 503 and e.value.reason == "queue_full"
+        assert int(e.value.headers()["Retry-After"]) >= 1
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [1, 2]
+    assert max(peak) == 1 and gate.in_flight == gate.queued == 0
+
+
+@inproc_only
+def test_nlq_admission_endpoint(api, ensure_ingested, monkeypatch):
+    """
+    Test LLM-bound questions get 429 + Retry-After once the client's bucket is empty (rule-based
+    ones are not limited), and a rule-based-only answer while the breaker is open.
+    """
+    monkeypatch.setattr(admission, "RATE_LIMITER", RateLimiter(rate_per_s=0.01, burst=1))
+    llm_q = {"query": "Summarize our 2024 financial performance in one sentence."}
+    headers = {"X-API-Key": "client-1"}
+    assert api.post("/api/v1/nlq", json=llm_q, headers=headers).status_code == 200
+    r = api.post("/api/v1/nlq", json=llm_q, headers=headers)
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    assert api.post("/api/v1/nlq", json=llm_q, headers={"X-API-Key": "client-2"}).status_code == 200
+    r = api.post("/api/v1/nlq", json={"query": "What was the total profit in Q1 2024?"}, headers=headers)
+    assert r.status_code == 200
+
+    breaker = CircuitBreaker(failures=1, cooldown_s=60.0)
+    breaker.record_failure()
+    monkeypatch.setattr(admission, "BREAKER", breaker)
+    r = api.post("/api/v1/nlq", json=llm_q, headers={"X-API-Key": "client-3"})
+    assert r.status_code == 200
+    assert {"event": "llm_skipped", "reason": "circuit_open"} in r.json()["trace"]
+    metrics = api.get("/metrics").text
+    assert 'fa_llm_shed_total{reason="rate_limited"}' in metrics
+    assert "fa_llm_breaker_state 2.0" in metrics
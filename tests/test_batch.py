@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+from app.repositories.facts import expenses_increase_top
+from app.repositories.metrics import range_totals, summary, trend
+from app.services.analytics import anomalies
+from app.config import settings
+from app.services import cache
+from app.services.batch import run_batch
+
+METRICS = ("revenue", "cogs", "gross_profit", "expenses", "net_profit")
+
+
+def _dashboard(year):
+    return [
+        {"id": "summary", "op": "summary", "params": {"year": year}},
+        *({"id": f"trend.{m}", "op": "trend", "params": {"metric": m, "year": year}} for m in METRICS),
+        {"id": "anomalies", "op": "anomalies", "params": {"metric": "revenue", "year": year}},
+        {"id": "top", "op": "top_increase", "params": {"year": year}},
+        {"id": "top.again", "op": "top_increase", "params": {"year": year, "limit": 5}},
+        {"id": "range", "op": "range", "params": {"from": f"{year}-01", "to": f"{year}-06"}},
+    ]
+
+
+def test_batch_matches_individual_calls(con):
+    """
+    Test every sub-query result equals its standalone call, with one metrics scan for all of them.
+    """
+    out = run_batch(con, _dashboard(2024))
+    by_id = {r["id"]: r for r in out["results"]}
+    assert [r["id"] for r in out["results"]] == [q["id"] for q in _dashboard(2024)]
+    assert all(r["ok"] for r in out["results"])
+    assert by_id["summary"]["result"] == summary(con, 2024, None)
+    for m in METRICS:
+        assert by_id[f"trend.{m}"]["result"] == trend(con, m, 2024, None)
+    assert by_id["anomalies"]["result"] == anomalies(con, "revenue", 2024, None)
+    assert by_id["top"]["result"] == by_id["top.again"]["result"] == expenses_increase_top(con, 2024)
+    assert by_id["range"]["result"] == range_totals(con, "2024-01", "2024-06", None)
+    assert out["plan"] == {"queries": 10, "metrics_scans": 1, "units": 3, "concurrent": False}
+
+
+def test_batch_reads_warm_response_cache(con, monkeypatch):
+    """
+    Test summaries and top increases already in the response cache are not recomputed.
+    """
+    warm = {"summary": cache.cached_summary(con, 2024, None),
+            "top": cache.cached_top_increase(con, 2024)}
+
+    def _recompute(*_):
+        raise AssertionError("recomputed a cached result")
+    monkeypatch.setattr(cache, "summary", _recompute)
+    monkeypatch.setattr(cache, "top_increase", _recompute)
+    out = run_batch(con, _dashboard(2024))
+    by_id = {r["id"]: r for r in out["results"]}
+    assert all(r["ok"] for r in out["results"]), out["results"]
+    assert by_id["summary"]["result"] == warm["summary"] and by_id["top"]["result"] == warm["top"]
+
+
+def test_batch_workers_open_odd_paths_read_only(con, tmp_path, monkeypatch):
+    """
+    Test worker connections open a database file whose name has URI metacharacters.
+    """
+    path = str(tmp_path / "odd?name#1.db")
+    file_con = sqlite3.connect(path, check_same_thread=False)  # shared like the app connection
+    file_con.row_factory = sqlite3.Row
+    con.backup(file_con)
+    monkeypatch.setattr(settings, "batch_workers", 4)
+    out = run_batch(file_con, _dashboard(2024), db_path=path)
+    assert out["plan"]["concurrent"] and all(r["ok"] for r in out["results"]), out["results"]
+    assert out["results"][-1]["result"] == range_totals(con, "2024-01", "2024-06", None)
+
+
+def test_batch_validation(con):
+    """
+    Test malformed sub-queries are rejected up front with the offending label.
+    """
+    with pytest.raises(ValueError, match="unknown op"):
+        run_batch(con, [{"op": "drop_tables"}])
+    with pytest.raises(ValueError, match="query t: bad metric"):
+        run_batch(con, [{"id": "t", "op": "trend", "params": {"metric": "ebitda"}}])
+    with pytest.raises(ValueError, match="requires year"):
+        run_batch(con, [{"op": "top_increase"}])
+    with pytest.raises(ValueError, match="unknown param"):
+        run_batch(con, [{"op": "summary", "params": {"yaer": 2024}}])
+
+
+def test_batch_endpoint(api, ensure_ingested):
+    """
+    Test /batch returns the same payloads as the individual GET endpoints.
+    """
+    r = api.post("/api/v1/batch", json={"queries": _dashboard(2024)})
+    assert r.status_code == 200, r.text
+    out = r.json()
+    by_id = {x["id"]: x["result"] for x in out["results"]}
+    assert out["plan"]["metrics_scans"] == 1
+    assert by_id["summary"] == api.get("/api/v1/metrics/summary?year=2024").json()
+    assert by_id["trend.expenses"] == api.get("/api/v1/metrics/trend?metric=expenses&year=2024").json()
+    assert by_id["top"] == api.get("/api/v1/expenses/top_increase?year=2024").json()
+    assert by_id["range"] == api.get("/api/v1/metrics/range?from=2024-01&to=2024-06").json()
+    assert api.post("/api/v1/batch", json={"queries": [{"op": "nope"}]}).status_code == 422
+    assert api.post("/api/v1/batch", json={"queries": []}).status_code == 422
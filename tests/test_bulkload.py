@@ -0,0 +1,106 @@
+import json
+import shutil
+import sqlite3
+
+from app import bulkload
+
+
+def _inputs(tmp_path, test_data_dir):
+    src = tmp_path / "exports" / "2024"
+    src.mkdir(parents=True)
+    for name in ("data_set_1.json", "data_set_2.json"):
+        shutil.copy(test_data_dir / name, src / name)
+    (tmp_path / "exports" / "broken.json").write_text("{not json")
+    return tmp_path / "exports"
+
+
+def test_bulkload_loads_resumes_and_records_failures(tmp_path, test_data_dir, capsys):
+    """
+    Test a parallel load writes facts and registers each file, and a re-run skips loaded files.
+    """
+    exports = _inputs(tmp_path, test_data_dir)
+    db = str(tmp_path / "bulk.db")
+
+    rc = bulkload.main([str(exports), "--db", db, "--workers", "2", "--quiet"])
+    stats = json.loads(capsys.readouterr().out)
+    assert rc == 1  # broken.json failed
+    assert (stats["files"], stats["loaded"], stats["failed"], stats["skipped"]) == (3, 2, 1, 0)
+
+    con = sqlite3.connect(db)
+    facts = con.execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+    assert facts == stats["facts"] > 0
+    by_source = dict(con.execute(
+        "SELECT a.source, COUNT(*) FROM facts f JOIN accounts a ON a.id = f.account_id GROUP BY a.source"
+    ).fetchall())
+    assert set(by_source) == {"quickbooks", "rootfi"}
+    batches = {r[0]: r[1:] for r in con.execute("SELECT source, status, facts FROM ingest_batches WHERE status='done'")}
+    assert batches["quickbooks"] == ("done", by_source["quickbooks"])
+    assert batches["rootfi"] == ("done", by_source["rootfi"])
+    assert con.execute("SELECT COUNT(*) FROM ingest_batches WHERE status='failed' AND error IS NOT NULL").fetchone()[0] == 1
+    assert con.execute("SELECT COUNT(DISTINCT source) FROM metrics").fetchone()[0] == 2
+
+    rc = bulkload.main([str(exports / "2024" / "*.json"), "--db", db, "--workers", "2", "--quiet"])
+    stats = json.loads(capsys.readouterr().out)
+    assert rc == 0
+    assert (stats["skipped"], stats["loaded"]) == (2, 0)
+    assert con.execute("SELECT COUNT(*) FROM facts").fetchone()[0] == facts
+
+
+def test_bulkload_dry_run_parses_without_db(tmp_path, test_data_dir, capsys):
+    """
+    Test --dry-run reports parse throughput and never creates the database.
+    """
+    exports = _inputs(tmp_path, test_data_dir)
+    db = tmp_path / "never.db"
+    rc = bulkload.main([str(exports / "2024"), "--db", str(db), "--workers", "1", "--dry-run"])
+    out = capsys.readouterr()
+    stats = json.loads(out.out)
+    assert rc == 0 and stats["dry_run"] is True
+    assert stats["loaded"] == 2 and stats["facts"] > 0 and stats["mb_per_s"] is not None
+    assert "parsed" in out.err
+    assert not db.exists()
+
+
+def test_bulkload_write_failure_is_recorded_and_load_continues(tmp_path, test_data_dir, capsys, monkeypatch):
+    """
+    Test a file whose write fails is rolled back and registered as failed, the other files
+    still load, and a re-run retries only that file.
+    """
+    exports = _inputs(tmp_path, test_data_dir) / "2024"
+    db = str(tmp_path / "bulk.db")
+    real = bulkload.write_report
+
+    def failing(con, rep, batch=None, sync=None):
+        if rep.source == "rootfi":
+            raise sqlite3.OperationalError("database is locked")
+        return real(con, rep, batch, sync)
+
+    monkeypatch.setattr(bulkload, "write_report", failing)
+    rc = bulkload.main([str(exports), "--db", db, "--workers", "2", "--quiet"])
+    stats = json.loads(capsys.readouterr().out)
+    assert rc == 1 and (stats["loaded"], stats["failed"]) == (1, 1)
+    con = sqlite3.connect(db)
+    rows = dict(con.execute("SELECT path, status FROM ingest_batches").fetchall())
+    assert rows == {str(exports / "data_set_1.json"): "done", str(exports / "data_set_2.json"): "failed"}
+    assert "locked" in con.execute("SELECT error FROM ingest_batches WHERE status='failed'").fetchone()[0]
+
+    monkeypatch.setattr(bulkload, "write_report", real)
+    rc = bulkload.main([str(exports), "--db", db, "--workers", "2", "--quiet"])
+    stats = json.loads(capsys.readouterr().out)
+    assert rc == 0 and (stats["files"], stats["skipped"], stats["loaded"]) == (2, 1, 1)
+    assert con.execute("SELECT COUNT(*) FROM ingest_batches WHERE status='done'").fetchone()[0] == 2
+
+
+def test_bulkload_loads_identical_files_once(tmp_path, test_data_dir, capsys):
+    """
+    Test two files with the same content in one run are loaded once, even with --force.
+    """
+    src = tmp_path / "dups"
+    src.mkdir()
+    for name in ("a.json", "b.json"):
+        shutil.copy(test_data_dir / "data_set_1.json", src / name)
+    db = str(tmp_path / "dups.db")
+    assert bulkload.main([str(src), "--db", db, "--workers", "2", "--quiet", "--force"]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert (stats["loaded"], stats["skipped"]) == (1, 1)
+    assert sqlite3.connect(db).execute("SELECT COUNT(*) FROM facts").fetchone()[0] == stats["facts"] > 0
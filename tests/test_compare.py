@@ -0,0 +1,75 @@
+import pytest
+
+from app.repositories.metrics import range_totals, sum_between_sql, upsert_metric
+from app.services.compare import compare
+from app.services.nlq import _handle_rule_based
+
+
+def test_quarter_series_matches_direct_sums(con):
+    """
+    Test QoQ, YoY and TTM values against independent range sums for every quarter.
+    """
+    rows = compare(con, "quarter", ["revenue", "expenses"], "rootfi")["rows"]
+    assert len(rows) >= 8
+    by_period = {r["period"]: r for r in rows}
+    for r in rows:
+        y, q = int(r["period"][:4]), int(r["period"][-1])
+        direct = sum_between_sql(con, 3 * q - 2, 3 * q, y, "rootfi")
+        assert r["revenue"]["value"] == pytest.approx(direct["revenue"], abs=0.01)
+        prev = by_period.get(f"{y - (q == 1):04d}-Q{(q - 2) % 4 + 1}")
+        assert r["revenue"]["prev"] == (prev["revenue"]["value"] if prev else None)
+        year_ago = by_period.get(f"{y - 1:04d}-Q{q}")
+        assert r["expenses"]["yoy_prev"] == (year_ago["expenses"]["value"] if year_ago else None)
+        first = f"{y - 1:04d}-{3 * q + 1:02d}" if q < 4 else f"{y:04d}-01"
+        ttm = range_totals(con, first, f"{y:04d}-{3 * q:02d}", "rootfi")
+        assert r["revenue"]["ttm"] == pytest.approx(ttm["totals"]["revenue"], abs=0.01)
+        assert r["ttm_months"] == ttm["months_with_data"]
+
+
+def test_gaps_are_not_bridged_and_range_filters(empty_con):
+    """
+    Test a missing month gives no MoM base (RANGE frames, not row offsets) and from/to only trims output.
+    """
+    c = empty_con
+    for pe, rev in (("2023-01-31", 100.0), ("2023-02-28", 110.0), ("2023-04-30", 90.0), ("2024-02-29", 121.0)):
+        upsert_metric(c, pe, "rootfi", rev, 0.0, 0.0, None)
+    rows = {r["period"]: r for r in compare(c, "month", ["revenue"])["rows"]}
+    assert rows["2023-02"]["revenue"]["pct"] == 10.0
+    assert rows["2023-04"]["revenue"]["prev"] is None
+    assert rows["2024-02"]["revenue"]["yoy_prev"] == 110.0 and rows["2024-02"]["revenue"]["yoy_pct"] == 10.0
+    assert rows["2024-02"]["revenue"]["ttm"] == 211.0 and rows["2024-02"]["ttm_months"] == 2
+    only = compare(c, "month", ["revenue"], None, "2024-01", "2024-12")["rows"]
+    assert [r["period"] for r in only] == ["2024-02"] and only[0]["revenue"]["yoy_prev"] == 110.0
+    with pytest.raises(ValueError):
+        compare(c, "week")
+
+
+def test_nlq_period_intents(con):
+    """
+    Test the QoQ / YoY / TTM intents and cross-year quarter comparison route to the compare service.
+    """
+    answer, data, trace = _handle_rule_based(con, "Revenue QoQ 2024")
+    assert trace[0]["tool"] == "period_over_period" and data["grain"] == "quarter"
+    assert answer.startswith("Revenue QoQ 2024") and len(data["rows"]) == 4
+    _, data, trace = _handle_rule_based(con, "year over year net profit")
+    assert trace[0]["args"] == {"grain": "year", "metric": "net_profit", "year": None}
+    answer, data, trace = _handle_rule_based(con, "What is our trailing twelve months revenue?")
+    assert trace[0]["tool"] == "ttm" and data["ttm"] > 0 and "TTM revenue" in answer
+    _, data, trace = _handle_rule_based(con, "Compare Q4 2023 with Q1 2024")
+    assert trace[0]["tool"] == "compare_quarters" and (data["year1"], data["year2"]) == (2023, 2024)
+    assert data["q2"]["revenue"] == pytest.approx(sum_between_sql(con, 1, 3, 2024, None)["revenue"], abs=0.01)
+
+
+def test_metrics_compare_endpoint(api, ensure_ingested):
+    """
+    Test /metrics/compare shape and validation.
+    """
+    r = api.get("/api/v1/metrics/compare?grain=quarter&year=2024&metrics=revenue,expenses")
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert out["grain"] == "quarter" and out["pop"] == "qoq" and out["metrics"] == ["revenue", "expenses"]
+    for row in out["rows"]:
+        assert row["period"].startswith("2024-Q")
+        assert set(row["revenue"]) == {"value", "prev", "change", "pct", "yoy_prev", "yoy_change", "yoy_pct", "ttm"}
+    assert api.get("/api/v1/metrics/compare?grain=week").status_code == 422
+    assert api.get("/api/v1/metrics/compare?metrics=ebitda").status_code == 422
@@ -1,24 +1,20 @@
-import os, math
-import requests
+import math
 
-# Base URL for API requests (default: localhost)
-BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 
-
-def _get(url):
+def _get(api, url):
     """
     Helper to GET a URL and assert HTTP 200, returning the JSON response.
     """
-    r = requests.get(f"{BASE_URL}{url}", timeout=30)
+    r = api.get(url)
     assert r.status_code == 200, r.text
     return r.json()
 
 
-def test_summary_consistency(ensure_ingested):
+def test_summary_consistency(api, ensure_ingested):
     """
     Test that gross_profit ≈ revenue - cogs for each period in the summary.
     """
-    out = _get("/api/v1/metrics/summary")
+    out = _get(api, "/api/v1/metrics/summary")
     rows = out["rows"]
     assert len(rows) > 0
     for r in rows:
@@ -28,40 +24,50 @@ def test_summary_consistency(ensure_ingested):
         assert math.isclose(gp, rev - cgs, rel_tol=1e-9, abs_tol=1e-6)
 
 
-def test_trend_shape(ensure_ingested):
+def test_trend_shape(api, ensure_ingested):
     """
     Test that the trend endpoint returns a non-empty list of points with correct fields.
     """
-    t = _get("/api/v1/metrics/trend?metric=revenue")
+    t = _get(api, "/api/v1/metrics/trend?metric=revenue")
     assert t["metric"] == "revenue"
     assert isinstance(t["points"], list) and len(t["points"]) > 0
     for p in t["points"]:
         assert "period_end" in p and "value" in p
 
 
-def test_expense_increase_empty_year_returns_200():
+def test_expense_increase_empty_year_returns_200(api):
     """
     Test that requesting a year with no data returns HTTP 200 and an empty 'top' list.
     """
-    import requests, os
-    BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
     # Pick a year likely not in data; adjust if needed
-    r = requests.get(f"{BASE_URL}/api/v1/expenses/top_increase?year=2099", timeout=30)
+    r = api.get("/api/v1/expenses/top_increase?year=2099")
     assert r.status_code == 200, r.text
     body = r.json()
     assert set(body.keys()) >= {"year", "first_month", "last_month", "top"}
     assert body["top"] == []  # empty, not error
 
 
-def test_expense_increase_has_fields(ensure_ingested):
+def test_expense_increase_has_fields(api, ensure_ingested):
     """
     Test that the top expense increase endpoint always returns the correct shape and types.
     """
-    out = _get("/api/v1/metrics/summary")
+    out = _get(api, "/api/v1/metrics/summary")
     years = sorted({int(r["period_end"][0:4]) for r in out["rows"]})
     assert len(years) >= 1
     y = years[-1]
-    d = _get(f"/api/v1/expenses/top_increase?year={y}")
+    d = _get(api, f"/api/v1/expenses/top_increase?year={y}")
     # Must always have the shape and 200
     assert set(d.keys()) >= {"year", "first_month", "last_month", "top"}
-    assert isinstance(d["top"], list)
\ No newline at end of file
+    assert isinstance(d["top"], list)
+
+
+def test_ingest_rejects_malformed_body(api):
+    """
+    Test that the hand-decoded ingest body still answers bad input with a 422 validation error.
+    """
+    r = api.post("/ingest/quickbooks", data=b"{not json", headers={"content-type": "application/json"})
+    assert r.status_code == 422, r.text
+    assert r.json()["detail"][0]["loc"] == ["body"]
+    r = api.post("/ingest/rootfi", json={"payload": [1, 2]})
+    assert r.status_code == 422, r.text
+    assert r.json()["detail"][0]["loc"] == ["body", "payload"]
@@ -0,0 +1,79 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+from app.eval.eval_run import LLM_QS, LatencyHistogram, run_load
+
+SERVICE_S = 0.05
+LLM_QUESTIONS = {q for q, _ in LLM_QS}
+
+
+def _transport(shed_llm: bool = False) -> httpx.MockTransport:
+    """
+    Fake server: every NLQ takes SERVICE_S; LLM questions are shed with 429 when asked.
+    """
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/v1/obs/traces/recent":
+            return httpx.Response(200, json={"rows": [], "next_cursor": None})
+        await asyncio.sleep(SERVICE_S)
+        q = json.loads(request.content)["query"]
+        if q in LLM_QUESTIONS:
+            if shed_llm:
+                return httpx.Response(429, json={"detail": "rate_limited"}, headers={"Retry-After": "1"})
+            return httpx.Response(200, json={"answer": "x", "trace": [{"llm": "answered", "model": "m"}]})
+        return httpx.Response(200, json={"answer": "x", "trace": [{"tool": "get_total_profit"}]})
+    return httpx.MockTransport(handler)
+
+
+def _load(tmp_path, transport, **kw):
+    args = SimpleNamespace(**{"concurrency": 1, "rate": 0.0, "duration": 0.3, "llm_share": 0.0, **kw})
+    summary = asyncio.run(run_load("http://test", args, str(tmp_path / "r.csv"), str(tmp_path / "a.jsonl"),
+                                   str(tmp_path / "hdr.txt"), transport=transport))
+    rows = [json.loads(line) for line in (tmp_path / "a.jsonl").read_text().splitlines()][:-1]
+    return summary, rows
+
+
+def test_latency_histogram_percentiles():
+    """
+    Test percentiles are exact at 3 significant digits and never exceed the max.
+    """
+    h = LatencyHistogram()
+    for v in range(1, 1001):
+        h.record(float(v))
+    s = h.summary()
+    assert (s["count"], s["min"], s["max"]) == (1000, 1.0, 1000.0)
+    assert (s["p50"], s["p90"], s["p99"], s["p99.9"]) == (500.0, 900.0, 990.0, 999.0)
+    h.record(123456.0)
+    assert h.percentile(100) == 123456.0 and h.summary()["p50"] == 501.0
+    assert LatencyHistogram().summary()["p99"] is None
+
+
+def test_load_measures_from_scheduled_start(tmp_path):
+    """
+    Test that at a fixed rate the server cannot keep up with, latency includes the time a
+    request waited for its slot (coordinated omission), while closed-loop load does not.
+    """
+    _, rows = _load(tmp_path, _transport(), rate=50.0, duration=0.2)
+    lat = [r["latency_ms"] for r in rows]  # in completion order
+    assert len(lat) >= 10 and lat[0] < SERVICE_S * 1000 * 3
+    # Request i is scheduled at i*20 ms but served at ~(i+1)*50 ms
+    assert max(lat) > SERVICE_S * 1000 * 4
+
+    _, rows = _load(tmp_path, _transport(), duration=0.2)
+    assert all(r["latency_ms"] < SERVICE_S * 1000 * 3 for r in rows)
+
+
+def test_load_attributes_failures_to_route(tmp_path):
+    """
+    Test shed LLM questions count as llm-route errors with their status, not as 'other'.
+    """
+    summary, rows = _load(tmp_path, _transport(shed_llm=True), llm_share=0.5, duration=0.5)
+    llm = [r for r in rows if r["kind"] == "llm"]
+    assert llm and all(r["route"] == "llm" and r["status"] == 429 for r in llm)
+    groups = summary["groups"]
+    assert "route:other" not in groups
+    assert groups["route:llm"]["status"] == {"429": len(llm)} and groups["route:llm"]["error_rate"] == 1.0
+    assert groups["route:rb"]["error_rate"] == 0.0
+    assert summary["overall"]["status"]["429"] == len(llm)
@@ -0,0 +1,113 @@
+import copy
+import json
+
+import pytest
+
+from app.parsers.rootfi import ingest_rootfi
+
+
+@pytest.fixture()
+def payload(test_data_dir):
+    return json.loads((test_data_dir / "data_set_2.json").read_text())
+
+
+def _facts(con, pe=None):
+    q = "SELECT COUNT(*) FROM facts_named WHERE source = 'rootfi'" + (" AND period_end = ?" if pe else "")
+    return con.execute(q, (pe,) if pe else ()).fetchone()[0]
+
+
+def test_resync_skips_unchanged_periods(empty_con, payload):
+    """
+    Test a second upload of the same export writes nothing and reports every period as skipped.
+    """
+    n = len(payload["data"])
+    first = ingest_rootfi(empty_con, payload)
+    assert (first["updated"], first["skipped"], first["deleted"]) == (n, 0, 0)
+    facts = _facts(empty_con)
+    assert first["inserted_facts"] == facts > 0
+    assert first["watermarks"] == {"15151": max(p["rootfi_updated_at"] for p in payload["data"])}
+
+    again = ingest_rootfi(empty_con, payload)
+    assert (again["updated"], again["skipped"], again["inserted_facts"], again["periods"]) == (0, n, 0, [])
+    assert _facts(empty_con) == facts
+
+    full = ingest_rootfi(empty_con, payload, full=True)
+    assert full["updated"] == n and _facts(empty_con) == facts
+
+
+def test_changed_and_deleted_periods(empty_con, payload):
+    """
+    Test only a changed period is rewritten, soft deletes tombstone it, and older replays are ignored.
+    """
+    ingest_rootfi(empty_con, payload)
+    facts = _facts(empty_con)
+    p = payload["data"][3]
+    pe = p["period_end"]
+    untouched = empty_con.execute("SELECT MIN(id), MAX(id) FROM facts WHERE period_end != ?", (pe,)).fetchone()
+
+    newer = copy.deepcopy(payload)
+    newer["data"][3]["rootfi_updated_at"] = "2099-01-01T00:00:00.000Z"
+    newer["data"][3]["net_profit"] = 1234.5
+    out = ingest_rootfi(empty_con, newer)
+    assert (out["updated"], out["skipped"], out["periods"]) == (1, len(payload["data"]) - 1, [pe])
+    assert _facts(empty_con) == facts
+    assert tuple(empty_con.execute("SELECT MIN(id), MAX(id) FROM facts WHERE period_end != ?", (pe,)).fetchone()) == tuple(untouched)
+    assert empty_con.execute("SELECT net_profit FROM metrics WHERE source='rootfi' AND period_end=?", (pe,)).fetchone()[0] == 1234.5
+    assert out["watermarks"]["15151"] == "2099-01-01T00:00:00.000Z"
+
+    # The original export is older than what is stored now: nothing rolls back
+    assert ingest_rootfi(empty_con, payload)["updated"] == 0
+
+    gone = copy.deepcopy(newer)
+    gone["data"][3]["rootfi_deleted_at"] = "2099-02-01T00:00:00.000Z"
+    out = ingest_rootfi(empty_con, gone)
+    assert (out["deleted"], out["updated"]) == (1, 0)
+    assert _facts(empty_con, pe) == 0
+    assert empty_con.execute("SELECT COUNT(*) FROM metrics WHERE source='rootfi' AND period_end=?", (pe,)).fetchone()[0] == 0
+    assert empty_con.execute("SELECT COUNT(*) FROM reconciliation WHERE month_key=?", (pe[:7],)).fetchone()[0] == 0
+    assert ingest_rootfi(empty_con, gone)["deleted"] == 0
+
+    back = copy.deepcopy(newer)
+    back["data"][3]["rootfi_updated_at"] = "2099-03-01T00:00:00.000Z"
+    assert ingest_rootfi(empty_con, back)["updated"] == 1 and _facts(empty_con, pe) > 0
+
+
+def test_ingest_endpoint_reports_sync_counts(api, ensure_ingested, test_data_dir):
+    """
+    Test re-posting the Rootfi export through the API skips every period.
+    """
+    rf = json.loads((test_data_dir / "data_set_2.json").read_text())
+    r = api.post("/ingest/rootfi", json={"payload": rf})
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert (out["updated"], out["deleted"], out["skipped"]) == (0, 0, len(rf["data"]))
+    assert out["inserted_facts"] == 0 and out["watermarks"]
+
+
+def test_second_company_is_rejected(empty_con, payload):
+    """
+    Test a payload mixing two Rootfi companies, or for a company other than the stored one,
+    is rejected before it can delete or rewrite the stored company's months.
+    """
+    other = copy.deepcopy(payload)
+    for p in other["data"]:
+        p["rootfi_company_id"] = 99999
+        p["rootfi_id"] = f"other-{p['rootfi_id']}"
+        p["rootfi_updated_at"] = "2099-01-01T00:00:00.000Z"
+    mixed = copy.deepcopy(payload)
+    mixed["data"][3] = other["data"][3]
+    with pytest.raises(ValueError, match="mixes"):
+        ingest_rootfi(empty_con, mixed)
+    assert _facts(empty_con) == 0
+
+    ingest_rootfi(empty_con, payload)
+    facts = _facts(empty_con)
+    metrics = empty_con.execute("SELECT * FROM metrics WHERE source='rootfi' ORDER BY period_end").fetchall()
+    tomb = copy.deepcopy(other)
+    tomb["data"][3]["rootfi_deleted_at"] = "2099-02-01T00:00:00.000Z"
+    for bad in (other, tomb):
+        with pytest.raises(ValueError, match="holds rootfi company '15151'"):
+            ingest_rootfi(empty_con, bad, full=True)
+    assert _facts(empty_con) == facts
+    assert empty_con.execute("SELECT * FROM metrics WHERE source='rootfi' ORDER BY period_end").fetchall() == metrics
+    assert ingest_rootfi(empty_con, payload)["skipped"] == len(payload["data"])
@@ -0,0 +1,79 @@
+import time
+
+from app.services.intent import IntentClassifier, classifier, extract_slots, load_examples
+from app.services.nlq import _handle_rule_based
+
+# Wordings the regex rules miss, with the tool and args the classifier route should produce
+PARAPHRASES = [
+    ("What was profit for the first quarter of 2024", "get_total_profit", {"quarter": "Q1", "year": 2024}),
+    ("how much money did we make in Q3 2023", "get_total_profit", {"quarter": "Q3", "year": 2023}),
+    ("what were sales like month by month in 2023", "revenue_trend", {"year": 2023}),
+    ("which costs increased the most in 2024", "top_expense_increase", {"year": 2024}),
+    ("how does Q1 compare with Q2 2024", "compare_quarters", {"q1": "Q1", "q2": "Q2", "year": 2024, "year1": 2024, "year2": 2024}),
+    ("expenses quarter on quarter 2024", "period_over_period", {"grain": "quarter", "metric": "expenses", "year": 2024}),
+    ("net profit over the past 12 months", "ttm", {"metric": "net_profit", "year": None}),
+]
+# Open-ended questions that must still reach the LLM
+LLM_QUESTIONS = [
+    "Summarize our 2024 financial performance in one sentence with concrete numbers.",
+    "In one sentence: what drove margin changes across months in 2024?",
+    "Identify any unusual spikes or dips in 2024 and explain them in one sentence.",
+]
+
+
+def test_classifier_fits_bundled_set_and_is_fast():
+    """
+    Test the classifier learns the bundled questions, is deterministic, and scores a
+    question in well under a millisecond.
+    """
+    texts, labels = load_examples()
+    model = classifier()
+    assert sum(model.predict(t)[0] == y for t, y in zip(texts, labels)) / len(texts) > 0.95
+    assert IntentClassifier.fit(texts, labels).predict(texts[0]) == model.predict(texts[0])
+    q = "What was profit for the first quarter of 2024"
+    t0 = time.perf_counter()
+    for _ in range(200):
+        model.predict(q)
+    assert (time.perf_counter() - t0) / 200 * 1000.0 < 1.0
+
+
+def test_slot_extraction():
+    """
+    Test quarters, halves, years and grain are read from free wording.
+    """
+    s = extract_slots("compare the first and second quarter of 2024")
+    assert s.quarters == [1, 2] and s.years == [2024]
+    s = extract_slots("q4 2023 against quarter 1 2024")
+    assert s.quarters == [4, 1] and s.years == [2023, 2024]
+    assert extract_slots("profit for h2 2024").half == 2
+    assert extract_slots("how did net profit change from year to year").grain == "year"
+    assert extract_slots("percentage change in revenue each month of 2024").grain == "month"
+
+
+def test_classifier_routes_paraphrases_to_tools(con):
+    """
+    Test paraphrases the regexes miss are answered by the same tools, with the same answer
+    as the canonical wording, and open-ended questions still fall through to the LLM.
+    """
+    for q, tool, args in PARAPHRASES:
+        answer, _, trace = _handle_rule_based(con, q)
+        assert answer, q
+        assert trace[0]["tool"] == tool and trace[0]["args"] == args and trace[0]["via"] == "classifier", q
+    canonical = _handle_rule_based(con, "What was the total profit in Q1 2024?")
+    assert _handle_rule_based(con, PARAPHRASES[0][0])[0] == canonical[0]
+    assert "via" not in canonical[2][0]
+    for q in LLM_QUESTIONS:
+        answer, _, trace = _handle_rule_based(con, q)
+        assert answer is None and "classifier" in trace[0], q
+
+
+def test_llm_avoidance_reported(api, ensure_ingested):
+    """
+    Test classifier-routed questions skip the LLM and show up in the routing metrics.
+    """
+    r = api.post("/api/v1/nlq", json={"query": "What was profit for the first quarter of 2024"})
+    assert r.status_code == 200, r.text
+    assert any(t.get("via") == "classifier" for t in r.json()["trace"])
+    assert 'fa_nlq_routes_total{route="classifier"}' in api.get("/metrics").text
+    routing = api.get("/api/v1/obs/llm/stats?hours=2").json()["routing"]
+    assert routing["rule_based"] >= 1 and 0.0 < routing["llm_avoidance_rate"] <= 1.0
@@ -0,0 +1,21 @@
+import math
+
+import pytest
+
+from app.utils import jsonfast
+
+BACKENDS = ["json", pytest.param("orjson", marks=pytest.mark.skipif(jsonfast.orjson is None, reason="orjson not installed"))]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_non_finite_floats_encode_as_null(backend, monkeypatch):
+    """
+    Test both backends write NaN and infinities as null, in dumps and in FastJSONResponse.
+    """
+    if backend == "json":
+        monkeypatch.setattr(jsonfast, "orjson", None)
+    doc = {"rows": [{"v": math.nan, "w": 1.5}, (math.inf, -math.inf)], "n": 2}
+    expected = {"rows": [{"v": None, "w": 1.5}, [None, None]], "n": 2}
+    assert jsonfast.loads(jsonfast.dumps(doc)) == expected
+    assert jsonfast.loads(jsonfast.FastJSONResponse(doc).body) == expected
+    assert jsonfast.dumps({"é": 1.0}) == '{"é":1.0}'.encode("utf-8")
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import pathlib
+import sqlite3
+
+import pytest
+
+from app.db.db import init_db
+from app.parsers.quickbooks import ingest_quickbooks, _qb_walk_rows
+from app.parsers.rootfi import ingest_rootfi, _walk_line_items
+
+# Digests of the flattener output and the resulting facts, recorded from the recursive
+# implementations on test_data/; the iterative walkers must reproduce them exactly.
+GOLDEN = json.loads((pathlib.Path(__file__).parent / "golden" / "test_data_flatten.json").read_text())
+
+# Every line-item section present in data_set_2, not just the ones ingested
+RF_SECTIONS = ("revenue", "cost_of_goods_sold", "operating_expenses", "non_operating_revenue", "non_operating_expenses")
+
+
+def _digest(rows):
+    return {"rows": len(rows), "sha256": hashlib.sha256(json.dumps(rows, separators=(",", ":")).encode()).hexdigest()}
+
+
+@pytest.fixture(scope="module")
+def payloads(test_data_dir):
+    return (json.loads((test_data_dir / "data_set_1.json").read_text()),
+            json.loads((test_data_dir / "data_set_2.json").read_text()))
+
+
+def test_quickbooks_walk_matches_golden(payloads):
+    """
+    Test that the QuickBooks row flattener yields the recorded rows in the recorded order.
+    """
+    data = payloads[0].get("data") or payloads[0]
+    rows = [[r.account, list(r.values), r.summary] for r in _qb_walk_rows(data["Rows"]["Row"])]
+    assert _digest(rows) == GOLDEN["quickbooks_rows"]
+
+
+def test_rootfi_walk_matches_golden(payloads):
+    """
+    Test that the Rootfi line-item flattener yields the recorded (full_name, value, name) tuples.
+    """
+    rows, paths = [], {}
+    for p in payloads[1]["data"]:
+        for sec in RF_SECTIONS:
+            for r in p.get(sec) or []:
+                rows.extend([p.get("period_end"), sec, *t[:3]] for t in _walk_line_items(r, sec, paths))
+    assert _digest(rows) == GOLDEN["rootfi_line_items"]
+
+
+def test_ingested_facts_match_golden(payloads):
+    """
+    Test that ingesting both datasets into a fresh DB produces the recorded facts.
+    """
+    con = sqlite3.connect(":memory:")
+    con.row_factory = sqlite3.Row
+    init_db(con)
+    ingest_quickbooks(con, payloads[0])
+    ingest_rootfi(con, payloads[1])
+    facts = [list(r) for r in con.execute(
+        "SELECT period_start, period_end, month_key, source, account, category, kind, amount FROM facts_named ORDER BY id"
+    )]
+    assert _digest(facts) == GOLDEN["facts"]
+
+
+def test_walkers_handle_deep_trees():
+    """
+    Test that deeply nested reports flatten without hitting the recursion limit.
+    """
+    depth = 5000
+    node = {"name": "leaf", "value": "1"}
+    for i in range(depth):
+        node = {"name": f"n{i}", "value": "0", "line_items": [node]}
+    items = list(_walk_line_items(node, "expense"))
+    assert len(items) == depth + 1 and items[-1][2] == "leaf"
+
+    row = {"ColData": [{"value": "leaf"}, {"value": "1"}]}
+    for i in range(depth):
+        row = {"Header": {"ColData": [{"value": f"g{i}"}]}, "Rows": {"Row": [row]},
+               "Summary": {"ColData": [{"value": f"Total g{i}"}, {"value": "1"}]}}
+    flat = list(_qb_walk_rows([row]))
+    assert len(flat) == depth + 1
+    assert flat[0].account == "leaf" and flat[-1].account == f"Total g{depth - 1}"
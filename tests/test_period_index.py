@@ -0,0 +1,126 @@
+import json
+import sqlite3
+
+import pytest
+
+from app.db.db import init_db
+from app.parsers.report import write_report
+from app.parsers.rootfi import parse_rootfi
+from app.repositories.metrics import range_totals, sum_between, sum_between_sql, upsert_metric, upsert_metrics
+from app.repositories.period_index import METRIC_COLUMNS, data_generation, get_index
+
+
+def _sql_range(con, lo, hi, source):
+    q = ("SELECT SUM(revenue), SUM(cogs), SUM(gross_profit), SUM(expenses), SUM(COALESCE(net_profit,0)) "
+         "FROM metrics WHERE substr(period_end,1,7) BETWEEN ? AND ?")
+    params = [lo, hi]
+    if source:
+        q += " AND source=?"
+        params.append(source)
+    return dict(zip(METRIC_COLUMNS, (v or 0.0 for v in con.execute(q, params).fetchone())))
+
+
+def test_sum_between_matches_sql(con):
+    """
+    Test the prefix-sum index gives the SQL totals for every quarter, half and year, per source and overall.
+    """
+    years = sorted({int(r[0]) for r in con.execute("SELECT DISTINCT substr(period_end,1,4) FROM metrics")})
+    for year in [years[0] - 1] + years + [years[-1] + 1]:
+        for a, b in ((1, 3), (4, 6), (7, 9), (10, 12), (1, 6), (1, 12), (5, 5)):
+            for source in (None, "quickbooks", "rootfi", "missing"):
+                fast, slow = sum_between(con, a, b, year, source), sum_between_sql(con, a, b, year, source)
+                for k in METRIC_COLUMNS:
+                    assert fast[k] == pytest.approx(slow[k], rel=1e-9, abs=1e-6), (year, a, b, source, k)
+
+
+def test_range_totals_cross_year_and_breakdown(con):
+    """
+    Test arbitrary ranges spanning years (e.g. trailing twelve months) and the per-source breakdown.
+    """
+    last = con.execute("SELECT MAX(substr(period_end,1,7)) FROM metrics").fetchone()[0]
+    y, m = int(last[:4]), int(last[5:7])
+    first = f"{y - 1:04d}-{m % 12 + 1:02d}" if m < 12 else f"{y:04d}-01"
+    out = range_totals(con, first, last, None)
+    assert (out["from"], out["to"]) == (first, last)
+    want = _sql_range(con, first, last, None)
+    for k in METRIC_COLUMNS:
+        assert out["totals"][k] == pytest.approx(want[k], rel=1e-9, abs=1e-6)
+    assert set(out["by_source"]) == {"quickbooks", "rootfi"}
+    for src, part in out["by_source"].items():
+        assert part["totals"]["revenue"] == pytest.approx(_sql_range(con, first, last, src)["revenue"], rel=1e-9, abs=1e-6)
+    assert 0 < out["months_with_data"] <= 12
+    assert out["months_with_data"] >= max(p["months_with_data"] for p in out["by_source"].values())
+
+
+def test_index_rebuilds_after_metrics_write(con):
+    """
+    Test a metrics write invalidates the cached index.
+    """
+    idx = get_index(con)
+    assert get_index(con) is idx
+    before = sum_between(con, 1, 1, 1999, "quickbooks")["revenue"]
+    upsert_metric(con, "1999-01-31", "quickbooks", 100.0, 40.0, 10.0, None)
+    assert sum_between(con, 1, 1, 1999, "quickbooks")["revenue"] == before + 100.0
+    assert get_index(con) is not idx
+
+
+def test_bulk_write_invalidates_only_after_commit(con, test_data_dir):
+    """
+    Test the bulk upsert leaves the data generation alone inside its transaction, and
+    write_report bumps it once the rows are committed.
+    """
+    before = data_generation(con)
+    with con:
+        upsert_metrics(con, "quickbooks", [("1999-01-31", 100.0, 40.0, 10.0, None)])
+        assert data_generation(con) == before
+    payload = json.loads((test_data_dir / "data_set_2.json").read_text())
+    write_report(con, parse_rootfi(payload))
+    assert data_generation(con) != before
+
+
+def test_index_sees_commits_from_other_connections(tmp_path):
+    """
+    Test a commit from another connection (e.g. the bulk loader process) is picked up via PRAGMA data_version.
+    """
+    db = str(tmp_path / "dv.db")
+    reader, writer = sqlite3.connect(db), sqlite3.connect(db)
+    init_db(reader)
+    assert sum_between(reader, 1, 3, 2024, None)["revenue"] == 0.0
+    with writer:
+        writer.execute("INSERT INTO metrics(period_end, source, revenue, cogs, gross_profit, expenses) VALUES('2024-02-29','rootfi',5,0,5,0)")
+    assert sum_between(reader, 1, 3, 2024, None)["revenue"] == 5.0
+
+
+def test_auto_ingest_warms_the_serving_connection(tmp_path, test_data_dir, monkeypatch):
+    """
+    Test auto-ingest on its own connection rebuilds the period index of the connection requests
+    read through, and schedules the cache warm-up for the loaded periods.
+    """
+    from app.repositories import period_index
+    from app.services import ingestion
+    db = str(tmp_path / "auto.db")
+    serve, writer = sqlite3.connect(db), sqlite3.connect(db)
+    writer.row_factory = sqlite3.Row
+    init_db(serve)
+    assert get_index(serve).sources() == []
+    scheduled = []
+    monkeypatch.setattr(ingestion, "schedule_warm", scheduled.extend)
+    out = ingestion.auto_ingest(writer, str(test_data_dir / "data_set_1.json"), str(test_data_dir / "data_set_2.json"),
+                                serve_con=serve)
+    idx = period_index._CACHE[serve]
+    assert idx.data_version == serve.execute("PRAGMA data_version").fetchone()[0]
+    assert get_index(serve) is idx and sorted(idx.sources()) == ["quickbooks", "rootfi"]
+    assert sorted(scheduled) == sorted(out["quickbooks"]["periods"] + out["rootfi"]["periods"])
+
+
+def test_metrics_range_endpoint(api, ensure_ingested):
+    """
+    Test /metrics/range returns totals with a per-source breakdown and validates its bounds.
+    """
+    r = api.get("/api/v1/metrics/range?from=2024-01&to=2024-06")
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert set(out) >= {"from", "to", "source", "months_with_data", "totals", "by_source"}
+    assert set(out["totals"]) == set(METRIC_COLUMNS)
+    assert api.get("/api/v1/metrics/range?from=2024-06&to=2024-01").status_code == 422
+    assert api.get("/api/v1/metrics/range?from=2024-13&to=2024-12").status_code == 422
@@ -0,0 +1,88 @@
+import json
+import time
+
+from app.config import settings
+from app.repositories.metrics import summary, trend
+from app.repositories.period_index import invalidate
+from app.services.cache import NLQ_CACHE, RESPONSE_CACHE, cached_summary, cached_trend
+from app.services import prewarm
+from app.services.admission import LLMGate
+from app.services.nlq import LLM_MAX_TOKENS, cache_key, nlq
+from app.services.prewarm import LLM_SUMMARY_QS, warm
+
+
+def _ask(con, q):
+    return nlq(con, q, None, None, settings.model_name)
+
+
+def test_warm_fills_caches_until_data_changes(con):
+    """
+    Test the warm-up caches dashboard results and canonical NLQ answers equal to fresh ones,
+    and that any metrics write makes them stale.
+    """
+    out = warm(con, ["2024-01-31", "2024-06-30"])
+    assert out["years"] == [2024] and out["responses"] > 0 and out["nlq_answers"] == 8
+    hits = len(RESPONSE_CACHE)
+    assert cached_summary(con, 2024, None) == summary(con, 2024, None)
+    assert cached_trend(con, "revenue", 2024, None) == trend(con, "revenue", 2024, None)
+    assert len(RESPONSE_CACHE) == hits  # served from the warmed entries
+
+    a = _ask(con, "What was the total profit in Q1 2024?")
+    assert a["trace"][0] == {"event": "cache_hit"} and a["trace"][1]["tool"] == "get_total_profit"
+    invalidate()
+    b = _ask(con, "What was the total profit in Q1 2024?")
+    assert b["trace"][0]["tool"] == "get_total_profit" and b["answer"] == a["answer"]
+
+
+def test_warm_llm_summaries_within_token_budget(con, monkeypatch):
+    """
+    Test LLM summaries of the latest year are generated only while a full completion still
+    fits the token budget, and then answered from the NLQ cache without calling the LLM.
+    """
+    monkeypatch.setattr(settings, "llm_backend", "stub")
+    monkeypatch.setattr(settings, "llm_stub_latency_ms", 0.0)
+    monkeypatch.setattr(settings, "openai_api_key", "prewarm-test-key")
+    assert warm(con, ["2024-01-31"], llm_token_budget=LLM_MAX_TOKENS - 1).get("llm_answers") == 0
+    out = warm(con, ["2024-01-31"], llm_token_budget=LLM_MAX_TOKENS + 1)
+    assert out["llm_answers"] == 1 and 1 < out["llm_tokens"] <= LLM_MAX_TOKENS + 1
+    first, second = (q.format(y=2025) for q in LLM_SUMMARY_QS[:2])
+    assert NLQ_CACHE.get(con, cache_key(first)) is not None
+    assert NLQ_CACHE.get(con, cache_key(second)) is None
+    hit = nlq(con, first, None, "prewarm-test-key", settings.model_name)
+    assert hit["trace"][0] == {"event": "cache_hit"} and hit["answer"].startswith("[stub:")
+
+
+def test_warm_llm_yields_to_busy_gate(con, monkeypatch):
+    """
+    Test the warm-up asks the LLM through the admission gate and stops, without queueing,
+    when every slot is taken.
+    """
+    monkeypatch.setattr(settings, "llm_backend", "stub")
+    monkeypatch.setattr(settings, "llm_stub_latency_ms", 0.0)
+    monkeypatch.setattr(settings, "openai_api_key", "prewarm-test-key")
+    gate = LLMGate(limit=1, queue_size=4, queue_timeout_s=1.0)
+    monkeypatch.setattr(prewarm, "LLM_GATE", gate)
+    gate.in_flight = 1
+    out = warm(con, ["2024-01-31"], llm_token_budget=10_000)
+    assert out["llm_answers"] == 0 and out["llm_stopped"] == "busy" and gate.queued == 0
+    gate.in_flight = 0
+    out = warm(con, ["2024-01-31"], llm_token_budget=10_000)
+    assert out["llm_answers"] == len(LLM_SUMMARY_QS) and "llm_stopped" not in out
+    assert gate.in_flight == gate.queued == 0 and gate.ewma_ms > 0
+
+
+def test_ingest_warms_in_background(api, ensure_ingested, test_data_dir):
+    """
+    Test an ingest returns before the warm-up, which then shows up as done in /health.
+    """
+    runs = api.get("/health").json()["cache_warm"]["runs"]
+    payload = json.loads((test_data_dir / "data_set_1.json").read_text())
+    r = api.post("/ingest/quickbooks", json={"payload": payload})
+    assert r.status_code == 200, r.text
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        warm_state = api.get("/health").json()["cache_warm"]
+        if warm_state["runs"] > runs and not warm_state["running"] and not warm_state["pending"]:
+            break
+        time.sleep(0.05)
+    assert warm_state["runs"] > runs and warm_state["last"]["nlq_answers"] > 0
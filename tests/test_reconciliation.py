@@ -0,0 +1,106 @@
+import pytest
+
+from app.services.reconciliation import reconcile, reconciliation_page, set_mapping
+
+
+def _leaf(con, source):
+    return con.execute(
+        """
+        SELECT a.full_path FROM accounts a JOIN facts f ON f.account_id = a.id
+        WHERE a.source = ? AND a.is_leaf = 1 AND f.kind = 'amount'
+        GROUP BY a.id ORDER BY COUNT(*) DESC, a.full_path LIMIT 1
+        """,
+        (source,),
+    ).fetchone()[0]
+
+
+def test_metric_rows_cover_shared_months(con):
+    """
+    Test ingest stores one row per shared month and metric both sources report, diff = rootfi - quickbooks.
+    """
+    shared = {r[0] for r in con.execute(
+        "SELECT substr(period_end, 1, 7) FROM metrics GROUP BY 1 HAVING COUNT(DISTINCT source) = 2"
+    ).fetchall()}
+    rows = con.execute("SELECT * FROM reconciliation WHERE level = 'metric'").fetchall()
+    assert shared and {r["month_key"] for r in rows} == shared
+    present = [m for m in ("revenue", "cogs", "gross_profit", "expenses", "net_profit") if con.execute(
+        f"SELECT COUNT(DISTINCT source) FROM metrics WHERE {m} IS NOT NULL"
+    ).fetchone()[0] == 2]
+    assert len(rows) == len(present) * len(shared)
+    for r in rows:
+        assert r["diff"] == pytest.approx(r["rootfi"] - r["quickbooks"])
+    r = rows[0]
+    sums = {s: con.execute(
+        f"SELECT SUM({r['item']}) FROM metrics WHERE source = ? AND substr(period_end, 1, 7) = ?",
+        (s, r["month_key"]),
+    ).fetchone()[0] for s in ("quickbooks", "rootfi")}
+    assert (r["quickbooks"], r["rootfi"]) == pytest.approx((sums["quickbooks"], sums["rootfi"]))
+
+
+def test_incremental_refresh_and_mapping(con):
+    """
+    Test refreshing given months leaves the others alone, and mapped accounts get account rows.
+    """
+    months = [r[0] for r in con.execute(
+        "SELECT DISTINCT month_key FROM reconciliation ORDER BY month_key"
+    ).fetchall()]
+    before = {r[0]: r[1] for r in con.execute(
+        "SELECT month_key, MIN(updated_at) FROM reconciliation GROUP BY 1"
+    ).fetchall()}
+    qb, rf = _leaf(con, "quickbooks"), _leaf(con, "rootfi")
+    set_mapping(con, "quickbooks", qb, "probe")
+    set_mapping(con, "rootfi", rf, "probe")
+    per_month = con.execute(
+        "SELECT COUNT(*) FROM reconciliation WHERE month_key = ? AND level = 'metric'", (months[0],)
+    ).fetchone()[0]
+    out = reconcile(con, months[:1])
+    assert out["metric_rows"] == per_month and out["account_rows"] == 1
+    acct = con.execute("SELECT month_key FROM reconciliation WHERE level = 'account'").fetchall()
+    assert [r[0] for r in acct] == months[:1]
+    assert {r[0]: r[1] for r in con.execute(
+        "SELECT month_key, MIN(updated_at) FROM reconciliation WHERE month_key != ? GROUP BY 1", (months[0],)
+    ).fetchall()} == {k: v for k, v in before.items() if k != months[0]}
+
+    out = reconcile(con)
+    assert out["account_rows"] >= 1
+    set_mapping(con, "rootfi", rf, None)
+    set_mapping(con, "quickbooks", qb, None)
+    reconcile(con)
+    assert con.execute("SELECT COUNT(*) FROM reconciliation WHERE item = 'probe'").fetchone()[0] == 0
+
+
+def test_paging_and_tolerance_override(con):
+    """
+    Test keyset paging visits every row once in order, and tolerance overrides re-evaluate flagged.
+    """
+    total = con.execute("SELECT COUNT(*) FROM reconciliation").fetchone()[0]
+    seen, cursor = [], None
+    while True:
+        page = reconciliation_page(con, limit=7, cursor=cursor)
+        seen += [(r["month_key"], r["level"], r["item"]) for r in page["rows"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == total
+    assert seen == sorted(sorted(seen, key=lambda k: (k[1], k[2])), key=lambda k: k[0], reverse=True)
+
+    loose = reconciliation_page(con, flagged_only=True, abs_tol=1e18, limit=1000)
+    assert loose["rows"] == [] and loose["tolerances"]["abs"] == 1e18
+    strict = reconciliation_page(con, flagged_only=True, abs_tol=0, rel_tol=0, limit=1000)
+    assert len(strict["rows"]) == con.execute("SELECT COUNT(*) FROM reconciliation WHERE diff != 0").fetchone()[0]
+
+
+def test_reconcile_endpoint(api, ensure_ingested):
+    """
+    Test /reconcile shape, paging and validation.
+    """
+    r = api.get("/api/v1/reconcile?level=metric&limit=3")
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert len(out["rows"]) == 3 and out["next_cursor"]
+    assert set(out["rows"][0]) == {"month_key", "level", "item", "quickbooks", "rootfi", "diff",
+                                   "rel_diff", "flagged", "updated_at"}
+    nxt = api.get("/api/v1/reconcile", params={"level": "metric", "limit": 3, "cursor": out["next_cursor"]}).json()
+    assert not {(x["month_key"], x["item"]) for x in nxt["rows"]} & {(x["month_key"], x["item"]) for x in out["rows"]}
+    assert api.get("/api/v1/reconcile?level=ledger").status_code == 422
+    assert api.get("/api/v1/reconcile?from=2024-13").status_code == 422
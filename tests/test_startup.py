@@ -0,0 +1,63 @@
+import subprocess
+import sys
+import time
+import pathlib
+
+# Import-time budget for `import app.main`, measured with `python -X importtime`.
+# APP_SELF_BUDGET_MS covers the app's own modules (route/model registration included);
+# third-party frameworks (fastapi, pydantic, starlette) are outside our control and only
+# bounded loosely by TOTAL_BUDGET_MS.
+APP_SELF_BUDGET_MS = 250.0
+TOTAL_BUDGET_MS = 3000.0
+# Heavy dependencies that must only be imported on first use
+DEFERRED_MODULES = ("openai", "prometheus_client", "httpx")
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+
+def _importtime():
+    """
+    Import app.main in a fresh interpreter; return ({module: (self_us, cumulative_us)}, stderr).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, capture_output=True, text=True, timeout=60,
+        env={"PATH": "", "LLM_BACKEND": "openai", "OPENAI_API_KEY": "sk-test", "AUTO_INGEST": "1"},
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    mods = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        mods[name.strip()] = (int(self_us), int(cum_us))
+    return mods
+
+
+def test_import_time_budget():
+    """
+    Test app.main imports no deferred heavy modules and stays within its import-time budget.
+    """
+    mods = _importtime()
+    assert "app.main" in mods
+    loaded = [m for m in DEFERRED_MODULES if m in mods]
+    assert not loaded, f"imported at startup: {loaded}"
+    app_self_ms = sum(s for name, (s, _) in mods.items() if name == "app" or name.startswith("app.")) / 1000.0
+    assert app_self_ms < APP_SELF_BUDGET_MS, f"app modules took {app_self_ms:.1f}ms to import"
+    assert mods["app.main"][1] / 1000.0 < TOTAL_BUDGET_MS
+
+
+def test_health_reports_readiness(api):
+    """
+    Test /health exposes the background startup state and becomes ready.
+    """
+    deadline = time.time() + 30
+    while True:
+        out = api.get("/health").json()
+        assert out["status"] == "ok" and "startup" in out
+        if out["ready"] or time.time() > deadline:
+            break
+        time.sleep(0.1)
+    assert out["ready"] is True
+    assert out["startup"]["phase"] == "ready" and out["startup"]["ready_ms"] is not None
+    assert api.get("/health?require_ready=true").status_code == 200